@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+"""Document engine benchmark
+
+Adds and serializes the records of a fixture using the previous
+identity-mapped engine, the current one and the compact one, and reports
+the time, the memory retained by the document and the peak memory of each.
+The records are replicated to simulate a larger extract. Add times include
+creating the records.
+
+The fixtures are the chinook SQLite database or a generated directory
+tree extracted with the filesystem source.
+
+Usage:
+    python benchmarks/document.py [--fixture <name>] [--repeat <n>]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from prov_extractor.sources import base, filesystem, sqlite  # noqa
+from prov_extractor.utils import IdGenerator  # noqa
+
+
+CHINOOK = os.path.join(os.path.dirname(__file__),
+                       '../tests/input/chinook.sqlite')
+
+# Shape of the generated directory tree
+DIRECTORIES = 20
+FILES_PER_DIRECTORY = 50
+
+
+class IdentityDocument(dict):
+    "The engine prior to resolving references when records are added."
+    def __init__(self):
+        self.idr = IdGenerator()
+        self.cids = {}
+
+    def __getitem__(self, key):
+        if key not in self:
+            self[key] = {}
+
+        return dict.__getitem__(self, key)
+
+    def add(self, concept, cid, attrs=None):
+        if attrs is None:
+            attrs = cid
+
+            if 'origins:ident' in attrs:
+                cid = '{}:{}'.format(concept, attrs['origins:ident'])
+            else:
+                cid = self.idr()
+
+            self.cids[id(attrs)] = cid
+
+        self[concept][cid] = attrs
+
+    def dumps(self):
+        return json.dumps(self.resolve())
+
+    def resolve(self):
+        doc = {}
+
+        for concept, items in self.items():
+            doc[concept] = {}
+
+            for cid, item in items.items():
+                copy = dict(item)
+                doc[concept][cid] = copy
+
+                for key, value in copy.items():
+                    if isinstance(value, dict) and '$' not in value:
+                        copy[key] = self.cids[id(value)]
+
+        return doc
+
+
+def load_chinook():
+    "Returns the records of the chinook database."
+    client = sqlite.Client(uri=CHINOOK)
+    return list(client.parse())
+
+
+def load_filesystem():
+    "Returns the records of a generated directory tree."
+    path = tempfile.mkdtemp()
+
+    try:
+        for i in range(DIRECTORIES):
+            directory = os.path.join(path, 'dir{}'.format(i))
+            os.mkdir(directory)
+
+            for j in range(FILES_PER_DIRECTORY):
+                name = os.path.join(directory, 'file{}.dat'.format(j))
+                open(name, 'w').close()
+
+        client = filesystem.Client(path=path)
+        return list(client.parse())
+    finally:
+        shutil.rmtree(path)
+
+
+FIXTURES = {
+    'chinook': load_chinook,
+    'filesystem': load_filesystem,
+}
+
+
+def replicate(records, repeat, by_value=False):
+    """Yields fresh copies of the records `repeat` times, as a source would
+    while parsing. Identifiers and references are prefixed, so they are new
+    strings, while other values are shared as a source reading the same
+    values would share them. Copies are made lazily so the records are
+    only retained if the engine retains them. References are replaced by
+    the referenced records for the identity-mapped engine.
+    """
+    for i in range(repeat):
+        copies = {}
+
+        for concept, attrs in records:
+            ident = attrs.get('origins:ident')
+            prefixed = '{}/{}'.format(i, ident)
+
+            copy = {}
+
+            for key, value in attrs.items():
+                if isinstance(value, base.Ref):
+                    value = base.Ref(value.concept,
+                                     '{}/{}'.format(i, value.ident))
+
+                    if by_value:
+                        value = copies[value.cid]
+                elif value == ident:
+                    value = prefixed
+
+                copy[key] = value
+
+            if ident is not None:
+                copies['{}:{}'.format(concept, prefixed)] = copy
+
+            yield concept, copy
+
+
+def build(engine, records, repeat):
+    doc = engine()
+
+    by_value = engine is IdentityDocument
+
+    for concept, attrs in replicate(records, repeat, by_value):
+        doc.add(concept, attrs)
+
+    return doc
+
+
+def run(engine, records, repeat):
+    start = time.perf_counter()
+    doc = build(engine, records, repeat)
+    added = time.perf_counter()
+    doc.dumps()
+    serialized = time.perf_counter()
+
+    del doc
+
+    # Memory is traced in a separate pass since tracing skews the timings
+    tracemalloc.start()
+    doc = build(engine, records, repeat)
+    retained = tracemalloc.get_traced_memory()[0]
+    doc.dumps()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return added - start, serialized - added, retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fixture', choices=sorted(FIXTURES),
+                        default='chinook')
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    records = FIXTURES[args.fixture]()
+
+    print('{} records'.format(len(records) * args.repeat))
+    print('{:<10} {:>10} {:>12} {:>14} {:>10}'
+          .format('engine', 'add (s)', 'dumps (s)', 'retained (MB)',
+                  'peak (MB)'))
+
+    for name, engine in (('identity', IdentityDocument),
+                         ('current', base.Document),
+                         ('compact', base.CompactDocument)):
+        add, dumps, retained, peak = run(engine, records, args.repeat)
+
+        print('{:<10} {:>10.3f} {:>12.3f} {:>14.1f} {:>10.1f}'
+              .format(name, add, dumps, retained / 1024.0 / 1024,
+                      peak / 1024.0 / 1024))
+
+
+if __name__ == '__main__':
+    main()
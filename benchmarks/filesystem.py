@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""Filesystem source benchmark
+
+Times the extraction of a synthetic directory tree with the previous
+`os.walk` and `os.stat` traversal and with the `os.scandir` walker for a
+range of worker counts. The tree is generated once in a temporary directory
+or in the given directory, which is kept. A latency in milliseconds can be
+added to each directory listing to approximate a network share.
+
+Usage:
+    python benchmarks/filesystem.py [--files <n>] [--width <n>]
+        [--workers <n>,...] [--latency <ms>] [--path <dir>]
+"""
+
+import os
+import sys
+import time
+import shutil
+import fnmatch
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from prov_extractor.sources import filesystem  # noqa
+
+
+def generate_tree(path, files, width):
+    """Creates `files` empty files spread over nested directories with
+    `width` entries each.
+    """
+    count = 0
+    dirs = [path]
+
+    while count < files:
+        parent = dirs.pop(0)
+
+        for i in range(width):
+            if count >= files:
+                break
+
+            name = os.path.join(parent, 'file{}.txt'.format(i))
+            open(name, 'w').close()
+            count += 1
+
+        for i in range(width // 10 or 1):
+            name = os.path.join(parent, 'dir{}'.format(i))
+            os.mkdir(name)
+            dirs.append(name)
+
+
+def walk_stat(path, pattern='*'):
+    "Previous traversal, which stats each file after listing it."
+    records = 0
+
+    for root, dirs, names in os.walk(path):
+        records += 1
+
+        for name in fnmatch.filter(names, pattern):
+            os.stat(os.path.join(root, name))
+            records += 1
+
+    return records
+
+
+def run(path, workers):
+    if workers is None:
+        start = time.perf_counter()
+        records = walk_stat(path)
+    else:
+        client = filesystem.Client(path=path, workers=workers)
+
+        start = time.perf_counter()
+        records = sum(1 + len(files) for root, files in client.walk())
+
+    return records, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=1000000)
+    parser.add_argument('--width', type=int, default=100)
+    parser.add_argument('--workers', default='1,4,16')
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--path')
+    args = parser.parse_args()
+
+    if args.latency:
+        scandir = os.scandir
+
+        def slow_scandir(path='.'):
+            time.sleep(args.latency / 1000)
+            return scandir(path)
+
+        # Used by os.walk as well
+        os.scandir = slow_scandir
+
+    path = args.path or tempfile.mkdtemp()
+
+    try:
+        if not os.listdir(path):
+            start = time.perf_counter()
+            generate_tree(path, args.files, args.width)
+            print('generated {} files in {:.1f}s'.format(
+                args.files, time.perf_counter() - start))
+
+        workers = [int(w) for w in args.workers.split(',')]
+
+        for count in [None] + workers:
+            records, elapsed = run(path, count)
+            name = 'os.walk' if count is None else 'scandir/{}'.format(count)
+
+            print('{:<12} {:>8} records {:>10.3f}s {:>10.0f} records/s'
+                  .format(name, records, elapsed, records / elapsed))
+    finally:
+        if not args.path:
+            shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
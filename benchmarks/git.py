@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""Git log benchmark
+
+Generates a repository with many files and times reading its history with
+one `git log` per file, as the git source previously did, and with the
+single pass of the current source.
+
+Usage:
+    python benchmarks/git.py [--files <n>] [--commits <n>]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from prov_extractor.sources import git  # noqa
+
+
+def run_git(repo, *args):
+    subprocess.check_call(['git', '-C', repo] + list(args),
+                          stdout=subprocess.DEVNULL)
+
+
+def generate_repo(path, files, commits):
+    """Creates a repository with `files` files spread over `commits` commits.
+    Each commit after the first also modifies a file of the previous one.
+    """
+    run_git(path, 'init', '-q')
+    run_git(path, 'config', 'user.name', 'Benchmark')
+    run_git(path, 'config', 'user.email', 'benchmark@example.com')
+
+    per_commit = max(files // commits, 1)
+
+    for i in range(commits):
+        for j in range(per_commit):
+            name = os.path.join(path, 'file{}-{}.txt'.format(i, j))
+
+            with open(name, 'w') as f:
+                f.write('{} {}\n'.format(i, j))
+
+        if i > 0:
+            with open(os.path.join(path, 'file{}-0.txt'.format(i - 1)),
+                      'a') as f:
+                f.write('modified\n')
+
+        run_git(path, 'add', '-A')
+        run_git(path, 'commit', '-q', '-m', 'Commit {}'.format(i))
+
+
+def per_file_log(repo):
+    "Reads the history with one log per file."
+    lines = subprocess.check_output([
+        'git', '-C', repo, '--no-pager', 'log', '--pretty=format:',
+        '--name-only', '--diff-filter=A',
+    ]).decode('utf-8')
+
+    commits = 0
+
+    for fpath in set(line for line in lines.split('\n') if line):
+        output = subprocess.check_output([
+            'git', '-C', repo, '--no-pager', 'log', '--reverse',
+            '--date=iso', '--name-status',
+            '--pretty=format:%H||%P||%an||%ad||%cn||%cd||%s||&',
+            '--', fpath,
+        ]).decode('utf-8')
+
+        commits += output.count('||&')
+
+    return commits
+
+
+def single_pass_log(repo):
+    "Reads the history with the single pass of the git source."
+    return sum(len(c['files']) for c in git.get_commits(repo))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=1000)
+    parser.add_argument('--commits', type=int, default=100)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+
+    try:
+        generate_repo(path, args.files, args.commits)
+
+        for name, func in (('per-file', per_file_log),
+                           ('single-pass', single_pass_log)):
+            start = time.perf_counter()
+            changes = func(path)
+            elapsed = time.perf_counter() - start
+
+            print('{:<12} {:>8} changes {:>10.3f}s'
+                  .format(name, changes, elapsed))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
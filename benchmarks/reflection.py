@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+"""Schema reflection benchmark
+
+Counts the round trips and times the extraction of a relational source
+using the bulk catalog query and using the per-table inspector, serially
+and with a pool of workers. By default a generated SQLite database stands
+in for the server; pass connection options to benchmark a PostgreSQL
+database instead. The latency option adds a delay to every query to
+simulate a remote server and the constraints option also extracts keys,
+indexes and row counts.
+
+Usage:
+    python benchmarks/reflection.py [--tables <n>] [--columns <n>]
+        [--workers <n>] [--latency <seconds>] [--constraints]
+    python benchmarks/reflection.py --source postgresql --database <name>
+        [--host <host>] [--port <port>] [--user <user>]
+        [--password <password>]
+"""
+
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from prov_extractor import sources  # noqa
+
+
+def generate_sqlite(path, tables, columns):
+    conn = sqlite3.connect(path)
+
+    for i in range(tables):
+        cols = ', '.join('col{} VARCHAR(50)'.format(j)
+                         for j in range(columns))
+        conn.execute('CREATE TABLE table{} (id INTEGER PRIMARY KEY, {})'
+                     .format(i, cols))
+
+    conn.commit()
+    conn.close()
+
+
+def run(Client, options, catalog, latency):
+    client = Client(**options)
+
+    if not catalog:
+        client.catalog_sql = None
+        client.primary_keys_sql = None
+        client.foreign_keys_sql = None
+        client.indexes_sql = None
+
+    queries = []
+
+    def count(*args):
+        queries.append(args)
+
+        if latency:
+            time.sleep(latency)
+
+    # The engine is shared across clients so the listener is removed
+    # after the run.
+    event.listen(client.engine, 'before_cursor_execute', count)
+
+    try:
+        start = time.perf_counter()
+        records = sum(1 for r in client.iter_records())
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(client.engine, 'before_cursor_execute', count)
+
+    return records, len(queries), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', default='sqlite')
+    parser.add_argument('--tables', type=int, default=500)
+    parser.add_argument('--columns', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--constraints', action='store_true')
+    parser.add_argument('--database')
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--user')
+    parser.add_argument('--password')
+    args = parser.parse_args()
+
+    Client = sources.get(args.source)
+    tmp = None
+
+    if args.source == 'sqlite':
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, 'benchmark.sqlite')
+        generate_sqlite(path, args.tables, args.columns)
+        options = {'uri': path}
+
+        # Queries are counted through the engine
+        Client.use_sqlite3 = False
+    else:
+        options = {}
+
+        for key in ('database', 'host', 'port', 'user', 'password'):
+            if getattr(args, key) is not None:
+                options[key] = getattr(args, key)
+
+    if args.constraints:
+        for key in ('primary_keys', 'foreign_keys', 'indexes', 'row_counts'):
+            options[key] = True
+
+    try:
+        modes = (
+            ('inspector', False, 1),
+            ('workers', False, args.workers),
+            ('catalog', True, 1),
+        )
+
+        for name, catalog, workers in modes:
+            options['workers'] = workers
+            records, queries, elapsed = run(Client, options, catalog,
+                                            args.latency)
+
+            print('{:<10} {:>8} records {:>8} queries {:>10.3f}s'
+                  .format(name, records, queries, elapsed))
+    finally:
+        if tmp:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""SQLite source benchmark
+
+Times the extraction of many small SQLite databases, such as a directory
+of application databases, with the sqlite3 fast path and with SQLAlchemy.
+
+Usage:
+    python benchmarks/sqlite.py [--files <n>] [--tables <n>] [--columns <n>]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from prov_extractor.sources import sqlite  # noqa
+from reflection import generate_sqlite  # noqa
+
+
+def run(paths, use_sqlite3):
+    class Client(sqlite.Client):
+        pass
+
+    Client.use_sqlite3 = use_sqlite3
+
+    records = 0
+    start = time.perf_counter()
+
+    for path in paths:
+        client = Client(uri=path)
+        records += sum(1 for r in client.iter_records())
+
+    return records, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=10000)
+    parser.add_argument('--tables', type=int, default=5)
+    parser.add_argument('--columns', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+
+    try:
+        paths = []
+
+        for i in range(args.files):
+            path = os.path.join(tmp, 'app{}.sqlite'.format(i))
+            generate_sqlite(path, args.tables, args.columns)
+            paths.append(path)
+
+        for name, use_sqlite3 in (('sqlalchemy', False), ('sqlite3', True)):
+            records, elapsed = run(paths, use_sqlite3)
+
+            print('{:<10} {:>8} records {:>10.3f}s {:>8.3f}ms/file'
+                  .format(name, records, elapsed,
+                          elapsed / args.files * 1000))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
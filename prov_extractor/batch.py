@@ -0,0 +1,97 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from . import sources
+
+
+# Number of worker processes shared by the batch extractions.
+PROCESSES = int(os.environ.get('PROV_EXTRACTOR_BATCH_PROCESSES',
+                               os.cpu_count() or 1))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def new_pool(processes=PROCESSES):
+    """Returns a process pool for batch extractions. Workers are spawned
+    rather than forked so they do not inherit the pooled connections of
+    the engine registry or locks held by other threads of the service.
+    """
+    return ProcessPoolExecutor(processes,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+
+def get_pool():
+    "Returns the process pool, starting it on first use."
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = new_pool()
+
+        return _pool
+
+
+def extract(name, options):
+    """Extracts a single set of options for a source. Errors are returned
+    rather than raised so one input does not abort a batch.
+    """
+    try:
+        client = sources.get(name)(**options)
+
+        return {
+            'document': client.generate(),
+            'meta': client.meta,
+        }
+    except Exception as e:
+        return {
+            'error': {
+                'message': str(e),
+            },
+        }
+
+
+def extract_many(name, items, pool=None):
+    """Extracts each set of options for a source across a process pool and
+    yields the results in the order of the items.
+
+    Each result has either the `document` and `meta` of the extract or an
+    `error`.
+    """
+    if pool is None:
+        pool = get_pool()
+
+    futures = [pool.submit(extract, name, options) for options in items]
+
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        # Remaining extractions are not needed if iteration stops early
+        for future in futures:
+            future.cancel()
+
+
+def bundle(results):
+    """Combines batch results into a PROV document with one bundle per input.
+    Returns the document and the list of per-input metadata, which holds
+    the error of the inputs that failed.
+    """
+    document = {
+        'bundle': {},
+    }
+
+    items = []
+
+    for index, result in enumerate(results):
+        if 'error' in result:
+            items.append({'index': index, 'error': result['error']})
+            continue
+
+        bid = 'bundle:{}'.format(index)
+        document['bundle'][bid] = result['document']
+
+        items.append({'index': index, 'bundle': bid, 'meta': result['meta']})
+
+    return document, items
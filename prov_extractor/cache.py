@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class DiskCache():
+    """On-disk cache of JSON values keyed by string.
+
+    Each value is stored in its own file named by the hash of its key, so
+    keys such as connection URLs are not written out. Files are replaced
+    atomically and concurrent writers of the same key simply race to write
+    the same value. Values older than the time-to-live are ignored and the
+    least recently used values are removed once the cache exceeds its
+    maximum size in bytes.
+    """
+    def __init__(self, path, max_size, ttl):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+
+    def entry_path(self, key):
+        key = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, key):
+        "Returns the value of the key or None if it is missing or expired."
+        path = self.entry_path(key)
+
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if time.time() - entry['created'] > self.ttl:
+            return
+
+        # Mark as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        return entry['value']
+
+    def set(self, key, value):
+        "Stores the value of the key."
+        os.makedirs(self.path, exist_ok=True)
+
+        entry = {
+            'created': time.time(),
+            'value': value,
+        }
+
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+
+            os.replace(tmp, self.entry_path(key))
+        except Exception:
+            os.remove(tmp)
+            raise
+
+        self.evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self.entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        "Removes the least recently used values until under size."
+        entries = []
+
+        for name in os.listdir(self.path):
+            if not name.endswith('.json'):
+                continue
+
+            path = os.path.join(self.path, name)
+
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            entries.append((stat.st_mtime, path, stat.st_size))
+
+        total = sum(e[2] for e in entries)
+
+        for mtime, path, size in sorted(entries):
+            if total <= self.max_size:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            total -= size
+
+
+class MemoryCache():
+    """In-memory cache of values keyed by string.
+
+    Values older than the time-to-live are ignored and the least recently
+    used values are removed once the total size of the values, as given by
+    the size function, exceeds the maximum size.
+    """
+    def __init__(self, max_size, ttl, size=len):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = size
+        self.total = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        "Returns the value of the key or None if it is missing or expired."
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                return
+
+            created, value, size = entry
+
+            if time.time() - created > self.ttl:
+                self.remove(key)
+                return
+
+            # Mark as recently used
+            self.entries.move_to_end(key)
+
+            return value
+
+    def set(self, key, value):
+        "Stores the value of the key."
+        size = self.size(value)
+
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+
+            # Values larger than the cache are not kept
+            if size > self.max_size:
+                return
+
+            self.entries[key] = (time.time(), value, size)
+            self.total += size
+
+            while self.total > self.max_size:
+                self.remove(next(iter(self.entries)))
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+
+    def remove(self, key):
+        # The lock must be held by the caller
+        created, value, size = self.entries.pop(key)
+        self.total -= size
+
+
+class TieredCache():
+    """Memory cache in front of a disk cache. Values are written to both and
+    values only found on disk are promoted to memory.
+    """
+    def __init__(self, memory, disk):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key):
+        value = self.memory.get(key)
+
+        if value is None:
+            value = self.disk.get(key)
+
+            if value is not None:
+                self.memory.set(key, value)
+
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        self.disk.delete(key)
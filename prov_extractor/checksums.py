@@ -0,0 +1,270 @@
+import os
+import mmap
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+ALGORITHMS = ('sha256', 'blake2b')
+
+# Number of worker processes hashing files.
+PROCESSES = int(os.environ.get('PROV_EXTRACTOR_CHECKSUM_PROCESSES',
+                               os.cpu_count() or 1))
+
+# Path of the SQLite database caching the checksums of files.
+CACHE_PATH = os.environ.get('PROV_EXTRACTOR_CHECKSUM_CACHE',
+                            os.path.join(tempfile.gettempdir(),
+                                         'prov-extractor-checksums.sqlite'))
+
+# Size of the reads of small files. Files of at least the mmap threshold
+# are mapped into memory instead.
+BUFFER_SIZE = 1024 ** 2
+
+MMAP_THRESHOLD = 64 * 1024 ** 2
+
+# Files are sent to the workers in chunks of up to this many files or
+# bytes, so small files do not cost a round trip each.
+CHUNK_FILES = 64
+
+CHUNK_BYTES = 256 * 1024 ** 2
+
+# Maximum number of records held back while their files are hashed.
+MAX_PENDING = 10000
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    "Returns the process pool, starting it on first use."
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(PROCESSES)
+
+        return _pool
+
+
+def hash_file(path, algorithm):
+    "Returns the hex digest of the content of a file."
+    digest = hashlib.new(algorithm)
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                digest.update(m)
+        else:
+            buf = bytearray(BUFFER_SIZE)
+            view = memoryview(buf)
+
+            while True:
+                n = f.readinto(buf)
+
+                if not n:
+                    break
+
+                digest.update(view[:n])
+
+    return digest.hexdigest()
+
+
+def hash_files(paths, algorithm):
+    """Returns the digests of a list of files. Files that cannot be read
+    have no digest rather than failing the others.
+    """
+    digests = []
+
+    for path in paths:
+        try:
+            digests.append(hash_file(path, algorithm))
+        except OSError:
+            digests.append(None)
+
+    return digests
+
+
+class ChecksumCache():
+    """Checksums of files kept in a local SQLite database. A checksum is
+    only returned while the size, modification time and inode of the file
+    are the ones it was computed for.
+    """
+    def __init__(self, path=None):
+        if path is None:
+            path = CACHE_PATH
+
+        self.db = sqlite3.connect(path, timeout=30)
+
+        with self.db:
+            self.db.execute('''
+                CREATE TABLE IF NOT EXISTS checksums (
+                    path TEXT,
+                    algorithm TEXT,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    inode INTEGER,
+                    digest TEXT,
+                    PRIMARY KEY (path, algorithm)
+                )
+            ''')
+
+    def close(self):
+        self.db.close()
+
+    def get(self, path, algorithm, stats):
+        row = self.db.execute('''
+            SELECT digest FROM checksums
+            WHERE path = ? AND algorithm = ? AND size = ? AND mtime_ns = ?
+                AND inode = ?
+        ''', (path, algorithm, stats.st_size, stats.st_mtime_ns,
+              stats.st_ino)).fetchone()
+
+        if row is not None:
+            return row[0]
+
+    def set_many(self, algorithm, items):
+        "Stores (path, stats, digest) items."
+        with self.db:
+            self.db.executemany('''
+                INSERT OR REPLACE INTO checksums
+                    (path, algorithm, size, mtime_ns, inode, digest)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', ((path, algorithm, stats.st_size, stats.st_mtime_ns,
+                   stats.st_ino, digest) for path, stats, digest in items))
+
+
+class Hasher():
+    """Adds the checksums of files to their records across a process pool
+    while keeping the order of the records.
+
+    Records are held back until the checksums of their files, and of the
+    files of the records before them, are known. Checksums found in the
+    cache are added right away.
+    """
+    def __init__(self, algorithm, cache, pool=None):
+        if pool is None:
+            pool = get_pool()
+
+        self.algorithm = algorithm
+        self.cache = cache
+        self.pool = pool
+
+        # Records in order with the chunk and index of their file
+        self.queue = deque()
+        self.chunk = None
+
+        self.files = 0
+        self.cached = 0
+        self.bytes = 0
+        self.start = None
+        self.end = None
+
+    def add(self, record, path=None, stats=None):
+        "Queues a record and the file to hash into its attributes, if any."
+        if path is None:
+            self.queue.append((record, None, None))
+            return
+
+        path = os.path.abspath(path)
+        digest = self.cache.get(path, self.algorithm, stats)
+
+        if digest is not None:
+            record[1][self.algorithm] = digest
+            self.cached += 1
+            self.queue.append((record, None, None))
+            return
+
+        if self.chunk is None:
+            self.chunk = {
+                'items': [],
+                'size': 0,
+                'future': None,
+                'digests': None,
+            }
+
+        chunk = self.chunk
+        chunk['items'].append((path, stats))
+        chunk['size'] += stats.st_size
+
+        self.queue.append((record, chunk, len(chunk['items']) - 1))
+
+        if len(chunk['items']) >= CHUNK_FILES or \
+                chunk['size'] >= CHUNK_BYTES:
+            self.submit(chunk)
+
+    def submit(self, chunk):
+        if self.start is None:
+            self.start = time.perf_counter()
+
+        paths = [path for path, stats in chunk['items']]
+        chunk['future'] = self.pool.submit(hash_files, paths, self.algorithm)
+
+        if chunk is self.chunk:
+            self.chunk = None
+
+    def collect(self, chunk):
+        chunk['digests'] = chunk['future'].result()
+        self.end = time.perf_counter()
+
+        items = []
+
+        for (path, stats), digest in zip(chunk['items'], chunk['digests']):
+            if digest is not None:
+                self.files += 1
+                self.bytes += stats.st_size
+                items.append((path, stats, digest))
+
+        self.cache.set_many(self.algorithm, items)
+
+    def pop(self, limit=MAX_PENDING):
+        """Yields the records whose checksums are known, waiting on the
+        workers while more than `limit` records are held back.
+        """
+        while self.queue:
+            record, chunk, index = self.queue[0]
+            wait = len(self.queue) > limit
+
+            if chunk is not None and chunk['digests'] is None:
+                if chunk['future'] is None:
+                    if not wait:
+                        break
+
+                    self.submit(chunk)
+
+                if not wait and not chunk['future'].done():
+                    break
+
+                self.collect(chunk)
+
+            if chunk is not None and chunk['digests'][index] is not None:
+                record[1][self.algorithm] = chunk['digests'][index]
+
+            self.queue.popleft()
+            yield record
+
+    def stats(self):
+        "Returns the number of files and bytes hashed and the throughput."
+        seconds = 0
+        throughput = None
+
+        if self.start is not None and self.end is not None:
+            seconds = self.end - self.start
+
+        # In GB/s
+        if seconds:
+            throughput = round(self.bytes / seconds / 1e9, 3)
+
+        return {
+            'algorithm': self.algorithm,
+            'hashed': self.files,
+            'cached': self.cached,
+            'bytes': self.bytes,
+            'seconds': round(seconds, 3),
+            'throughput': throughput,
+        }
@@ -0,0 +1,333 @@
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from urllib.parse import urlsplit, urlunsplit
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from . import sources, utils
+
+
+# Number of jobs run at once. Further jobs are queued.
+WORKERS = int(os.environ.get('PROV_EXTRACTOR_JOB_WORKERS', 4))
+
+# Maximum number of finished jobs kept and number of seconds they are kept
+# for. Queued and running jobs are never evicted.
+RETENTION = int(os.environ.get('PROV_EXTRACTOR_JOB_RETENTION', 100))
+
+TTL = int(os.environ.get('PROV_EXTRACTOR_JOB_TTL', 3600))
+
+# Optional path of a SQLite database to keep jobs in. Jobs are kept in
+# memory by default.
+STORE_PATH = os.environ.get('PROV_EXTRACTOR_JOB_STORE')
+
+# Number of records extracted between progress updates.
+PROGRESS_INTERVAL = 1000
+
+# Options holding credentials, which are not kept with jobs.
+SECRET_OPTIONS = ('password', 'token')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+FINISHED = (DONE, FAILED)
+
+
+def redact_uri(value):
+    "Returns the URI with the password of its user info masked."
+    parts = urlsplit(value)
+
+    if not parts.password:
+        return value
+
+    netloc = '{}:***@{}'.format(parts.username,
+                                parts.netloc.rpartition('@')[2])
+
+    return urlunsplit(parts._replace(netloc=netloc))
+
+
+def redact(options):
+    """Returns the options without credentials, which are only needed to run
+    the job. Secret options are dropped and passwords in URIs are masked.
+    """
+    redacted = {}
+
+    for key, value in options.items():
+        if key in SECRET_OPTIONS:
+            continue
+
+        if isinstance(value, str) and '://' in value:
+            value = redact_uri(value)
+
+        redacted[key] = value
+
+    return redacted
+
+
+def secrets(options):
+    "Returns the credential values in the options."
+    values = []
+
+    for key, value in options.items():
+        if key in SECRET_OPTIONS and value:
+            values.append(str(value))
+        elif isinstance(value, str) and '://' in value:
+            password = urlsplit(value).password
+
+            if password:
+                values.append(password)
+
+    return values
+
+
+def scrub(message, options):
+    """Returns the message with the credentials in the options masked, since
+    errors may repeat the options they were raised for.
+    """
+    for value in secrets(options):
+        message = message.replace(value, '***')
+
+    return message
+
+
+def new_job(name, options):
+    return {
+        'id': uuid.uuid4().hex,
+        'source': name,
+        'options': redact(options),
+        'status': QUEUED,
+        'progress': 0,
+        'created': utils.timestamp(),
+        'started': None,
+        'finished': None,
+        'error': None,
+        'result': None,
+    }
+
+
+def expired(job, ttl, now):
+    "Returns true if a finished job is past its time-to-live."
+    return job['finished'] is not None and \
+        now - job['finished'] > ttl * 1000
+
+
+class MemoryJobStore():
+    "Jobs kept in memory in the order they were created."
+    def __init__(self, retention=RETENTION, ttl=TTL):
+        self.retention = retention
+        self.ttl = ttl
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, job):
+        with self.lock:
+            self.jobs[job['id']] = job
+            self.evict()
+
+    def update(self, jid, **attrs):
+        with self.lock:
+            if jid in self.jobs:
+                self.jobs[jid].update(attrs)
+
+            if attrs.get('status') in FINISHED:
+                self.evict()
+
+    def get(self, jid):
+        with self.lock:
+            self.evict()
+            job = self.jobs.get(jid)
+
+            if job is not None:
+                return dict(job)
+
+    def evict(self):
+        """Removes the expired jobs and the oldest finished jobs beyond the
+        retention. The lock must be held by the caller.
+        """
+        now = utils.timestamp()
+        finished = [job for job in self.jobs.values()
+                    if job['status'] in FINISHED]
+
+        for index, job in enumerate(finished):
+            if len(finished) - index > self.retention or \
+                    expired(job, self.ttl, now):
+                del self.jobs[job['id']]
+
+
+class SQLiteJobStore():
+    """Jobs kept in a local SQLite database, so results survive restarts.
+    Jobs that were queued or running when the process stopped are marked
+    as failed.
+    """
+    columns = ('id', 'source', 'options', 'status', 'progress', 'created',
+               'started', 'finished', 'error', 'result')
+
+    # Columns stored as JSON
+    encoded = ('options', 'error', 'result')
+
+    def __init__(self, path, retention=RETENTION, ttl=TTL):
+        self.retention = retention
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+
+        with self.db:
+            self.db.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    source TEXT,
+                    options TEXT,
+                    status TEXT,
+                    progress INTEGER,
+                    created INTEGER,
+                    started INTEGER,
+                    finished INTEGER,
+                    error TEXT,
+                    result TEXT
+                )
+            ''')
+
+            self.db.execute('''
+                UPDATE jobs SET status = ?, finished = ?, error = ?
+                WHERE status IN (?, ?)
+            ''', (FAILED, utils.timestamp(),
+                  json.dumps({'message': 'interrupted'}), QUEUED, RUNNING))
+
+    def encode(self, key, value):
+        if key in self.encoded and value is not None:
+            return json.dumps(value)
+
+        return value
+
+    def decode(self, key, value):
+        if key in self.encoded and value is not None:
+            return json.loads(value)
+
+        return value
+
+    def add(self, job):
+        values = [self.encode(k, job[k]) for k in self.columns]
+
+        with self.lock, self.db:
+            self.db.execute('INSERT INTO jobs ({}) VALUES ({})'.format(
+                ', '.join(self.columns), ', '.join('?' * len(values))),
+                values)
+
+            self.evict()
+
+    def update(self, jid, **attrs):
+        keys = list(attrs)
+        values = [self.encode(k, attrs[k]) for k in keys]
+
+        with self.lock, self.db:
+            self.db.execute('UPDATE jobs SET {} WHERE id = ?'.format(
+                ', '.join('{} = ?'.format(k) for k in keys)),
+                values + [jid])
+
+            if attrs.get('status') in FINISHED:
+                self.evict()
+
+    def get(self, jid):
+        with self.lock, self.db:
+            self.evict()
+
+            row = self.db.execute('SELECT * FROM jobs WHERE id = ?',
+                                  (jid,)).fetchone()
+
+        if row is not None:
+            return {k: self.decode(k, row[k]) for k in self.columns}
+
+    def evict(self):
+        """Removes the expired jobs and the oldest finished jobs beyond the
+        retention. The lock must be held by the caller.
+        """
+        now = utils.timestamp()
+
+        self.db.execute('''
+            DELETE FROM jobs
+            WHERE finished IS NOT NULL AND finished < ?
+        ''', (now - self.ttl * 1000,))
+
+        self.db.execute('''
+            DELETE FROM jobs
+            WHERE id IN (
+                SELECT id FROM jobs
+                WHERE finished IS NOT NULL
+                ORDER BY created DESC
+                LIMIT -1 OFFSET ?
+            )
+        ''', (self.retention,))
+
+
+class JobManager():
+    """Runs extractions on a bounded pool of worker threads and keeps their
+    status, progress and result in a job store.
+    """
+    def __init__(self, store, workers=WORKERS):
+        self.store = store
+        self.pool = ThreadPoolExecutor(workers)
+
+    def submit(self, name, options, meta):
+        """Queues the extraction of a source and returns the job. The meta
+        is included in the result with the metadata of the client.
+        """
+        job = new_job(name, options)
+        self.store.add(dict(job))
+        self.pool.submit(self.run, job['id'], name, options, meta)
+
+        return job
+
+    def get(self, jid):
+        return self.store.get(jid)
+
+    def run(self, jid, name, options, meta):
+        self.store.update(jid, status=RUNNING, started=utils.timestamp())
+
+        try:
+            client = sources.get(name)(**options)
+            document = client.document_class()
+            progress = 0
+
+            for record in client.iter_records():
+                document.add(*record)
+                progress += 1
+
+                if progress % PROGRESS_INTERVAL == 0:
+                    self.store.update(jid, progress=progress)
+
+            result = document.resolve()
+            result['_meta'] = meta
+            result['_meta'].update(client.meta)
+        except Exception as e:
+            self.store.update(jid, status=FAILED,
+                              finished=utils.timestamp(),
+                              error={'message': scrub(str(e), options)})
+            return
+
+        self.store.update(jid, status=DONE, finished=utils.timestamp(),
+                          progress=progress, result=result)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    "Returns the job manager, creating it on first use."
+    global _manager
+
+    with _manager_lock:
+        if _manager is None:
+            if STORE_PATH:
+                store = SQLiteJobStore(STORE_PATH)
+            else:
+                store = MemoryJobStore()
+
+            _manager = JobManager(store)
+
+        return _manager
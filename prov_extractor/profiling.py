@@ -0,0 +1,301 @@
+import re
+import math
+import hashlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Values counted as missing.
+NULL_VALUES = frozenset(['', 'NA', 'N/A', 'NULL', 'null'])
+
+# Inferred types from the most to the least specific. A column has the
+# first type all of its values conform to. Booleans and dates only widen to
+# strings.
+INTEGER = 'integer'
+NUMBER = 'number'
+BOOLEAN = 'boolean'
+DATE = 'date'
+DATETIME = 'datetime'
+STRING = 'string'
+
+NUMERIC_TYPES = (INTEGER, NUMBER)
+
+# Grammar of integers and numbers. Integers must fit in 64 bits and numbers
+# must be finite.
+INTEGER_RE = re.compile(r'[-+]?[0-9]+\Z')
+NUMBER_RE = re.compile(r'[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\Z')
+
+# Characters of integers and numbers. Among the strings made of these
+# characters, NumPy parses exactly the strings of the grammar.
+INTEGER_CHARS = b'+-0123456789'
+NUMBER_CHARS = INTEGER_CHARS + b'.eE'
+INTEGER_MIN = -2 ** 63
+INTEGER_MAX = 2 ** 63 - 1
+BOOLEAN_VALUES = frozenset(['true', 'false', 'True', 'False', 'TRUE',
+                            'FALSE'])
+DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}$')
+DATETIME_RE = re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?'
+                         r'(Z|[-+]\d{2}:?\d{2})?$')
+
+
+def conforms(values, type):
+    "Returns true if all values conform to the type."
+    if type == INTEGER:
+        return all(INTEGER_RE.match(v) for v in values)
+
+    if type == NUMBER:
+        return all(NUMBER_RE.match(v) for v in values)
+
+    if type == BOOLEAN:
+        return all(v in BOOLEAN_VALUES for v in values)
+
+    if type == DATE:
+        return all(DATE_RE.match(v) for v in values)
+
+    if type == DATETIME:
+        return all(DATETIME_RE.match(v) or DATE_RE.match(v) for v in values)
+
+    return True
+
+
+def candidates(type):
+    "Returns the types a column of the type may still have."
+    if type is None:
+        return (INTEGER, NUMBER, BOOLEAN, DATE, DATETIME, STRING)
+
+    if type == INTEGER:
+        return (INTEGER, NUMBER, STRING)
+
+    if type == DATE:
+        return (DATE, DATETIME, STRING)
+
+    if type in (NUMBER, DATETIME, BOOLEAN):
+        return (type, STRING)
+
+    return (STRING,)
+
+
+def to_numbers(values, type):
+    """Returns the values conforming to the type converted to numbers, as an
+    array if NumPy is available. Returns None if a value is out of range,
+    that is an integer not fitting in 64 bits or a number overflowing to
+    infinity.
+    """
+    if numpy is None:
+        if type == INTEGER:
+            numbers = [int(v) for v in values]
+
+            if min(numbers) < INTEGER_MIN or max(numbers) > INTEGER_MAX:
+                return
+
+            return numbers
+
+        numbers = [float(v) for v in values]
+
+        if not all(math.isfinite(n) for n in numbers):
+            return
+
+        return numbers
+
+    dtype = numpy.int64 if type == INTEGER else numpy.float64
+
+    try:
+        array = numpy.array(values, dtype=dtype)
+    except (ValueError, OverflowError):
+        return
+
+    if type == NUMBER and not numpy.isfinite(array).all():
+        return
+
+    return array
+
+
+def char_table(chars):
+    "Returns a lookup table of the bytes that are one of the characters."
+    table = numpy.zeros(256, dtype=bool)
+    table[list(chars)] = True
+
+    return table
+
+
+def infer_array(values, type):
+    """Infers the numeric type of the values with NumPy. The characters of
+    all values are looked up at once and the values are then parsed as a
+    whole, which rejects the strings outside of the grammar.
+    """
+    try:
+        data = ''.join(values).encode('ascii')
+    except UnicodeEncodeError:
+        return None, None
+
+    data = numpy.frombuffer(data, dtype=numpy.uint8)
+
+    for candidate in candidates(type):
+        if candidate not in NUMERIC_TYPES:
+            break
+
+        chars = INTEGER_CHARS if candidate == INTEGER else NUMBER_CHARS
+
+        if not char_table(chars)[data].all():
+            continue
+
+        numbers = to_numbers(values, candidate)
+
+        if numbers is not None:
+            return candidate, numbers
+
+    return None, None
+
+
+def infer_numbers(values, type):
+    """Returns the numeric type of the values and the values as numbers, or
+    None if they are not numeric. Values are inferred as a whole with NumPy
+    and matched one at a time otherwise.
+    """
+    if numpy is not None:
+        return infer_array(values, type)
+
+    for candidate in candidates(type):
+        if candidate not in NUMERIC_TYPES:
+            break
+
+        if not conforms(values, candidate):
+            continue
+
+        numbers = to_numbers(values, candidate)
+
+        if numbers is not None:
+            return candidate, numbers
+
+    return None, None
+
+
+class HyperLogLog():
+    """Estimates the number of distinct values in fixed memory of 2 **
+    precision registers. Values are hashed with 64-bit BLAKE2, so estimates
+    are the same across runs. The standard error is 1.04 / sqrt(registers).
+    """
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self.width = 64 - precision
+        self.mask = (1 << self.width) - 1
+
+    def add(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8', 'replace'),
+                                 digest_size=8).digest()
+        h = int.from_bytes(digest, 'big')
+
+        index = h >> self.width
+        rank = self.width - (h & self.mask).bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def estimate(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+
+        # Linear counting is more accurate for small cardinalities
+        zeros = self.registers.count(0)
+
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+
+class ColumnProfile():
+    """Profile of the values of a column updated one chunk of values at a
+    time. Memory does not depend on the number of values: the inferred
+    type, the counts, the minimum and maximum and a HyperLogLog sketch of
+    the distinct values are kept.
+    """
+    def __init__(self, precision=12):
+        self.type = None
+        self.count = 0
+        self.null_count = 0
+        self.distinct = HyperLogLog(precision)
+
+        # Bounds of the numeric values while the column is numeric and
+        # bounds of the string values
+        self.min_number = None
+        self.max_number = None
+        self.min_string = None
+        self.max_string = None
+
+    def update(self, values):
+        count = len(values)
+        values = [v for v in values if v not in NULL_VALUES]
+
+        self.count += count
+        self.null_count += count - len(values)
+
+        if not values:
+            return
+
+        self.update_type(values)
+
+        low, high = min(values), max(values)
+
+        if self.min_string is None or low < self.min_string:
+            self.min_string = low
+
+        if self.max_string is None or high > self.max_string:
+            self.max_string = high
+
+        # Repeated values are only hashed once per chunk
+        self.distinct.update(set(values))
+
+    def update_type(self, values):
+        if self.type in (None, INTEGER, NUMBER):
+            type, numbers = infer_numbers(values, self.type)
+
+            if type is not None:
+                self.type = type
+
+                if numpy is None:
+                    low, high = min(numbers), max(numbers)
+                else:
+                    low, high = numbers.min(), numbers.max()
+
+                if self.min_number is None or low < self.min_number:
+                    self.min_number = low
+
+                if self.max_number is None or high > self.max_number:
+                    self.max_number = high
+
+                return
+
+        for type in candidates(self.type):
+            if type not in NUMERIC_TYPES and conforms(values, type):
+                self.type = type
+                return
+
+    def result(self):
+        if self.type in NUMERIC_TYPES:
+            low, high = self.min_number, self.max_number
+
+            # NumPy scalars are not serializable
+            if numpy is not None:
+                low, high = low.item(), high.item()
+        else:
+            low, high = self.min_string, self.max_string
+
+        return {
+            'type': self.type,
+            'count': self.count,
+            'null_count': self.null_count,
+            'distinct_count': self.distinct.estimate(),
+            'min': low,
+            'max': high,
+        }
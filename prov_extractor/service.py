@@ -1,15 +1,64 @@
+import os
 import json
-from flask import Flask, request, url_for
+import time
+import hashlib
+import tempfile
+from flask import Flask, Response, request, url_for
 from .exceptions import UnknownSource, SourceNotSupported
-from . import sources, utils
+from .cache import DiskCache, MemoryCache, TieredCache
+from .sources import base
+from . import sources, utils, batch, jobs, watch
 
 
 app = Flask(__name__)
 
+JSON_MIMETYPE = 'application/json'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+EVENTS_MIMETYPE = 'text/event-stream'
+
 DEFAULT_HEADERS = {
-    'Content-Type': 'application/json',
+    'Content-Type': JSON_MIMETYPE,
 }
 
+TRUE_VALUES = ('1', 'true', 'yes')
+
+# Time-to-live in seconds, maximum size in bytes of the memory tier and
+# directory and maximum size in bytes of the disk tier of the result cache.
+RESULT_CACHE_TTL = int(os.environ.get('PROV_EXTRACTOR_RESULT_CACHE_TTL',
+                                      300))
+
+RESULT_CACHE_MEMORY = int(os.environ.get(
+    'PROV_EXTRACTOR_RESULT_CACHE_MEMORY', 64 * 1024 ** 2))
+
+RESULT_CACHE_DIR = os.environ.get('PROV_EXTRACTOR_RESULT_CACHE_DIR',
+                                  os.path.join(tempfile.gettempdir(),
+                                               'prov-extractor-results'))
+
+RESULT_CACHE_SIZE = int(os.environ.get('PROV_EXTRACTOR_RESULT_CACHE_SIZE',
+                                       512 * 1024 ** 2))
+
+results = TieredCache(
+    MemoryCache(RESULT_CACHE_MEMORY, RESULT_CACHE_TTL,
+                size=lambda entry: len(entry['body'])),
+    DiskCache(RESULT_CACHE_DIR, RESULT_CACHE_SIZE, RESULT_CACHE_TTL))
+
+# Maximum number of entity tags and number of seconds they are remembered
+# for. Tags are only remembered for sources with a fingerprint, so a
+# conditional request can be answered without extracting.
+ETAG_CACHE_SIZE = int(os.environ.get('PROV_EXTRACTOR_ETAG_CACHE_SIZE',
+                                     10000))
+
+ETAG_CACHE_TTL = int(os.environ.get('PROV_EXTRACTOR_ETAG_CACHE_TTL', 3600))
+
+etags = MemoryCache(ETAG_CACHE_SIZE, ETAG_CACHE_TTL, size=lambda etag: 1)
+
+# Maximum number of seconds a long-poll of a watch waits for changes and
+# seconds between keep-alive comments of event streams.
+WATCH_POLL_TIMEOUT = int(os.environ.get('PROV_EXTRACTOR_WATCH_POLL_TIMEOUT',
+                                        60))
+
+WATCH_KEEPALIVE = 15
+
 
 def jsonify(data):
     if app.debug:
@@ -18,6 +67,143 @@ def jsonify(data):
     return json.dumps(data)
 
 
+def wants_stream():
+    """Returns true if the client asked for a newline-delimited stream by
+    the `stream` query parameter or the Accept header.
+    """
+    if request.args.get('stream', '').lower() in TRUE_VALUES:
+        return True
+
+    match = request.accept_mimetypes.best_match([JSON_MIMETYPE,
+                                                 NDJSON_MIMETYPE])
+
+    return match == NDJSON_MIMETYPE
+
+
+def document_class():
+    """Returns the compact document class if the client asked for it by the
+    `compact` query parameter, or None for the document class of the source.
+    """
+    if request.args.get('compact', '').lower() in TRUE_VALUES:
+        return base.CompactDocument
+
+
+def dumps(document):
+    "Serializes a document without resolving it, indented in debug mode."
+    if app.debug:
+        return document.dumps(indent=4, sort_keys=True)
+
+    return document.dumps()
+
+
+def wants_cache():
+    """Returns true if the client opted in to cached results by the `cache`
+    query parameter and did not ask to bypass caches.
+    """
+    if request.args.get('cache', '').lower() not in TRUE_VALUES:
+        return False
+
+    return 'no-cache' not in request.headers.get('Cache-Control', '')
+
+
+def result_key(name, client, fingerprint):
+    """Returns the cache key of an extract. It is made of the source, the
+    validated options, which include the defaults, and the fingerprint of
+    the content if the source has one.
+    """
+    return json.dumps([name, vars(client.options), fingerprint],
+                      sort_keys=True)
+
+
+def content_etag(body):
+    """Returns the entity tag of a serialized document, a hash of the bytes
+    of its records as they are sent. The metadata is added afterwards, so
+    the tag only changes when the records do.
+    """
+    return hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+
+def add_meta(body, meta):
+    """Returns the serialized document with the metadata as its last member,
+    so the records are not serialized again.
+    """
+    body = body.rstrip()[:-1].rstrip()
+
+    # No records
+    if body == '{':
+        return jsonify({'_meta': meta})
+
+    meta = jsonify(meta)
+
+    # Documents are indented in debug mode
+    if app.debug:
+        return '{},\n    "_meta": {}\n}}'.format(
+            body, meta.replace('\n', '\n    '))
+
+    return '{}, "_meta": {}}}'.format(body, meta)
+
+
+def not_modified(etag):
+    "Returns true if the entity tag matches the If-None-Match header."
+    return etag is not None and request.if_none_match.contains_weak(etag)
+
+
+def not_modified_response(etag):
+    return '', 304, {'ETag': '"{}"'.format(etag)}
+
+
+def cached_response(entry, hit):
+    age = int(time.time() - entry['created'])
+
+    if not_modified(entry['etag']):
+        return not_modified_response(entry['etag'])
+
+    headers = dict(DEFAULT_HEADERS)
+    headers['ETag'] = '"{}"'.format(entry['etag'])
+    headers['Cache-Control'] = 'private, max-age={}'.format(
+        max(RESULT_CACHE_TTL - age, 0))
+    headers['Age'] = str(age)
+    headers['X-Cache'] = 'HIT' if hit else 'MISS'
+
+    return entry['body'], 200, headers
+
+
+def client_meta(Client):
+    "Timestamp and client metadata included with each extract."
+    return {
+        'time': utils.timestamp(),
+        'client': {
+            'name': Client.name,
+            'description': Client.description,
+            'version': Client.version,
+        }
+    }
+
+
+def stream_records(client, meta):
+    """Generates the extract as newline-delimited JSON. The first line is
+    the metadata followed by one line per record. Each record is a PROV-JSON
+    fragment, so merging the lines produces the non-streamed document. If
+    the client adds metadata while extracting, the complete metadata is
+    repeated as the last line.
+    """
+    meta.update(client.meta)
+    yield json.dumps({'_meta': meta}) + '\n'
+
+    try:
+        for concept, cid, attrs in client.iter_records():
+            yield json.dumps({concept: {cid: attrs}}) + '\n'
+    except Exception as e:
+        # The status has already been sent, so the error is reported as
+        # the final line of the stream.
+        yield json.dumps({'_error': {'message': str(e)}}) + '\n'
+        return
+
+    if any(meta.get(key) != value for key, value in client.meta.items()):
+        meta.update(client.meta)
+        yield json.dumps({'_meta': meta}) + '\n'
+
+
 @app.route('/', methods=['GET'])
 def list_sources():
     items = []
@@ -76,16 +262,300 @@ def source(name):
     except Exception as e:
         return jsonify({'message': str(e)}), 422
 
-    data = client.generate()
+    # Extractions that depend on state kept between runs must not be
+    # answered from a cache or with a 304, since repeating them differs.
+    cacheable = client.cacheable()
+    cache = wants_cache() and cacheable and not request.files
 
-    # Add timestamp and client metadata
-    data['_meta'] = {
-        'time': utils.timestamp(),
-        'client': {
-            'name': Client.name,
-            'description': Client.description,
-            'version': Client.version,
-        }
+    # Fingerprinting may be as costly as a walk of the resource, so it is
+    # only done for conditional and cached requests. Uploaded files cannot
+    # be fingerprinted.
+    if request.files or not cacheable or \
+            not (request.if_none_match or cache):
+        fingerprint = None
+    else:
+        fingerprint = client.fingerprint()
+
+    key = result_key(name, client, fingerprint)
+
+    # The extract is unchanged if the tag of the last extract with the same
+    # fingerprint matches. Cacheable extractions have no side effects, so
+    # this holds for POST requests as well.
+    if fingerprint is not None:
+        etag = etags.get(key)
+
+        if not_modified(etag):
+            client.close()
+            return not_modified_response(etag)
+
+    if wants_stream():
+        return Response(stream_records(client, client_meta(Client)),
+                        mimetype=NDJSON_MIMETYPE)
+
+    if cache:
+        entry = results.get(key)
+
+        # The entry may have been promoted from disk to memory
+        if entry and time.time() - entry['created'] <= RESULT_CACHE_TTL:
+            client.close()
+            return cached_response(entry, hit=True)
+
+    document = client.extract(document_class())
+
+    # The records are serialized once and the tag is a hash of their bytes
+    body = dumps(document)
+
+    # Only the serialized records are kept from here on
+    del document
+    etag = content_etag(body) if cacheable else None
+
+    if fingerprint is not None:
+        etags.set(key, etag)
+
+    if not_modified(etag):
+        return not_modified_response(etag)
+
+    # Add timestamp, client and extract metadata
+    meta = client_meta(Client)
+    meta.update(client.meta)
+
+    body = add_meta(body, meta)
+
+    if not cache:
+        headers = dict(DEFAULT_HEADERS)
+
+        if etag is not None:
+            headers['ETag'] = '"{}"'.format(etag)
+
+        return body, 200, headers
+
+    entry = {
+        'created': time.time(),
+        'etag': etag,
+        'body': body,
     }
 
+    results.set(key, entry)
+
+    return cached_response(entry, hit=False)
+
+
+def stream_batch(results, meta):
+    """Generates batch results as newline-delimited JSON. The first line is
+    the metadata followed by one line per input, in order, with the index
+    of the input and either its document and metadata or its error.
+    """
+    yield json.dumps({'_meta': meta}) + '\n'
+
+    for index, result in enumerate(results):
+        line = {'index': index}
+
+        if 'error' in result:
+            line['_error'] = result['error']
+        else:
+            line['document'] = result['document']
+            line['_meta'] = result['meta']
+
+        yield json.dumps(line) + '\n'
+
+
+@app.route('/<name>/batch/', methods=['POST'])
+def source_batch(name):
+    """Extracts a list of option sets for the same source across the
+    process pool. Inputs that fail are reported without aborting the batch.
+    """
+    try:
+        Client = sources.get(name)
+    except UnknownSource:
+        return '', 404
+    except SourceNotSupported:
+        return jsonify({
+            'message': 'Source not supported',
+        }), 422
+
+    items = request.json
+
+    if not isinstance(items, list) or \
+            not all(isinstance(options, dict) for options in items):
+        return jsonify({'message': 'expected a list of options'}), 422
+
+    results = batch.extract_many(name, items)
+
+    if wants_stream():
+        return Response(stream_batch(results, client_meta(Client)),
+                        mimetype=NDJSON_MIMETYPE)
+
+    data, meta = batch.bundle(results)
+
+    data['_meta'] = client_meta(Client)
+    data['_meta']['items'] = meta
+
     return jsonify(data), 200, DEFAULT_HEADERS
+
+
+def job_attrs(job):
+    "Returns the attributes of a job exposed by the API."
+    attrs = {
+        'id': job['id'],
+        'source': job['source'],
+        'status': job['status'],
+        'progress': {
+            'records': job['progress'],
+        },
+        'created': job['created'],
+        'started': job['started'],
+        'finished': job['finished'],
+        'url': url_for('job', jid=job['id'], _external=True),
+    }
+
+    if job['error'] is not None:
+        attrs['error'] = job['error']
+
+    if job['result'] is not None:
+        attrs['result'] = job['result']
+
+    return attrs
+
+
+@app.route('/<name>/jobs/', methods=['POST'])
+def source_jobs(name):
+    """Queues the extraction and returns the job right away. The status,
+    progress and result of the job are polled from its URL.
+    """
+    try:
+        Client = sources.get(name)
+    except UnknownSource:
+        return '', 404
+    except SourceNotSupported:
+        return jsonify({
+            'message': 'Source not supported',
+        }), 422
+
+    options = request.json or {}
+
+    # Options are validated up front, the client is set up by the job
+    try:
+        Client.validate(dict(options))
+    except Exception as e:
+        return jsonify({'message': str(e)}), 422
+
+    job = jobs.get_manager().submit(name, options, client_meta(Client))
+    attrs = job_attrs(job)
+
+    headers = dict(DEFAULT_HEADERS)
+    headers['Location'] = attrs['url']
+
+    return jsonify(attrs), 202, headers
+
+
+@app.route('/jobs/<jid>/', methods=['GET'])
+def job(jid):
+    job = jobs.get_manager().get(jid)
+
+    if job is None:
+        return '', 404
+
+    return jsonify(job_attrs(job)), 200, DEFAULT_HEADERS
+
+
+def watch_attrs(watcher):
+    "Returns the attributes of a watch exposed by the API."
+    attrs = watcher.attrs()
+    attrs['url'] = url_for('watch_deltas', wid=watcher.id, _external=True)
+
+    return attrs
+
+
+@app.route('/<name>/watches/', methods=['POST'])
+def source_watches(name):
+    """Starts watching the directory given by the options, or returns the
+    existing watch of the directory. Changes are read from the URL of the
+    watch.
+    """
+    try:
+        Client = sources.get(name)
+    except UnknownSource:
+        return '', 404
+    except SourceNotSupported:
+        return jsonify({
+            'message': 'Source not supported',
+        }), 422
+
+    if not getattr(Client, 'watchable', False):
+        return jsonify({'message': 'Source cannot be watched'}), 422
+
+    try:
+        client = Client(**(request.json or {}))
+        watcher, created = watch.watchers.register(client)
+    except Exception as e:
+        return jsonify({'message': str(e)}), 422
+
+    attrs = watch_attrs(watcher)
+
+    headers = dict(DEFAULT_HEADERS)
+    headers['Location'] = attrs['url']
+
+    return jsonify(attrs), 201 if created else 200, headers
+
+
+def stream_deltas(watcher, since):
+    """Generates the deltas of a watch as server-sent events as they are
+    made. The id of each event is the sequence number of the delta, so
+    reconnecting clients resume from the Last-Event-ID.
+    """
+    while True:
+        deltas = watcher.wait(since, WATCH_KEEPALIVE)
+
+        for delta in deltas:
+            yield 'id: {}\nevent: delta\ndata: {}\n\n'.format(
+                delta['seq'], json.dumps(delta))
+
+            since = delta['seq']
+
+        if watcher.stopped and not deltas:
+            yield 'event: stopped\ndata: {}\n\n'
+            return
+
+        if not deltas:
+            yield ': keep-alive\n\n'
+
+
+@app.route('/watches/<wid>/', methods=['GET', 'DELETE'])
+def watch_deltas(wid):
+    """Returns the deltas of a watch after the `since` sequence number,
+    waiting up to `timeout` seconds for one, or streams them as server-sent
+    events if asked for by the Accept header.
+    """
+    watcher = watch.watchers.get(wid)
+
+    if watcher is None:
+        return '', 404
+
+    if request.method == 'DELETE':
+        watch.watchers.remove(wid)
+        return '', 204
+
+    match = request.accept_mimetypes.best_match([JSON_MIMETYPE,
+                                                 EVENTS_MIMETYPE])
+
+    if match == EVENTS_MIMETYPE:
+        since = request.headers.get('Last-Event-ID',
+                                    request.args.get('since', watcher.seq))
+
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({'message': 'since must be an integer'}), 422
+
+        return Response(stream_deltas(watcher, since),
+                        mimetype=EVENTS_MIMETYPE,
+                        headers={'Cache-Control': 'no-cache'})
+
+    since = request.args.get('since', 0, type=int)
+    timeout = request.args.get('timeout', WATCH_POLL_TIMEOUT, type=float)
+
+    attrs = watch_attrs(watcher)
+    attrs['deltas'] = watcher.wait(since, min(timeout, WATCH_POLL_TIMEOUT))
+    attrs['seq'] = watcher.seq
+
+    return jsonify(attrs), 200, DEFAULT_HEADERS
@@ -0,0 +1,120 @@
+import os
+import json
+import sqlite3
+import hashlib
+import tempfile
+from . import utils
+
+
+# Directory of the snapshot databases, one per directory tree and set of
+# options that select its files.
+SNAPSHOT_DIR = os.environ.get('PROV_EXTRACTOR_SNAPSHOT_DIR',
+                              os.path.join(tempfile.gettempdir(),
+                                           'prov-extractor-snapshots'))
+
+
+def snapshot_path(key, directory=None):
+    "Returns the path of the snapshot database of a key."
+    if directory is None:
+        directory = SNAPSHOT_DIR
+
+    key = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8'))
+
+    return os.path.join(directory, key.hexdigest() + '.sqlite')
+
+
+class Snapshot():
+    """Index of the directories and files of a tree as of the last
+    extraction, kept in a local SQLite database.
+
+    Paths are relative to the root of the tree. Directories keep their
+    modification time and inode, so unchanged directories do not need to
+    be listed again, and files keep their size, modification time, inode
+    and the revision last extracted.
+    """
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.db = sqlite3.connect(path)
+
+        with self.db:
+            self.db.execute('''
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    time INTEGER
+                )
+            ''')
+
+            self.db.execute('''
+                CREATE TABLE IF NOT EXISTS dirs (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT,
+                    mtime_ns INTEGER,
+                    inode INTEGER
+                )
+            ''')
+
+            self.db.execute('''
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    inode INTEGER,
+                    revision INTEGER
+                )
+            ''')
+
+    def close(self):
+        self.db.close()
+
+    def last_run(self):
+        "Returns the number of the last run or None if there was none."
+        row = self.db.execute('SELECT max(id) FROM runs').fetchone()
+        return row[0]
+
+    def load_dirs(self):
+        "Returns a dict of directory path to (parent, mtime_ns, inode)."
+        rows = self.db.execute('''
+            SELECT path, parent, mtime_ns, inode FROM dirs
+        ''')
+
+        return {row[0]: row[1:] for row in rows}
+
+    def load_files(self):
+        """Returns a dict of file path to (parent, size, mtime_ns, inode,
+        revision).
+        """
+        rows = self.db.execute('''
+            SELECT path, parent, size, mtime_ns, inode, revision FROM files
+        ''')
+
+        return {row[0]: row[1:] for row in rows}
+
+    def save(self, dirs, files, removed_dirs, removed_files):
+        """Records a run. `dirs` and `files` are rows of the directories and
+        files that were added or changed, in the column order of the loaded
+        values prefixed with the path. Returns the number of the run.
+        """
+        with self.db:
+            cursor = self.db.execute('INSERT INTO runs (time) VALUES (?)',
+                                     (utils.timestamp(),))
+
+            self.db.executemany('''
+                INSERT OR REPLACE INTO dirs (path, parent, mtime_ns, inode)
+                VALUES (?, ?, ?, ?)
+            ''', dirs)
+
+            self.db.executemany('''
+                INSERT OR REPLACE INTO files
+                    (path, parent, size, mtime_ns, inode, revision)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', files)
+
+            self.db.executemany('DELETE FROM dirs WHERE path = ?',
+                                ((path,) for path in removed_dirs))
+
+            self.db.executemany('DELETE FROM files WHERE path = ?',
+                                ((path,) for path in removed_files))
+
+        return cursor.lastrowid
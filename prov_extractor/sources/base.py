@@ -1,4 +1,7 @@
-from ..utils import validate, IdGenerator, remove_newlines
+import os
+import json
+from ..utils import validate, validator, IdGenerator, remove_newlines, \
+    is_remote, file_fingerprint
 from . import JSON_SCHEMA_NS
 
 
@@ -26,6 +29,72 @@ ORDERED_PROV_TERMS = (
 )
 
 
+class Ref():
+    """Reference to a record by the concept it is added under and its
+    `origins:ident`. Records reference other records by Ref attribute
+    values, which are replaced by the identifier of the referenced record
+    when the referencing record is added.
+    """
+    __slots__ = ('concept', 'ident')
+
+    def __init__(self, concept, ident):
+        self.concept = concept
+        self.ident = ident
+
+    def __repr__(self):
+        return 'Ref({!r}, {!r})'.format(self.concept, self.ident)
+
+    def __eq__(self, other):
+        return isinstance(other, Ref) and \
+            (self.concept, self.ident) == (other.concept, other.ident)
+
+    def __hash__(self):
+        return hash((self.concept, self.ident))
+
+    @property
+    def cid(self):
+        "Identifier of the referenced record."
+        return '{}:{}'.format(self.concept, self.ident)
+
+
+def ref(concept, attrs):
+    "Returns the reference of a record added under the concept."
+    if 'origins:ident' not in attrs:
+        raise ValueError('cannot reference record without an '
+                         'origins:ident: {!r}'.format(attrs))
+
+    return Ref(concept, attrs['origins:ident'])
+
+
+def identify(concept, attrs, idr):
+    "Returns the identifier of a record, generating one if it has no ident."
+    if 'origins:ident' in attrs:
+        return '{}:{}'.format(concept, attrs['origins:ident'])
+
+    return idr()
+
+
+def resolve_references(attrs):
+    """Returns the attributes with references mapped to identifiers. The
+    attributes are only copied if they contain a reference.
+    """
+    resolved = attrs
+
+    for key, value in attrs.items():
+        if isinstance(value, Ref):
+            if resolved is attrs:
+                resolved = dict(attrs)
+
+            resolved[key] = value.cid
+
+        # Records are not referenced by value. The $ check is for XSD types.
+        elif isinstance(value, dict) and '$' not in value:
+            raise ValueError('{} references a record by value rather than '
+                             'by Ref: {!r}'.format(key, value))
+
+    return resolved
+
+
 def client_option(key, option):
     if 'anyOf' in option:
         types = [o['type'] for o in option['anyOf']]
@@ -99,6 +168,7 @@ class ClientMetaclass(type):
             schema.update(newcls.options)
 
             newcls.schema = schema
+            newcls.validator = validator(schema)
 
         if '__doc__' not in attrs:
             newcls.__doc__ = client_docstring(newcls)
@@ -107,9 +177,14 @@ class ClientMetaclass(type):
 
 
 class Document(dict):
+    """Records of an extract keyed by concept and identifier.
+
+    References are resolved when a record is added, so records are stored
+    as they will be serialized. A referenced record is given by a Ref or by
+    the identifier returned when it was added.
+    """
     def __init__(self):
         self.idr = IdGenerator()
-        self.cids = {}
 
     def __getitem__(self, key):
         if key not in self:
@@ -118,46 +193,146 @@ class Document(dict):
         return dict.__getitem__(self, key)
 
     def add(self, concept, cid, attrs=None):
+        "Adds a record and returns its identifier."
         # No CID provided, generate one
         if attrs is None:
             attrs = cid
+            cid = identify(concept, attrs, self.idr)
+
+        self[concept][cid] = resolve_references(attrs)
+
+        return cid
+
+    def resolve(self):
+        "Returns the PROV-JSON document. Records are not copied."
+        return dict(self)
+
+    def dumps(self, **kwargs):
+        "Returns the PROV-JSON document serialized by `json.dumps`."
+        return json.dumps(self, **kwargs)
+
+
+class CompactDocument():
+    """Document that stores records compactly for large extracts.
+
+    Each record is stored as a tuple of its values led by the tuple of its
+    keys. Records with the same keys share a single key tuple and equal
+    string values, such as types and references, are shared across records.
+    Records are keyed by their `origins:ident` when their identifier is
+    derived from it, so the identifier itself is not stored. Records are
+    turned back into dicts when the document is resolved, but not when it
+    is serialized.
+    """
+    def __init__(self):
+        self.idr = IdGenerator()
+        self.keys = {}
+        self.strings = {}
+
+        # Records keyed by origins:ident and records keyed by identifier
+        # for each concept.
+        self.idents = {}
+        self.cids = {}
+
+    def compact(self, key, value):
+        # Identifiers are unique, so there is nothing to share
+        if key == 'origins:ident' or not isinstance(value, str):
+            return value
+
+        return self.strings.setdefault(value, value)
+
+    def add(self, concept, cid, attrs=None):
+        "Adds a record and returns its identifier."
+        # No CID provided, generate one
+        if attrs is None:
+            attrs = cid
+            cid = identify(concept, attrs, self.idr)
+
+        attrs = resolve_references(attrs)
+
+        keys = tuple(attrs)
+        keys = self.keys.setdefault(keys, keys)
 
-            # Create an identifier
-            if 'origins:ident' in attrs:
-                cid = '{}:{}'.format(concept, attrs['origins:ident'])
-            else:
-                cid = self.idr()
+        row = [keys]
+        row.extend(self.compact(k, v) for k, v in attrs.items())
+        row = tuple(row)
 
-            # For resolving references at the end
-            self.cids[id(attrs)] = cid
+        ident = attrs.get('origins:ident')
 
-        self[concept][cid] = attrs
+        if ident is not None and cid == '{}:{}'.format(concept, ident):
+            self.idents.setdefault(concept, {})[ident] = row
+        else:
+            self.cids.setdefault(concept, {})[cid] = row
+
+        return cid
+
+    def records(self):
+        "Yields (concept, cid, attrs) for each record in the document."
+        for concept, rows in self.idents.items():
+            for ident, row in rows.items():
+                cid = '{}:{}'.format(concept, ident)
+                yield concept, cid, dict(zip(row[0], row[1:]))
+
+        for concept, rows in self.cids.items():
+            for cid, row in rows.items():
+                yield concept, cid, dict(zip(row[0], row[1:]))
 
     def resolve(self):
+        "Returns the PROV-JSON document."
         doc = {}
 
-        for concept, items in self.items():
-            doc[concept] = {}
+        for concept, cid, attrs in self.records():
+            doc.setdefault(concept, {})[cid] = attrs
 
-            for cid, item in items.items():
-                copy = dict(item)
-                doc[concept][cid] = copy
+        return doc
 
-                # Map value to the identifiers
-                for key, value in copy.items():
-                    if value is None:
-                        continue
+    def iterencode(self):
+        """Yields the PROV-JSON document in chunks, one per record, in the
+        order of `resolve`. Each record is encoded from its row.
+        """
+        encode = json.JSONEncoder().encode
 
-                    # The $ check is for XSD types
-                    if isinstance(value, dict):
-                        if '$' not in value:
-                            try:
-                                copy[key] = self.cids[id(value)]
-                            except KeyError:
-                                raise KeyError('could not find cid for {!r}'
-                                               .format(value))
+        # Encoded members names by key tuple
+        names = {}
 
-        return doc
+        concepts = list(self.idents)
+        concepts.extend(c for c in self.cids if c not in self.idents)
+
+        yield '{'
+
+        for index, concept in enumerate(concepts):
+            yield '{}{}: {{'.format(', ' if index else '', encode(concept))
+
+            rows = [('{}:{}'.format(concept, ident), row) for ident, row
+                    in self.idents.get(concept, {}).items()]
+            rows.extend(self.cids.get(concept, {}).items())
+
+            separator = ''
+
+            for cid, row in rows:
+                keys = row[0]
+
+                if keys not in names:
+                    names[keys] = [encode(key) + ': ' for key in keys]
+
+                members = ', '.join([name + encode(value) for name, value
+                                     in zip(names[keys], row[1:])])
+
+                yield '{}{}: {{{}}}'.format(separator, encode(cid), members)
+                separator = ', '
+
+            yield '}'
+
+        yield '}'
+
+    def dumps(self, **kwargs):
+        """Returns the PROV-JSON document serialized from the rows. Options
+        of `json.dumps`, such as indentation, require the document to be
+        resolved first.
+        """
+        if kwargs:
+            return json.dumps(self.resolve(), **kwargs)
+
+        return ''.join(self.iterencode())
 
 
 class Client(metaclass=ClientMetaclass):
@@ -175,25 +350,108 @@ class Client(metaclass=ClientMetaclass):
 
     options = {}
 
+    # Document class used to collect the records of the extract
+    document_class = Document
+
     @classmethod
     def validate(cls, options):
         """Takes a dict of options and validates them against the client
         options using a JSON schema validator.
         """
-        return Options(validate(options, cls.schema))
+        return Options(validate(options, cls.schema, cls.validator))
 
     def __init__(self, **options):
         self.options = self.validate(options)
-        self.document = Document()
+        self.document = self.document_class()
+
+        # Metadata about the extract, such as the revision of the resource
+        # that was extracted, included in the response.
+        self.meta = {}
+
         self.setup()
 
     def setup(self):
         "Post-initialization setup."
 
+    def cleanup(self):
+        """Releases the resources acquired by the setup, such as clones and
+        connections. Sources call it once parsed, and it is called again by
+        `close`, so it must be safe to call more than once.
+        """
+
+    def close(self):
+        "Releases the resources of a client that may not be parsed."
+        self.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def fingerprint(self):
+        """Returns a string that changes when the content of the resource
+        changes, or None if it cannot be told without extracting it. Local
+        files given by the `uri` option are fingerprinted by their size and
+        modification time.
+        """
+        uri = getattr(self.options, 'uri', None)
+
+        if isinstance(uri, str) and not is_remote(uri) and \
+                os.path.isfile(uri):
+            return file_fingerprint(uri)
+
+    def cacheable(self):
+        """Returns true if the extract only depends on the options and the
+        content of the resource, so a repeated request may be answered from
+        a cache. Extractions that read or update state kept between runs
+        are not.
+        """
+        return True
+
     def parse(self):
-        "Exports a resource in a JSON-serializable format."
-        raise NotImplementedError('export method must be implemented')
+        """Yields (concept, attrs) pairs for each record of the resource.
+
+        Records reference other records by Ref attribute values, such as
+        `ref('entity', table)`. Referenced records must have an
+        `origins:ident`.
+        """
+        raise NotImplementedError('parse method must be implemented')
+
+    def iter_records(self):
+        """Yields (concept, cid, attrs) records as the resource is parsed.
+
+        References to other records are replaced by their identifiers as each
+        record is yielded, so records can be consumed while the extraction
+        continues and nothing is retained once consumed.
+        """
+        records = self.parse()
+
+        # Sources that add records to the document rather than yielding them
+        if records is None:
+            for concept, items in self.document.resolve().items():
+                for cid, attrs in items.items():
+                    yield concept, cid, attrs
+
+            return
+
+        idr = IdGenerator()
+
+        for concept, attrs in records:
+            cid = identify(concept, attrs, idr)
+            yield concept, cid, resolve_references(attrs)
+
+    def extract(self, document_class=None):
+        """Returns the document of the records of the resource, of the
+        client's `document_class` unless another is given.
+        """
+        document = (document_class or self.document_class)()
+
+        for concept, cid, attrs in self.iter_records():
+            document.add(concept, cid, attrs)
+
+        return document
 
     def generate(self):
-        self.parse()
-        return self.document.resolve()
+        "Returns the full PROV document of the resource."
+        return self.extract().resolve()
@@ -126,7 +126,7 @@ class Client(base.Client):
         for values in self.options.fields:
             field = dict(zip(keys, values))
 
-            field['file'] = file
+            field['file'] = base.ref('entity', file)
 
             if isinstance(self.options.id, (list, tuple)):
                 _id = '/'.join([field[i] for i in self.options.id])
@@ -151,9 +151,9 @@ class Client(base.Client):
 
     def parse(self):
         file = self.parse_file()
-        self.document.add('entity', file)
+        yield 'entity', file
 
         fields = self.parse_fields(file)
 
         for field in fields:
-            self.document.add('entity', field)
+            yield 'entity', field
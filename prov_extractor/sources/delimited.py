@@ -1,6 +1,8 @@
 import os
 import csv
+from itertools import islice, zip_longest
 from .._csv import UnicodeCsvReader
+from ..profiling import ColumnProfile
 from .. import utils
 from . import base
 
@@ -38,6 +40,17 @@ class Client(base.Client):
                 'type': 'string',
                 'default': 'utf-8',
             },
+            'profile': {
+                'description': 'If true, the file is read to profile each column with its inferred type, null count, estimated distinct count, minimum and maximum, and the file has a `row_count`.',  # noqa
+                'type': 'boolean',
+                'default': False,
+            },
+            'chunk_size': {
+                'description': 'Number of rows held in memory at a time while profiling.',  # noqa
+                'type': 'integer',
+                'minimum': 1,
+                'default': 10000,
+            },
         }
     }
 
@@ -75,6 +88,9 @@ class Client(base.Client):
         if not self.options.columns:
             self.options.columns = _header
 
+        # Positioned at the first row of data
+        self.reader = r
+
     def parse_file(self):
         uri = self.options.uri
 
@@ -99,18 +115,46 @@ class Client(base.Client):
                 'prov:label': name,
                 'prov:type': 'Column',
                 'index': i,
-                'file': file,
+                'file': base.ref('entity', file),
             }
 
             columns.append(column)
 
         return columns
 
+    def profile_columns(self):
+        """Reads the rows in chunks and returns the number of rows and the
+        profile of each column. Missing values of short rows are null.
+        """
+        profiles = [ColumnProfile() for name in self.options.columns]
+        rows = 0
+
+        while True:
+            chunk = list(islice(self.reader, self.options.chunk_size))
+
+            if not chunk:
+                break
+
+            rows += len(chunk)
+
+            for profile, values in zip(profiles,
+                                       zip_longest(*chunk, fillvalue='')):
+                profile.update(list(values))
+
+        return rows, [profile.result() for profile in profiles]
+
     def parse(self):
         file = self.parse_file()
-        self.document.add('entity', file)
+
+        if self.options.profile:
+            file['row_count'], profiles = self.profile_columns()
+
+        yield 'entity', file
 
         columns = self.parse_columns(file)
 
-        for column in columns:
-            self.document.add('entity', column)
+        for i, column in enumerate(columns):
+            if self.options.profile:
+                column.update(profiles[i])
+
+            yield 'entity', column
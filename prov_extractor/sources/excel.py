@@ -94,7 +94,7 @@ class Client(base.Client):
             'prov:label': name,
             'prov:type': 'Sheet',
             'index': index,
-            'workbook': workbook,
+            'workbook': base.ref('entity', workbook),
         }
 
     def parse_column(self, name, sheet, index):
@@ -103,7 +103,7 @@ class Client(base.Client):
             'prov:label': name,
             'prov:type': 'Column',
             'index': index,
-            'sheet': sheet,
+            'sheet': base.ref('entity', sheet),
         }
 
     def parse(self):
@@ -112,14 +112,14 @@ class Client(base.Client):
         sheets = wb.get_sheet_names()
 
         workbook = self.parse_workbook(wb)
-        self.document.add('entity', workbook)
+        yield 'entity', workbook
 
         for i, sheet_name in enumerate(sheets):
             sheet = self.parse_sheet(sheet_name, workbook, i)
-            self.document.add('entity', sheet)
+            yield 'entity', sheet
 
             columns = _column_names(wb, sheet_name)
 
             for j, column_name in enumerate(columns):
                 column = self.parse_column(column_name, sheet, j)
-                self.document.add('entity', column)
+                yield 'entity', column
@@ -1,15 +1,67 @@
 import os
 import fnmatch
+import hashlib
 from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from . import base
+from .. import snapshots, checksums
 
 
 DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
 
+# Number of directories scanned ahead of the extraction per worker. This
+# bounds the listings held in memory while the workers are kept busy.
+PREFETCH = 4
+
+
+def scan_directory(path, pattern, hidden):
+    """Lists a directory and returns the paths of its subdirectories and the
+    paths and stats of its files that match the pattern, sorted by name.
+    Symbolic links to directories are not returned, as with `os.walk`, and
+    unreadable directories are treated as empty.
+    """
+    dirs = []
+    files = []
+
+    try:
+        entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+    except OSError:
+        return dirs, files
+
+    for entry in entries:
+        if not hidden and entry.name.startswith('.'):
+            continue
+
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+
+        if is_dir:
+            if not entry.is_symlink():
+                dirs.append(entry.path)
+        elif fnmatch.fnmatch(entry.name, pattern):
+            # The stat is cached by the entry and follows symbolic links
+            files.append((entry.path, entry.stat()))
+
+    return dirs, files
+
+
+def revision_ident(path, revision):
+    "Returns the ident of a revision of a file. The first is its path."
+    if revision == 0:
+        return path
+
+    return '{}@{}'.format(path, revision)
+
 
 class Client(base.Client):
     name = 'Directory'
 
+    # Changes can be followed with the watch API
+    watchable = True
+
     description = '''
         Generator for a filesystem.
     '''
@@ -40,7 +92,24 @@ class Client(base.Client):
             'depth': {
                 'description': 'The maximum depth to recurse into.',
                 'type': 'integer',
-            }
+            },
+            'workers': {
+                'description': 'Number of threads listing directories and stating files. More than one mostly helps on network filesystems.',  # noqa
+                'type': 'integer',
+                'minimum': 1,
+                'maximum': 64,
+                'default': 1,
+            },
+            'snapshot': {
+                'description': 'If true, only the directories and files added, modified or removed since the previous snapshot of the directory with the same options are extracted. Modified files are extracted as new revisions derived from the previous ones and removed ones are invalidated. The first snapshot extracts all of them.',  # noqa
+                'type': 'boolean',
+                'default': False,
+            },
+            'checksum': {
+                'description': 'Algorithm of the checksum of the content of each file, stored in the attribute of the same name. Files are hashed across a pool of processes and checksums are cached until the size, modification time or inode of the file change.',  # noqa
+                'type': 'string',
+                'enum': list(checksums.ALGORITHMS),
+            },
         }
     }
 
@@ -54,10 +123,15 @@ class Client(base.Client):
             'path': path_id,
         }
 
-    def parse_file(self, path):
+    def parse_file(self, path, stats=None):
         path_id = os.path.relpath(path, self.options.path)
 
-        stats = os.stat(path)
+        if stats is None:
+            stats = os.stat(path)
+
+        # Kept until the file is hashed
+        if self.options.checksum:
+            self.file_stats[path_id] = (path, stats)
 
         # Convert into datetime from timestamp floats
         atime = datetime.fromtimestamp(stats.st_atime)
@@ -84,39 +158,308 @@ class Client(base.Client):
             'created': ctime.strftime(DATETIME_FORMAT),
         }
 
-    def parse(self):
-        base_path = self.options.path
+    def relpath(self, path):
+        return os.path.relpath(path, self.options.path)
+
+    def walk(self, scan=None):
+        """Yields each directory and the paths and stats of its files that
+        match the pattern. Directories are traversed depth-first in order of
+        their names, so the output is the same for any number of workers.
+
+        Listings are spread over the workers ahead of the traversal, which
+        mostly waits on the filesystem on network shares. `scan` returns
+        the subdirectories and files of a directory and defaults to listing
+        it.
+        """
+        depth = self.options.depth
 
-        for root, dirs, names in os.walk(base_path):
-            if self.options.depth is not None:
-                curpath = os.path.relpath(root, base_path)
+        if not self.options.recurse:
+            depth = 0
 
-                if curpath == '.':
-                    depth = 0
+        if scan is None:
+            scan = self.scan
+
+        workers = self.options.workers
+        pool = ThreadPoolExecutor(workers) if workers > 1 else None
+
+        # Stack of [path, depth, future] with the next directory last
+        stack = [[self.options.path, 0, None]]
+
+        try:
+            while stack:
+                # Start listing the next directories
+                if pool is not None:
+                    for item in stack[-workers * PREFETCH:]:
+                        if item[2] is None:
+                            item[2] = pool.submit(scan, item[0])
+
+                path, level, future = stack.pop()
+
+                if future is None:
+                    dirs, files = scan(path)
                 else:
-                    depth = len(curpath.split(os.path.sep))
-
-                # Remove all subdirectories from traversal once the
-                # desired depth has been reached. Note a `break` does
-                # not work since this would stop processing sibling
-                # directories as well.
-                for dirname in dirs[:]:
-                    if depth >= self.depth:
-                        dirs.pop()
-                    elif not self.options.hidden and dirname.startswith('.'):
-                        dirs.pop()
+                    dirs, files = future.result()
+
+                yield path, files
+
+                if depth is None or level < depth:
+                    stack.extend([d, level + 1, None] for d in reversed(dirs))
+        finally:
+            if pool is not None:
+                for item in stack:
+                    if item[2] is not None:
+                        item[2].cancel()
+
+                pool.shutdown()
+
+    def scan(self, path):
+        return scan_directory(path, self.options.pattern, self.options.hidden)
+
+    def matches(self, name):
+        "Returns true if a file name is extracted with the options."
+        if not self.options.hidden and name.startswith('.'):
+            return False
+
+        return fnmatch.fnmatch(name, self.options.pattern)
+
+    def fingerprint(self):
+        """Hashes the size and modification time of the directories and
+        files that would be extracted. Stating them is much cheaper than
+        extracting them, access times are ignored.
+
+        Snapshots depend on the previous snapshot, so they have none.
+        """
+        if self.options.snapshot:
+            return
+
+        digest = hashlib.sha1()
+
+        for root, files in self.walk():
+            for path, stats in [(root, os.stat(root))] + files:
+                digest.update('{}\0{}\0{}\0{}\0{}\0{}\n'.format(
+                    path, stats.st_size, stats.st_mtime_ns, stats.st_mode,
+                    stats.st_uid, stats.st_gid).encode('utf-8', 'replace'))
+
+        return digest.hexdigest()
+
+    def cacheable(self):
+        "Snapshots are compared to and update the previous snapshot."
+        return not self.options.snapshot
+
+    def snapshot_key(self):
+        "Options selecting the files of the snapshot."
+        return [os.path.abspath(self.options.path), self.options.pattern,
+                self.options.hidden, self.options.depth, self.options.recurse]
+
+    def parse_changes(self, snapshot):
+        """Yields the records of the directories and files that changed
+        since the snapshot and updates it once all are yielded.
+
+        Directories whose modification time and inode are unchanged have
+        the same entries, so they are not listed again and only their known
+        files are stated for changes.
+        """
+        dirs = snapshot.load_dirs()
+        files = snapshot.load_files()
+        run = (snapshot.last_run() or 0) + 1
+
+        # Known subdirectories and files of each directory
+        children = defaultdict(lambda: ([], []))
+
+        for path, (parent, mtime_ns, inode) in dirs.items():
+            if parent is not None:
+                children[parent][0].append(path)
+
+        for path, row in files.items():
+            children[row[0]][1].append(path)
+
+        dir_stats = {}
+        skipped = []
+
+        def scan(path):
+            rel = self.relpath(path)
 
+            try:
+                dir_stats[rel] = stat = os.stat(path)
+            except OSError:
+                # Removed while walking
+                return [], []
+
+            if dirs.get(rel, ())[1:] != (stat.st_mtime_ns, stat.st_ino):
+                return self.scan(path)
+
+            skipped.append(rel)
+
+            subdirs, names = children[rel]
+            found = []
+
+            for name in sorted(names):
+                fpath = os.path.join(self.options.path, name)
+
+                try:
+                    found.append((fpath, os.stat(fpath)))
+                except FileNotFoundError:
+                    pass
+
+            return [os.path.join(self.options.path, d)
+                    for d in sorted(subdirs)], found
+
+        now = datetime.now().strftime(DATETIME_FORMAT)
+
+        activity = {
+            'origins:ident': 'snapshot:{}'.format(run),
+            'prov:type': 'Snapshot',
+            'prov:label': 'Snapshot {}'.format(run),
+            'prov:startTime': now,
+        }
+
+        yield 'activity', activity
+
+        changed_dirs = []
+        changed_files = []
+        seen_dirs = set()
+        seen_files = set()
+
+        for root, found in self.walk(scan):
+            rel = self.relpath(root)
+            stat = dir_stats.get(rel)
+
+            if stat is None:
+                continue
+
+            seen_dirs.add(rel)
+            stored = dirs.get(rel)
             directory = self.parse_directory(root)
 
-            self.document.add('entity', directory)
+            if stored is None:
+                yield 'entity', directory
+
+            if stored is None or \
+                    stored[1:] != (stat.st_mtime_ns, stat.st_ino):
+                if rel == '.':
+                    parent = None
+                else:
+                    parent = os.path.dirname(rel) or '.'
+
+                changed_dirs.append((rel, parent, stat.st_mtime_ns,
+                                     stat.st_ino))
+
+            for path, stats in found:
+                frel = self.relpath(path)
+                seen_files.add(frel)
+
+                prev = files.get(frel)
+                key = (stats.st_size, stats.st_mtime_ns, stats.st_ino)
 
-            for f in fnmatch.filter(names, self.options.pattern):
-                if not self.options.hidden and f.startswith('.'):
+                if prev is None:
+                    revision = 0
+                elif prev[1:4] == key:
                     continue
+                else:
+                    revision = prev[4] + 1
+
+                changed_files.append((frel, rel) + key + (revision,))
+
+                _file = self.parse_file(path, stats)
+                _file['directory'] = base.ref('entity', directory)
+
+                if revision:
+                    _file['origins:ident'] = revision_ident(frel, revision)
+                    _file['revision'] = revision
+
+                yield 'entity', _file
+
+                if prev is None:
+                    continue
+
+                prev_id = revision_ident(frel, prev[4])
+
+                yield 'wasDerivedFrom', {
+                    'origins:ident': '{}:{}'.format(
+                        prev_id, _file['origins:ident']),
+                    'prov:activity': base.ref('activity', activity),
+                    'prov:generatedEntity': base.ref('entity', _file),
+                    'prov:usedEntity': base.Ref('entity', prev_id),
+                    'prov:type': 'prov:Revision',
+                }
+
+        removed_dirs = [path for path in dirs if path not in seen_dirs]
+        removed_files = [path for path in files if path not in seen_files]
+
+        removed = [(path, path) for path in removed_dirs]
+        removed.extend((path, revision_ident(path, files[path][4]))
+                       for path in removed_files)
+
+        for path, ident in sorted(removed):
+            yield 'wasInvalidatedBy', {
+                'origins:ident': '{}:{}'.format(ident,
+                                                activity['origins:ident']),
+                'prov:entity': base.Ref('entity', ident),
+                'prov:activity': base.ref('activity', activity),
+                'prov:time': now,
+            }
+
+        snapshot.save(changed_dirs, changed_files, removed_dirs,
+                      removed_files)
+
+        self.meta['snapshot'] = {
+            'run': run,
+            'previous': run - 1 or None,
+            'added': sum(1 for row in changed_files if row[-1] == 0),
+            'modified': sum(1 for row in changed_files if row[-1] > 0),
+            'removed': len(removed_files),
+            'skipped_directories': len(skipped),
+        }
+
+    def add_checksums(self, records):
+        """Yields the records with the checksums of the files added by the
+        worker processes, in the same order.
+        """
+        self.file_stats = {}
+        cache = checksums.ChecksumCache()
+        hasher = checksums.Hasher(self.options.checksum, cache)
+
+        try:
+            for concept, attrs in records:
+                if concept == 'entity' and attrs['prov:type'] == 'File':
+                    path, stats = self.file_stats.pop(attrs['path'])
+                    hasher.add((concept, attrs), path, stats)
+                else:
+                    hasher.add((concept, attrs))
+
+                yield from hasher.pop()
+
+            yield from hasher.pop(0)
+        finally:
+            cache.close()
+
+        self.meta['checksum'] = hasher.stats()
+
+    def parse(self):
+        if self.options.checksum:
+            yield from self.add_checksums(self.parse_records())
+        else:
+            yield from self.parse_records()
+
+    def parse_records(self):
+        if self.options.snapshot:
+            path = snapshots.snapshot_path(self.snapshot_key())
+            snapshot = snapshots.Snapshot(path)
+
+            try:
+                yield from self.parse_changes(snapshot)
+            finally:
+                snapshot.close()
+
+            return
+
+        for root, files in self.walk():
+            directory = self.parse_directory(root)
 
-                path = os.path.join(root, f)
+            yield 'entity', directory
 
-                _file = self.parse_file(path)
-                _file['directory'] = directory
+            for path, stats in files:
+                _file = self.parse_file(path, stats)
+                _file['directory'] = base.ref('entity', directory)
 
-                self.document.add('entity', _file)
+                yield 'entity', _file
@@ -1,81 +1,398 @@
+import os
+import fcntl
 import shutil
+import hashlib
 import tempfile
 import subprocess
 from . import base
 
 
-def clone_repo(uri, branch):
+# The log is NUL-delimited so any path can be represented. Each commit
+# header is prefixed with a record separator and the fields are separated
+# by a unit separator.
+COMMIT_MARKER = '\x1e'
+FIELD_SEPARATOR = '\x1f'
+
+LOG_FORMAT = COMMIT_MARKER + FIELD_SEPARATOR.join([
+    '%H',
+    '%P',
+    '%an',
+    '%ad',
+    '%cn',
+    '%cd',
+    '%s',
+])
+
+# Size of the chunks read from the log output.
+LOG_CHUNK_SIZE = 64 * 1024
+
+# Directory and maximum total size in bytes of the cached mirrors.
+CACHE_DIR = os.environ.get('PROV_EXTRACTOR_GIT_CACHE_DIR',
+                           os.path.join(tempfile.gettempdir(),
+                                        'prov-extractor-git'))
+
+CACHE_SIZE = int(os.environ.get('PROV_EXTRACTOR_GIT_CACHE_SIZE',
+                                2 * 1024 ** 3))
+
+
+def is_local(uri):
+    "Returns true if the URI is a local repository that can be read in place."
+    return os.path.isdir(uri)
+
+
+# Only the history is read, so the working tree is not checked out. A partial
+# clone also skips the file contents which are fetched lazily if needed.
+def clone_repo(uri, branch, partial=False, depth=None, since=None):
     tmp = tempfile.mkdtemp()
 
-    subprocess.check_call([
+    args = [
         'git',
         'clone',
         uri,
         '--branch',
         branch,
         '--single-branch',
-        tmp,
-    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        '--no-checkout',
+    ]
+
+    if partial:
+        args.append('--filter=blob:none')
+
+    if depth:
+        args.extend(['--depth', str(depth)])
+
+    if since:
+        args.append('--shallow-since={}'.format(since))
+
+    args.append(tmp)
+
+    try:
+        subprocess.check_call(args, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    except Exception:
+        shutil.rmtree(tmp)
+        raise
 
     return tmp
 
 
-def get_all_files(repo):
-    lines = subprocess.check_output([
+def dir_size(path):
+    size = 0
+
+    for root, dirs, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+
+    return size
+
+
+class Mirror():
+    "A cached mirror that is held with a shared lock until closed."
+    def __init__(self, path, lock):
+        self.path = path
+        self.lock = lock
+
+    def close(self):
+        if not self.lock.closed:
+            fcntl.flock(self.lock, fcntl.LOCK_UN)
+            self.lock.close()
+
+
+class MirrorCache():
+    """On-disk cache of bare mirrors keyed by URI and branch.
+
+    The first use of a repository clones it and later uses fetch the new
+    commits. Each mirror has a lock file: it is held exclusively while the
+    mirror is cloned, fetched or evicted and shared while it is being read,
+    so concurrent requests, even across processes, neither clone the same
+    repository twice nor evict a mirror that is in use. The least recently
+    used mirrors are evicted once the cache exceeds its maximum size.
+    """
+    def __init__(self, path=CACHE_DIR, max_size=CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+
+    def mirror_path(self, uri, branch):
+        key = '{}#{}'.format(uri, branch).encode('utf-8')
+        return os.path.join(self.path, hashlib.sha1(key).hexdigest())
+
+    def open(self, uri, branch, partial=False):
+        "Returns the updated mirror of the branch of a repository."
+        os.makedirs(self.path, exist_ok=True)
+
+        path = self.mirror_path(uri, branch)
+        lock = open(path + '.lock', 'a')
+
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            if os.path.isdir(path):
+                self.fetch(path, branch)
+            else:
+                self.clone(path, uri, branch, partial)
+
+            # Mark as recently used
+            os.utime(path, None)
+
+            fcntl.flock(lock, fcntl.LOCK_SH)
+        except Exception:
+            lock.close()
+            raise
+
+        self.evict(exclude=path)
+
+        return Mirror(path, lock)
+
+    def clone(self, path, uri, branch, partial):
+        args = [
+            'git',
+            'clone',
+            uri,
+            '--bare',
+            '--branch',
+            branch,
+            '--single-branch',
+        ]
+
+        if partial:
+            args.append('--filter=blob:none')
+
+        args.append(path)
+
+        try:
+            subprocess.check_call(args, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL)
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+    def fetch(self, path, branch):
+        subprocess.check_call([
+            'git',
+            '-C',
+            path,
+            'fetch',
+            '--quiet',
+            'origin',
+            '+refs/heads/{0}:refs/heads/{0}'.format(branch),
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def evict(self, exclude=None):
+        "Removes the least recently used mirrors not in use until under size."
+        mirrors = []
+
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+
+            if os.path.isdir(path):
+                mirrors.append((os.stat(path).st_mtime, path, dir_size(path)))
+
+        total = sum(m[2] for m in mirrors)
+
+        for mtime, path, size in sorted(mirrors):
+            if total <= self.max_size:
+                break
+
+            if path == exclude:
+                continue
+
+            with open(path + '.lock', 'a') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue
+
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+
+mirrors = MirrorCache()
+
+
+def read_tokens(f):
+    "Yields the NUL-delimited tokens of a stream as they are read."
+    tail = b''
+
+    while True:
+        chunk = f.read(LOG_CHUNK_SIZE)
+
+        if not chunk:
+            break
+
+        toks = (tail + chunk).split(b'\0')
+        tail = toks.pop()
+
+        for tok in toks:
+            yield tok.decode('utf-8')
+
+    if tail:
+        yield tail.decode('utf-8')
+
+
+def parse_header(header):
+    toks = header.split(FIELD_SEPARATOR)
+
+    return {
+        'sha1': toks[0],
+        'parents': [p for p in toks[1].split(' ') if p],
+        'author': toks[2],
+        'author_date': toks[3],
+        'committer': toks[4],
+        'commit_date': toks[5],
+        'subject': toks[6],
+        'files': [],
+    }
+
+
+def git_log(repo, args, stdin=None):
+    """Yields the commits of a log with the files changed by each commit and
+    the modification type. `args` are passed to the log command and `stdin`
+    is written to its standard input. Renames are reported as a deletion and
+    an addition, as they are when the log of a single file is taken.
+    """
+    proc = subprocess.Popen([
         'git',
+        '--literal-pathspecs',
         '-C',
         repo,
         '--no-pager',
         'log',
-        '--pretty=format:',
-        '--name-only',
-        '--diff-filter=A'
-    ]).decode('utf-8')
+        '--date=iso',
+        '--name-status',
+        '--no-renames',
+        '-z',
+        '--pretty=format:' + LOG_FORMAT,
+    ] + args, stdin=stdin and subprocess.PIPE, stdout=subprocess.PIPE)
+
+    if stdin:
+        proc.stdin.write(stdin.encode('utf-8'))
+        proc.stdin.close()
+
+    commit = None
+    mod_type = None
+    completed = False
+
+    try:
+        for tok in read_tokens(proc.stdout):
+            # Path following a modification type
+            if mod_type is not None:
+                commit['files'].append((mod_type, tok))
+                mod_type = None
+            # Separator between commits
+            elif not tok:
+                continue
+            # Header of the next commit, followed by the modification type
+            # of the first file if any files were changed. Merge commits do
+            # not list files.
+            elif tok.startswith(COMMIT_MARKER):
+                if commit:
+                    yield commit
+
+                header, _, mod_type = tok[1:].partition('\n')
+                commit = parse_header(header)
+
+                # First character, the similarity index may follow
+                mod_type = mod_type[:1] or None
+            else:
+                mod_type = tok[:1]
+
+        if commit:
+            yield commit
+
+        completed = True
+    finally:
+        proc.stdout.close()
+
+        # The log is cut short if the consumer stops early
+        if not completed:
+            proc.kill()
+
+        if proc.wait() != 0 and completed:
+            raise subprocess.CalledProcessError(proc.returncode, 'git log')
+
+
+# Single pass over the log to find out about all commits, authors, the commit
+# parents, and the files changed by each commit, oldest first. The walk can be
+# limited to the latest `depth` commits, to commits since a date or to the
+# commits after a commit.
+def get_commits(repo, branch='HEAD', depth=None, since=None,
+                since_commit=None):
+    args = ['--reverse']
+
+    if depth:
+        args.append('--max-count={}'.format(depth))
+
+    if since:
+        args.append('--since={}'.format(since))
+
+    if since_commit:
+        args.append('{}..{}'.format(since_commit, branch))
+    else:
+        args.append(branch)
+
+    args.append('--')
+
+    return git_log(repo, args)
+
+
+def get_previous_commits(repo, rev, paths):
+    """Returns the latest commit at or before `rev` that changed each of the
+    paths. The log stops as soon as all paths are found.
+    """
+    paths = set(paths)
+    previous = {}
+
+    if not paths:
+        return previous
 
-    return set(l for l in lines.split('\n') if l)
+    # The revision and paths are passed on stdin since there may be more
+    # paths than fit on a command line.
+    stdin = '\n'.join([rev, '--'] + sorted(paths)) + '\n'
 
+    commits = git_log(repo, ['--stdin'], stdin=stdin)
 
-# Git log for each file to find out about all commits, authors, the commit
-# parents, and the modification type.
-def get_file_commits(repo, fpath):
-    lines = subprocess.check_output([
+    try:
+        for commit in commits:
+            for mod_type, path in commit['files']:
+                if path in paths:
+                    previous.setdefault(path, commit['sha1'])
+
+            if len(previous) == len(paths):
+                break
+    finally:
+        commits.close()
+
+    return previous
+
+
+def resolve_commit(repo, rev):
+    "Returns the SHA1 of a revision."
+    output = subprocess.check_output([
         'git',
         '-C',
         repo,
-        '--no-pager',
-        'log',
-        '--reverse',
-        '--date=iso',
-        '--name-status',
-        '--pretty=format:%H||%P||%an||%ad||%cn||%cd||%s||&',
-        '--',
-        fpath,
-    ]).decode('utf-8')
-
-    commits = []
-    lines = lines.replace('||&\n', '||').split('\n')
-
-    for line in lines:
-        if not line:
-            continue
-
-        toks = line.split('||')
-
-        commit = {
-            'sha1': toks[0],
-            'entity': fpath,
-            'parents': [p for p in toks[1].split(' ') if p],
-            'author': toks[2],
-            'author_date': toks[3],
-            'committer': toks[4],
-            'commit_date': toks[5],
-            'subject': toks[6],
-            'mod_type': toks[7][0],  # first character
-        }
+        'rev-parse',
+        '--verify',
+        '--quiet',
+        '{}^{{commit}}'.format(rev),
+    ])
 
-        commits.append(commit)
+    return output.decode('utf-8').strip()
 
-    return commits
+
+def is_ancestor(repo, ancestor, rev):
+    return subprocess.call([
+        'git',
+        '-C',
+        repo,
+        'merge-base',
+        '--is-ancestor',
+        ancestor,
+        rev,
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
 
 
 class Client(base.Client):
@@ -97,40 +414,167 @@ class Client(base.Client):
                 'description': 'The branch that will be cloned and converted',
                 'type': 'string',
                 'default': 'master',
-            }
+            },
+            'partial': {
+                'description': 'If true, remote repositories are cloned without file contents. Requires server support for partial clones.',  # noqa
+                'type': 'boolean',
+                'default': False,
+            },
+            'depth': {
+                'description': 'The maximum number of recent commits to clone and convert.',  # noqa
+                'type': 'integer',
+                'minimum': 1,
+            },
+            'since': {
+                'description': 'Only commits after this date are cloned and converted, e.g. 2015-01-01.',  # noqa
+                'type': 'string',
+            },
+            'since_commit': {
+                'description': 'Only commits after this commit are converted. The SHA1 of the converted head is returned in the metadata as `head` to continue from on the next extraction.',  # noqa
+                'type': 'string',
+            },
+            'cache': {
+                'description': 'If true, remote repositories are kept in a local cache and only new commits are fetched on later extractions. The depth and since options then only limit the commits converted.',  # noqa
+                'type': 'boolean',
+                'default': False,
+            },
         }
     }
 
     def setup(self):
-        self.repo_dir = clone_repo(self.options.uri, self.options.branch)
+        self.cloned = False
+        self.mirror = None
+
+        # Local repositories are read in place
+        if is_local(self.options.uri):
+            self.repo_dir = self.options.uri
+        elif self.options.cache:
+            self.mirror = mirrors.open(self.options.uri,
+                                       self.options.branch,
+                                       partial=self.options.partial)
+            self.repo_dir = self.mirror.path
+        else:
+            self.repo_dir = clone_repo(self.options.uri,
+                                       self.options.branch,
+                                       partial=self.options.partial,
+                                       depth=self.options.depth,
+                                       since=self.options.since)
+            self.cloned = True
+
+        try:
+            self.head = resolve_commit(self.repo_dir, self.options.branch)
+
+            if self.options.since_commit and not \
+                    is_ancestor(self.repo_dir, self.options.since_commit,
+                                self.head):
+                raise ValueError('commit {} is not in the history of {}'
+                                 .format(self.options.since_commit,
+                                         self.options.branch))
+        except Exception:
+            self.cleanup()
+            raise
+
+        self.meta['head'] = self.head
+
+    def fingerprint(self):
+        return self.head
+
+    def cacheable(self):
+        "Incremental extractions continue from the head of a previous one."
+        return not self.options.since_commit
+
+    def cleanup(self):
+        if self.cloned:
+            shutil.rmtree(self.repo_dir)
+            self.cloned = False
+        elif self.mirror:
+            self.mirror.close()
+            self.mirror = None
+
+    def get_previous(self, commits):
+        """Returns references to the entities of the files modified in the
+        commits as of the `since_commit`. The entities are not part of the
+        extract, they are only referenced by the derivations of the new
+        revisions.
+        """
+        added = set()
+        paths = set()
 
-    def parse_file(self, fname):
-        commits = get_file_commits(self.repo_dir, fname)
+        for commit in commits:
+            for mod_type, path in commit['files']:
+                if mod_type == 'A':
+                    added.add(path)
+                elif path not in added:
+                    paths.add(path)
+
+        shas = get_previous_commits(self.repo_dir,
+                                    self.options.since_commit, paths)
+
+        return {path: base.Ref('entity', '{}:{}'.format(sha1, path))
+                for path, sha1 in shas.items()}
+
+    def parse_commit(self, commit, previous):
+        """Yields the records of a commit. `previous` maps each file to a
+        reference to the entity of its latest state and is updated with the
+        entities of the files changed by the commit.
+        """
+        # Merge commits do not change files themselves
+        if not commit['files']:
+            return
+
+        sha1 = commit['sha1']
+
+        # The commit itself
+        activity_id = sha1
+
+        activity = {
+            'origins:ident': activity_id,
+            'prov:label': commit['subject'],
+            'prov:startTime': commit['author_date'],
+            'prov:endTime': commit['commit_date'],
+        }
 
-        previous = None
-        previous_id = None
+        # The author of the commit
+        author_id = commit['author']
 
-        for commit in commits:
-            sha1 = commit['sha1']
+        author = {
+            'origins:ident': author_id,
+            'prov:label': commit['author'],
+        }
+
+        yield 'activity', activity
+        yield 'agent', author
+
+        author_roles = ['Author']
+
+        if commit['author'] == commit['committer']:
+            author_roles.append('Committer')
 
-            # The commit itself
-            activity_id = sha1
+        yield 'wasAssociatedWith', {
+            'origins:ident': '{}:{}'.format(author_id, activity_id),
+            'prov:agent': base.ref('agent', author),
+            'prov:activity': base.ref('activity', activity),
+            'prov:role': author_roles,
+        }
+
+        if commit['author'] != commit['committer']:
+            committer_id = commit['committer']
 
-            activity = {
-                'origins:ident': activity_id,
-                'prov:label': commit['subject'],
-                'prov:startTime': commit['author_date'],
-                'prov:endTime': commit['commit_date'],
+            committer = {
+                'origins:ident': committer_id,
+                'prov:label': commit['committer'],
             }
 
-            # The author of the commit
-            author_id = commit['author']
+            yield 'agent', committer
 
-            author = {
-                'origins:ident': author_id,
-                'prov:label': commit['author'],
+            yield 'wasAssociatedWith', {
+                'origins:ident': '{}:{}'.format(committer_id, activity_id),
+                'prov:activity': base.ref('activity', activity),
+                'prov:agent': base.ref('agent', committer),
+                'prov:role': 'Committer',
             }
 
+        for mod_type, fname in commit['files']:
             # The file affected by the commit
             entity_id = '{}:{}'.format(sha1, fname)
 
@@ -142,100 +586,86 @@ class Client(base.Client):
                 'parents': commit['parents'],
             }
 
-            self.document.add('activity', activity)
-            self.document.add('agent', author)
-            self.document.add('entity', entity)
+            yield 'entity', entity
 
             # Authorship of the commit
-            self.document.add('wasAttributedTo', {
+            yield 'wasAttributedTo', {
                 'origins:ident': '{}:{}'.format(entity_id, author_id),
-                'prov:entity': entity,
-                'prov:agent': author,
+                'prov:entity': base.ref('entity', entity),
+                'prov:agent': base.ref('agent', author),
                 'prov:type': 'Authorship'
-            })
-
-            # Reference so the committer role can be added if applicable
-            author_roles = ['Author']
-
-            self.document.add('wasAssociatedWith', {
-                'origins:ident': '{}:{}'.format(author_id, activity_id),
-                'prov:agent': author,
-                'prov:activity': activity,
-                'prov:role': author_roles,
-            })
-
-            if commit['author'] == commit['committer']:
-                author_roles.append('Committer')
-            else:
-                committer_id = commit['committer']
-
-                committer = {
-                    'origins:ident': committer_id,
-                    'prov:label': commit['committer'],
-                }
-
-                self.document.add('agent', committer)
-
-                self.document.add('wasAssociatedWith', {
-                    'origins:ident': '{}:{}'.format(committer_id, activity_id),
-                    'prov:activity': activity,
-                    'prov:agent': committer,
-                    'prov:role': 'Committer',
-                })
+            }
 
             # Delete
-            if commit['mod_type'] == 'D':
-                self.document.add('wasInvalidatedBy', {
+            if mod_type == 'D':
+                yield 'wasInvalidatedBy', {
                     'origins:ident': '{}:{}'.format(sha1, fname),
-                    'prov:entity': entity,
-                    'prov:activity': activity,
+                    'prov:entity': base.ref('entity', entity),
+                    'prov:activity': base.ref('activity', activity),
                     'prov:time': commit['author_date'],
-                })
+                }
             # Add
             else:
                 # Generation of the entity, so the entity_id is used
                 generation = {
                     'origins:ident': entity_id,
-                    'prov:entity': entity,
-                    'prov:activity': activity,
+                    'prov:entity': base.ref('entity', entity),
+                    'prov:activity': base.ref('activity', activity),
                     'prov:time': commit['author_date'],
                 }
 
-                self.document.add('wasGeneratedBy', generation)
+                yield 'wasGeneratedBy', generation
+
+                # If this is a change, add derivation between parent and
+                # commit. The previous state is not known if the history
+                # was limited by depth or date.
+                if mod_type != 'A' and fname in previous:
+                    prev = previous[fname]
+                    prev_id = prev.ident
 
-                # If this is a change, add derivation between parent and commit
-                if commit['mod_type'] != 'A':
                     # Previous entity was used for a derivation in this
                     # commit
                     usage = {
-                        'origins:ident': '{}:{}'.format(sha1, previous_id),
-                        'prov:activity': activity,
-                        'prov:entity': previous,
+                        'origins:ident': '{}:{}'.format(sha1, prev_id),
+                        'prov:activity': base.ref('activity', activity),
+                        'prov:entity': prev,
                         'prov:time': commit['author_date'],
                     }
 
                     # Derivation of the current entity from the previous state
                     derivation = {
-                        'origins:ident': '{}:{}'.format(previous_id,
-                                                        entity_id),
-                        'prov:activity': activity,
-                        'prov:generatedEntity': entity,
-                        'prov:usedEntity': previous,
-                        'prov:generation': generation,
-                        'prov:usage': usage,
+                        'origins:ident': '{}:{}'.format(prev_id, entity_id),
+                        'prov:activity': base.ref('activity', activity),
+                        'prov:generatedEntity': base.ref('entity', entity),
+                        'prov:usedEntity': prev,
+                        'prov:generation': base.ref('wasGeneratedBy',
+                                                    generation),
+                        'prov:usage': base.ref('used', usage),
                         'prov:type': 'prov:Revision',
                     }
 
-                    self.document.add('used', usage)
-                    self.document.add('wasDerivedFrom', derivation)
+                    yield 'used', usage
+                    yield 'wasDerivedFrom', derivation
 
-            previous = entity
-            previous_id = entity_id
+            previous[fname] = base.ref('entity', entity)
 
     def parse(self):
-        files = get_all_files(self.repo_dir)
-
-        for fname in files:
-            self.parse_file(fname)
-
-        shutil.rmtree(self.repo_dir)
+        try:
+            previous = {}
+
+            commits = get_commits(self.repo_dir,
+                                  branch=self.head,
+                                  depth=self.options.depth,
+                                  since=self.options.since,
+                                  since_commit=self.options.since_commit)
+
+            # The new commits are read up front to look up the previous
+            # revisions of the files they modify.
+            if self.options.since_commit:
+                commits = list(commits)
+                previous = self.get_previous(commits)
+
+            for commit in commits:
+                yield from self.parse_commit(commit, previous)
+        finally:
+            self.cleanup()
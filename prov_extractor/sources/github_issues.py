@@ -100,20 +100,20 @@ class Client(base.Client):
 
     def parse_issue(self, attrs):
         issue = self.parse_issue_entity(attrs)
-        self.document.add('entity', issue)
+        yield 'entity', issue
 
         # User who opened the issue
         user = self.parse_user(attrs['user'])
-        self.document.add('agent', user)
+        yield 'agent', user
 
         # Attribution to the user for creating the issue. Id is fixed
         # so redundant attribution is not provided.
-        self.document.add('wasAttributedTo', {
+        yield 'wasAttributedTo', {
             'origins:ident': issue['origins:ident'],
             'prov:label': '{} Creator'.format(issue['prov:type']),
-            'prov:entity': issue,
-            'prov:agent': user,
-        })
+            'prov:entity': base.ref('entity', issue),
+            'prov:agent': base.ref('agent', user),
+        }
 
         # Activity of creating the issue.
         activity = {
@@ -121,15 +121,15 @@ class Client(base.Client):
             'prov:type': 'Create {}'.format(issue['prov:type']),
         }
 
-        self.document.add('activity', activity)
+        yield 'activity', activity
 
         # Association of the user to the creator role
-        self.document.add('wasAssociatedWith', {
+        yield 'wasAssociatedWith', {
             'origins:ident': issue['origins:ident'],
             'prov:role': '{} Creator'.format(issue['prov:type']),
-            'prov:agent': user,
-            'prov:activity': activity,
-        })
+            'prov:agent': base.ref('agent', user),
+            'prov:activity': base.ref('activity', activity),
+        }
 
         # If this *is* a new issue, we can include the activity
         if issue['updated_at'] and issue['updated_at'] != issue['created_at']:
@@ -137,36 +137,36 @@ class Client(base.Client):
 
             gen = {
                 'prov:time': time,
-                'prov:entity': issue,
+                'prov:entity': base.ref('entity', issue),
             }
         else:
             time = timestr_to_timestamp(issue['created_at'])
 
             gen = {
                 'prov:time': time,
-                'prov:entity': issue,
-                'prov:activity': activity,
+                'prov:entity': base.ref('entity', issue),
+                'prov:activity': base.ref('activity', activity),
             }
 
         # Generation for the updated issue. We don't know the activity
         # that caused the change so an activity is not linked to the
         # event.
-        self.document.add('wasGeneratedBy', gen)
+        yield 'wasGeneratedBy', gen
 
         # The user assigned to the issue. Since the issue can change
         # independent of the assignee, the id is bound to the user.
         if attrs.get('assignee'):
             user = self.parse_user(attrs['assignee'])
-            self.document.add('agent', user)
+            yield 'agent', user
 
             attr_id = '{}/{}'.format(issue['origins:ident'], user['login'])
 
-            self.document.add('wasAttributedTo', {
+            yield 'wasAttributedTo', {
                 'origins:ident': attr_id,
                 'prov:label': '{} Assignee'.format(issue['prov:type']),
-                'prov:entity': issue,
-                'prov:agent': user,
-            })
+                'prov:entity': base.ref('entity', issue),
+                'prov:agent': base.ref('agent', user),
+            }
 
         # The issue is closed. Note this does not invalidate the issue since
         # it can still be modified on the source system (i.e. GitHub)
@@ -179,26 +179,26 @@ class Client(base.Client):
                 'prov:startTime': timestr_to_timestamp(attrs['closed_at']),
             }
 
-            self.document.add('activity', activity)
+            yield 'activity', activity
 
             if attrs.get('closed_by'):
                 user = self.parse_user(attrs['closed_by'])
-                self.document.add('agent', user)
+                yield 'agent', user
 
-                self.document.add('wasAttributedTo', {
+                yield 'wasAttributedTo', {
                     'origins:ident': close_id,
                     'prov:label': '{} Closer'.format(issue['prov:type']),
-                    'prov:entity': issue,
-                    'prov:agent': user,
-                })
+                    'prov:entity': base.ref('entity', issue),
+                    'prov:agent': base.ref('agent', user),
+                }
 
-                self.document.add('wasAssociatedWith', {
+                yield 'wasAssociatedWith', {
                     'origins:ident': close_id,
-                    'prov:agent': user,
-                    'prov:activity': activity,
+                    'prov:agent': base.ref('agent', user),
+                    'prov:activity': base.ref('activity', activity),
                     'prov:role': 'Closer'
-                })
+                }
 
     def parse(self):
         for attrs in self._get_issues():
-            self.parse_issue(attrs)
+            yield from self.parse_issue(attrs)
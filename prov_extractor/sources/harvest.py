@@ -98,7 +98,7 @@ class Client(base.Client):
             attrs['origins:doc'] = attrs['description']
             attrs['prov:label'] = attrs['name']
             attrs['prov:type'] = 'Concept'
-            attrs['category'] = category
+            attrs['category'] = base.ref('entity', category)
 
             # Remove embedded data
             attrs.pop('_links')
@@ -124,7 +124,7 @@ class Client(base.Client):
                 field['origins:doc'] = field['description']
                 field['prov:label'] = field['name']
                 field['prov:type'] = 'Field'
-                field['concept'] = concept
+                field['concept'] = base.ref('entity', concept)
 
                 # Remove embedded data
                 field.pop('_links')
@@ -138,13 +138,13 @@ class Client(base.Client):
 
     def parse(self):
         service = self.parse_service()
-        self.document.add('entity', service)
+        yield 'entity', service
 
         for cat in self.parse_categories():
-            self.document.add('entity', cat)
+            yield 'entity', cat
 
             for concept in self.parse_concepts(cat):
-                self.document.add('entity', concept)
+                yield 'entity', concept
 
                 for field in self.parse_fields(concept):
-                    self.document.add('entity', field)
+                    yield 'entity', field
@@ -100,7 +100,7 @@ class Client(base.Client):
                                               attrs['name'])
         attrs['prov:label'] = attrs['name']
         attrs['prov:type'] = 'Collection'
-        attrs['database'] = db
+        attrs['database'] = base.ref('entity', db)
 
         return attrs
 
@@ -109,18 +109,18 @@ class Client(base.Client):
                                               attrs['name'])
         attrs['prov:label'] = attrs['name']
         attrs['prov:type'] = 'Field'
-        attrs['column'] = col
+        attrs['column'] = base.ref('entity', col)
 
         return attrs
 
     def parse(self):
         db = self.parse_database()
-        self.document.add('entity', db)
+        yield 'entity', db
 
         for col in self.get_collections():
             col = self.parse_collection(col, db)
-            self.document.add('entity', col)
+            yield 'entity', col
 
             for field in self.get_fields(col['name']):
                 field = self.parse_field(field, col)
-                self.document.add('entity', field)
+                yield 'entity', field
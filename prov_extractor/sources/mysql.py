@@ -1,11 +1,119 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.engine import reflection
-from sqlalchemy.engine.url import URL
-from . import base
-
-
-class Client(base.Client):
+import re
+from sqlalchemy.sql import text
+from sqlalchemy.dialects import mysql
+from sqlalchemy.dialects.mysql.base import MySQLDialect
+from . import relational
+
+
+# Tables and columns of a schema, the current database by default, in a
+# single round trip. Tables without columns are returned as a single row
+# without a column name.
+CATALOG_SQL = text('''
+    SELECT t.table_name AS table_name,
+        c.column_name AS name,
+        c.column_type AS type,
+        c.is_nullable = 'YES' AS nullable,
+        c.column_default AS `default`
+    FROM information_schema.tables t
+        LEFT OUTER JOIN information_schema.columns c
+            ON (c.table_schema = t.table_schema
+                AND c.table_name = t.table_name)
+    WHERE t.table_schema = coalesce(:schema, DATABASE())
+        AND t.table_type = 'BASE TABLE'
+    ORDER BY t.table_name, c.ordinal_position
+''')
+
+PRIMARY_KEYS_SQL = text('''
+    SELECT k.table_name AS table_name,
+        k.column_name AS name
+    FROM information_schema.key_column_usage k
+    WHERE k.table_schema = coalesce(:schema, DATABASE())
+        AND k.constraint_name = 'PRIMARY'
+    ORDER BY k.table_name, k.ordinal_position
+''')
+
+FOREIGN_KEYS_SQL = text('''
+    SELECT k.table_name AS table_name,
+        k.constraint_name AS name,
+        k.ordinal_position AS position,
+        k.column_name AS column_name,
+        CASE WHEN k.referenced_table_schema = k.table_schema THEN NULL
+            ELSE k.referenced_table_schema END AS referred_schema,
+        k.referenced_table_name AS referred_table,
+        k.referenced_column_name AS referred_column
+    FROM information_schema.key_column_usage k
+    WHERE k.table_schema = coalesce(:schema, DATABASE())
+        AND k.referenced_table_name IS NOT NULL
+    ORDER BY k.table_name, k.constraint_name, k.ordinal_position
+''')
+
+# Indexes backing primary keys are left out, as by the inspector.
+INDEXES_SQL = text('''
+    SELECT s.table_name AS table_name,
+        s.index_name AS name,
+        s.non_unique = 0 AS `unique`,
+        s.column_name AS column_name
+    FROM information_schema.statistics s
+    WHERE s.table_schema = coalesce(:schema, DATABASE())
+        AND s.index_name <> 'PRIMARY'
+    ORDER BY s.table_name, s.index_name, s.seq_in_index
+''')
+
+# Estimates from the storage engine, exact for MyISAM only.
+ROW_COUNTS_SQL = text('''
+    SELECT t.table_name AS table_name,
+        t.table_rows AS row_count
+    FROM information_schema.tables t
+    WHERE t.table_schema = coalesce(:schema, DATABASE())
+        AND t.table_type = 'BASE TABLE'
+''')
+
+
+# Type names, arguments and attributes of a `column_type`, e.g.
+# `int(10) unsigned` or `enum('a','b')`.
+TYPE_RE = re.compile(r"^(\w+)(?:\((.*)\))?((?:\s+\w+)*)$")
+
+# Quoted values of enum and set types.
+VALUE_RE = re.compile(r"'((?:[^']|'')*)'")
+
+
+def parse_type(column_type):
+    """Returns the type of a column from its `column_type`, as reflected by
+    the inspector, e.g. `INTEGER(11)` for `int(11)`. Types unknown to the
+    dialect are returned as is.
+    """
+    match = TYPE_RE.match(column_type)
+
+    if not match:
+        return column_type
+
+    name, args, attrs = match.groups()
+    type_ = MySQLDialect.ischema_names.get(name.lower())
+
+    if type_ is None:
+        return column_type
+
+    if issubclass(type_, (mysql.ENUM, mysql.SET)):
+        args = [value.replace("''", "'")
+                for value in VALUE_RE.findall(args or '')]
+    else:
+        args = [int(arg) for arg in re.findall(r'\d+', args or '')]
+
+    kwargs = {attr: True for attr in attrs.lower().split()
+              if attr in ('unsigned', 'zerofill')}
+
+    # The argument of temporal types is the fractional seconds precision
+    if issubclass(type_, (mysql.DATETIME, mysql.TIME, mysql.TIMESTAMP)) \
+            and args:
+        kwargs['fsp'] = args.pop(0)
+
+    try:
+        return type_(*args, **kwargs)
+    except TypeError:
+        return column_type
+
+
+class Client(relational.Client):
     name = 'MySQL'
 
     description = '''
@@ -13,99 +121,19 @@ class Client(base.Client):
         are extracted as entities.
     '''
 
-    options = {
-        'required': ['database'],
-
-        'properties': {
-            'database': {
-                'description': 'Name of the database.',
-                'type': 'string',
-            },
-            'host': {
-                'description': 'Host of the server.',
-                'type': 'string',
-                'default': 'localhost',
-            },
-            'port': {
-                'description': 'Port of the server.',
-                'type': 'number',
-                'default': 3306,
-            },
-            'user': {
-                'description': 'Username for authentication.',
-                'type': 'string',
-            },
-            'password': {
-                'description': 'Password for authentication',
-                'type': 'string',
-            }
-        }
-    }
-
-    def setup(self):
-        # Construct engine URL
-        url = URL('mysql+pymysql',
-                  username=self.options.user,
-                  password=self.options.password,
-                  host=self.options.host,
-                  port=self.options.port,
-                  database=self.options.database)
-
-        self.engine = create_engine(url)
-        self.insp = reflection.Inspector.from_engine(self.engine)
-
-    def parse_database(self):
-        return {
-            'origins:ident': self.options.database,
-            'prov:label': self.options.database,
-            'prov:type': 'Database',
-            'name': self.options.database,
-        }
-
-    def parse_tables(self, db):
-        tables = []
-
-        for name in self.insp.get_table_names():
-            tables.append({
-                'origins:ident': os.path.join(db['origins:ident'], name),
-                'prov:label': name,
-                'prov:type': 'Table',
-                'name': name,
-                'database': db,
-            })
-
-        return tables
-
-    def parse_columns(self, table):
-        columns = []
-
-        for attrs in self.insp.get_columns(table['name']):
-            column = {
-                'origins:ident': os.path.join(table['origins:ident'],
-                                              attrs['name']),
-                'prov:label': attrs['name'],
-                'prov:type': 'Column',
-                'name': attrs['name'],
-                'type': str(attrs['type']),
-                'nullable': attrs['nullable'],
-                'default': attrs['default'],
-                'table': table,
-            }
-
-            # Extract optional attributes
-            if 'attrs' in attrs:
-                column.update(attrs['attrs'])
-
-            columns.append(column)
-
-        return columns
-
-    def parse(self):
-        db = self.parse_database()
-        self.document.add('entity', db)
-
-        for table in self.parse_tables(db):
-            self.document.add('entity', table)
-
-            for column in self.parse_columns(table):
-                self.document.add('entity', column)
+    options = relational.server_options(3306)
+
+    dialect = 'mysql+pymysql'
+
+    catalog_sql = CATALOG_SQL
+
+    primary_keys_sql = PRIMARY_KEYS_SQL
+
+    foreign_keys_sql = FOREIGN_KEYS_SQL
+
+    indexes_sql = INDEXES_SQL
+
+    row_counts_sql = ROW_COUNTS_SQL
+
+    def column_type(self, row):
+        return parse_type(row['type'])
@@ -1,11 +1,142 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.engine import reflection
-from sqlalchemy.engine.url import URL
-from . import base
-
-
-class Client(base.Client):
+from sqlalchemy.sql import text
+from . import relational
+
+
+# Tables and columns of a schema, the current one by default, in a single
+# round trip. Tables without columns are returned as a single row without a
+# column name.
+# Index-organized table overflow segments and temporary tables are left
+# out, as by the inspector. The length, precision, scale and length
+# semantics of the columns are formatted with their type by `format_type`.
+CATALOG_SQL = text('''
+    SELECT t.table_name AS table_name,
+        c.column_name AS name,
+        c.data_type AS type,
+        c.data_length AS data_length,
+        c.data_precision AS data_precision,
+        c.data_scale AS data_scale,
+        c.char_length AS char_length,
+        c.char_used AS char_used,
+        CASE c.nullable WHEN 'Y' THEN 1 ELSE 0 END AS nullable,
+        c.data_default AS "default"
+    FROM all_tables t
+        LEFT OUTER JOIN all_tab_columns c
+            ON (c.owner = t.owner AND c.table_name = t.table_name)
+    WHERE t.owner = coalesce(:schema,
+        sys_context('USERENV', 'CURRENT_SCHEMA'))
+        AND t.iot_name IS NULL
+        AND t.duration IS NULL
+    ORDER BY t.table_name, c.column_id
+''')
+
+PRIMARY_KEYS_SQL = text('''
+    SELECT k.table_name AS table_name,
+        c.column_name AS name
+    FROM all_constraints k
+        JOIN all_cons_columns c
+            ON (c.owner = k.owner AND c.constraint_name = k.constraint_name)
+    WHERE k.constraint_type = 'P'
+        AND k.owner = coalesce(:schema,
+            sys_context('USERENV', 'CURRENT_SCHEMA'))
+    ORDER BY k.table_name, c.position
+''')
+
+FOREIGN_KEYS_SQL = text('''
+    SELECT k.table_name AS table_name,
+        k.constraint_name AS name,
+        c.position AS position,
+        c.column_name AS column_name,
+        CASE WHEN r.owner = k.owner THEN NULL
+            ELSE r.owner END AS referred_schema,
+        r.table_name AS referred_table,
+        rc.column_name AS referred_column
+    FROM all_constraints k
+        JOIN all_cons_columns c
+            ON (c.owner = k.owner AND c.constraint_name = k.constraint_name)
+        JOIN all_constraints r
+            ON (r.owner = k.r_owner
+                AND r.constraint_name = k.r_constraint_name)
+        JOIN all_cons_columns rc
+            ON (rc.owner = r.owner
+                AND rc.constraint_name = r.constraint_name
+                AND rc.position = c.position)
+    WHERE k.constraint_type = 'R'
+        AND k.owner = coalesce(:schema,
+            sys_context('USERENV', 'CURRENT_SCHEMA'))
+    ORDER BY k.table_name, k.constraint_name, c.position
+''')
+
+# Indexes backing primary keys are left out, as by the inspector.
+INDEXES_SQL = text('''
+    SELECT i.table_name AS table_name,
+        i.index_name AS name,
+        CASE i.uniqueness WHEN 'UNIQUE' THEN 1 ELSE 0 END AS "unique",
+        c.column_name AS column_name
+    FROM all_indexes i
+        JOIN all_ind_columns c
+            ON (c.index_owner = i.owner AND c.index_name = i.index_name)
+    WHERE i.table_owner = coalesce(:schema,
+        sys_context('USERENV', 'CURRENT_SCHEMA'))
+        AND NOT EXISTS (
+            SELECT 1
+            FROM all_constraints k
+            WHERE k.owner = i.table_owner
+                AND k.constraint_type = 'P'
+                AND k.index_name = i.index_name
+        )
+    ORDER BY i.table_name, i.index_name, c.column_position
+''')
+
+# Estimates from the optimizer statistics, null if never gathered.
+ROW_COUNTS_SQL = text('''
+    SELECT t.table_name AS table_name,
+        t.num_rows AS row_count
+    FROM all_tables t
+    WHERE t.owner = coalesce(:schema,
+        sys_context('USERENV', 'CURRENT_SCHEMA'))
+        AND t.iot_name IS NULL
+        AND t.duration IS NULL
+''')
+
+
+def format_type(row):
+    """Returns the declared type of a column from its row of the catalog
+    query, e.g. `VARCHAR2(20 CHAR)` or `NUMBER(10,2)`. Types whose name
+    includes their precision, such as `TIMESTAMP(6)`, are returned as is.
+    """
+    name = row['type']
+
+    if name in ('VARCHAR2', 'CHAR'):
+        if row['char_used'] == 'C':
+            return '{}({} CHAR)'.format(name, row['char_length'])
+
+        return '{}({} BYTE)'.format(name, row['data_length'])
+
+    if name in ('NVARCHAR2', 'NCHAR'):
+        return '{}({})'.format(name, row['char_length'])
+
+    if name == 'NUMBER':
+        precision, scale = row['data_precision'], row['data_scale']
+
+        if precision is not None:
+            return 'NUMBER({},{})'.format(precision, scale or 0)
+
+        # Integers are numbers of unlimited precision and no scale
+        if scale is not None:
+            return 'NUMBER(*,{})'.format(scale)
+
+        return name
+
+    if name == 'FLOAT' and row['data_precision'] is not None:
+        return 'FLOAT({})'.format(row['data_precision'])
+
+    if name == 'RAW':
+        return 'RAW({})'.format(row['data_length'])
+
+    return name
+
+
+class Client(relational.Client):
     name = 'Oracle'
 
     description = '''
@@ -13,99 +144,19 @@ class Client(base.Client):
         are extracted as entities.
     '''
 
-    options = {
-        'required': ['database'],
-
-        'properties': {
-            'database': {
-                'description': 'Name of the database.',
-                'type': 'string',
-            },
-            'host': {
-                'description': 'Host of the server.',
-                'type': 'string',
-                'default': 'localhost',
-            },
-            'port': {
-                'description': 'Port of the server.',
-                'type': 'number',
-                'default': 1521,
-            },
-            'user': {
-                'description': 'Username for authentication.',
-                'type': 'string',
-            },
-            'password': {
-                'description': 'Password for authentication',
-                'type': 'string',
-            }
-        }
-    }
-
-    def setup(self):
-        # Construct engine URL
-        url = URL('oracle',
-                  username=self.options.user,
-                  password=self.options.password,
-                  host=self.options.host,
-                  port=self.options.port,
-                  database=self.options.database)
-
-        self.engine = create_engine(url)
-        self.insp = reflection.Inspector.from_engine(self.engine)
-
-    def parse_database(self):
-        return {
-            'origins:ident': self.options.database,
-            'prov:label': self.options.database,
-            'prov:type': 'Database',
-            'name': self.options.database,
-        }
-
-    def parse_tables(self, db):
-        tables = []
-
-        for name in self.insp.get_table_names():
-            tables.append({
-                'origins:ident': os.path.join(db['origins:ident'], name),
-                'prov:label': name,
-                'prov:type': 'Table',
-                'name': name,
-                'database': db,
-            })
-
-        return tables
-
-    def parse_columns(self, table):
-        columns = []
-
-        for attrs in self.insp.get_columns(table['name']):
-            column = {
-                'origins:ident': os.path.join(table['origins:ident'],
-                                              attrs['name']),
-                'prov:label': attrs['name'],
-                'prov:type': 'Column',
-                'name': attrs['name'],
-                'type': str(attrs['type']),
-                'nullable': attrs['nullable'],
-                'default': attrs['default'],
-                'table': table,
-            }
-
-            # Extract optional attributes
-            if 'attrs' in attrs:
-                column.update(attrs['attrs'])
-
-            columns.append(column)
-
-        return columns
-
-    def parse(self):
-        db = self.parse_database()
-        self.document.add('entity', db)
-
-        for table in self.parse_tables(db):
-            self.document.add('entity', table)
-
-            for column in self.parse_columns(table):
-                self.document.add('entity', column)
+    options = relational.server_options(1521)
+
+    dialect = 'oracle'
+
+    catalog_sql = CATALOG_SQL
+
+    primary_keys_sql = PRIMARY_KEYS_SQL
+
+    foreign_keys_sql = FOREIGN_KEYS_SQL
+
+    indexes_sql = INDEXES_SQL
+
+    row_counts_sql = ROW_COUNTS_SQL
+
+    def column_type(self, row):
+        return format_type(row)
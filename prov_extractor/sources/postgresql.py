@@ -1,11 +1,167 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.engine import reflection
-from sqlalchemy.engine.url import URL
-from . import base
-
-
-class Client(base.Client):
+import re
+from sqlalchemy.sql import text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql.base import PGDialect
+from . import relational
+
+
+# Tables and columns of a schema, the current one by default, in a single
+# round trip. Tables without columns are returned as a single row without a
+# column name.
+CATALOG_SQL = text('''
+    SELECT c.relname AS table_name,
+        a.attname AS name,
+        format_type(a.atttypid, a.atttypmod) AS type,
+        NOT a.attnotnull AS nullable,
+        pg_get_expr(d.adbin, d.adrelid) AS "default"
+    FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n
+            ON (n.oid = c.relnamespace)
+        LEFT OUTER JOIN pg_catalog.pg_attribute a
+            ON (a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped)
+        LEFT OUTER JOIN pg_catalog.pg_attrdef d
+            ON (d.adrelid = c.oid AND d.adnum = a.attnum)
+    WHERE c.relkind = 'r'
+        AND n.nspname = coalesce(:schema, current_schema())
+    ORDER BY c.relname, a.attnum
+''')
+
+PRIMARY_KEYS_SQL = text('''
+    SELECT c.relname AS table_name,
+        a.attname AS name
+    FROM pg_catalog.pg_constraint k
+        JOIN pg_catalog.pg_class c
+            ON (c.oid = k.conrelid)
+        JOIN pg_catalog.pg_namespace n
+            ON (n.oid = c.relnamespace)
+        CROSS JOIN LATERAL unnest(k.conkey) WITH ORDINALITY AS u(attnum, ord)
+        JOIN pg_catalog.pg_attribute a
+            ON (a.attrelid = c.oid AND a.attnum = u.attnum)
+    WHERE k.contype = 'p'
+        AND n.nspname = coalesce(:schema, current_schema())
+    ORDER BY c.relname, u.ord
+''')
+
+FOREIGN_KEYS_SQL = text('''
+    SELECT c.relname AS table_name,
+        k.conname AS name,
+        u.ord AS position,
+        a.attname AS column_name,
+        CASE WHEN rn.nspname = n.nspname THEN NULL
+            ELSE rn.nspname END AS referred_schema,
+        r.relname AS referred_table,
+        ra.attname AS referred_column
+    FROM pg_catalog.pg_constraint k
+        JOIN pg_catalog.pg_class c
+            ON (c.oid = k.conrelid)
+        JOIN pg_catalog.pg_namespace n
+            ON (n.oid = c.relnamespace)
+        JOIN pg_catalog.pg_class r
+            ON (r.oid = k.confrelid)
+        JOIN pg_catalog.pg_namespace rn
+            ON (rn.oid = r.relnamespace)
+        CROSS JOIN LATERAL unnest(k.conkey, k.confkey)
+            WITH ORDINALITY AS u(attnum, refnum, ord)
+        JOIN pg_catalog.pg_attribute a
+            ON (a.attrelid = c.oid AND a.attnum = u.attnum)
+        JOIN pg_catalog.pg_attribute ra
+            ON (ra.attrelid = r.oid AND ra.attnum = u.refnum)
+    WHERE k.contype = 'f'
+        AND n.nspname = coalesce(:schema, current_schema())
+    ORDER BY c.relname, k.conname, u.ord
+''')
+
+# Indexes backing primary keys are left out, as by the inspector.
+INDEXES_SQL = text('''
+    SELECT t.relname AS table_name,
+        i.relname AS name,
+        x.indisunique AS "unique",
+        a.attname AS column_name
+    FROM pg_catalog.pg_index x
+        JOIN pg_catalog.pg_class t
+            ON (t.oid = x.indrelid)
+        JOIN pg_catalog.pg_class i
+            ON (i.oid = x.indexrelid)
+        JOIN pg_catalog.pg_namespace n
+            ON (n.oid = t.relnamespace)
+        CROSS JOIN LATERAL unnest(x.indkey::smallint[])
+            WITH ORDINALITY AS u(attnum, ord)
+        LEFT OUTER JOIN pg_catalog.pg_attribute a
+            ON (a.attrelid = t.oid AND a.attnum = u.attnum)
+    WHERE NOT x.indisprimary
+        AND n.nspname = coalesce(:schema, current_schema())
+    ORDER BY t.relname, i.relname, u.ord
+''')
+
+# Estimates maintained by vacuum and analyze, negative if never analyzed.
+ROW_COUNTS_SQL = text('''
+    SELECT c.relname AS table_name,
+        c.reltuples::bigint AS row_count
+    FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n
+            ON (n.oid = c.relnamespace)
+    WHERE c.relkind = 'r'
+        AND n.nspname = coalesce(:schema, current_schema())
+''')
+
+
+# Types whose modifier is a precision rather than a length.
+PRECISION_TYPES = ('time', 'time with time zone', 'time without time zone',
+                   'timestamp', 'timestamp with time zone',
+                   'timestamp without time zone', 'interval')
+
+
+def parse_type(format_type):
+    """Returns the type of a column from its `format_type`, as reflected by
+    the inspector, e.g. `VARCHAR(120)` for `character varying(120)`. Types
+    unknown to the dialect, such as domains and enums, are returned as is.
+    """
+    name = re.sub(r'\(.*?\)', '', format_type)
+    dimensions = name.count('[]')
+    name = name.replace('[]', '')
+
+    modifiers = re.search(r'\(([\d,\s]+)\)', format_type)
+
+    if modifiers:
+        args = [int(arg) for arg in modifiers.group(1).split(',')]
+    else:
+        args = []
+
+    kwargs = {}
+
+    # Interval fields, e.g. `interval day to second`
+    if name.startswith('interval '):
+        kwargs['fields'] = name[len('interval '):]
+        name = 'interval'
+
+    if name in PRECISION_TYPES:
+        if args:
+            kwargs['precision'] = args.pop(0)
+
+        if name != 'interval':
+            kwargs['timezone'] = name.endswith(' with time zone')
+    elif name == 'double precision':
+        args = [53]
+    elif name == 'bit varying':
+        kwargs['varying'] = True
+
+    type_ = PGDialect.ischema_names.get(name)
+
+    if type_ is None:
+        return format_type
+
+    try:
+        type_ = type_(*args, **kwargs)
+    except TypeError:
+        return format_type
+
+    if dimensions:
+        type_ = ARRAY(type_, dimensions=dimensions)
+
+    return type_
+
+
+class Client(relational.Client):
     name = 'PostgreSQL'
 
     description = '''
@@ -13,99 +169,19 @@ class Client(base.Client):
         are extracted as entities.
     '''
 
-    options = {
-        'required': ['database'],
-
-        'properties': {
-            'database': {
-                'description': 'Name of the database.',
-                'type': 'string',
-            },
-            'host': {
-                'description': 'Host of the server.',
-                'type': 'string',
-                'default': 'localhost',
-            },
-            'port': {
-                'description': 'Port of the server.',
-                'type': 'number',
-                'default': 5432
-            },
-            'user': {
-                'description': 'Username for authentication.',
-                'type': 'string',
-            },
-            'password': {
-                'description': 'Password for authentication',
-                'type': 'string',
-            }
-        }
-    }
-
-    def setup(self):
-        # Construct engine URL
-        url = URL('postgresql',
-                  username=self.options.user,
-                  password=self.options.password,
-                  host=self.options.host,
-                  port=self.options.port,
-                  database=self.options.database)
-
-        self.engine = create_engine(url)
-        self.insp = reflection.Inspector.from_engine(self.engine)
-
-    def parse_database(self):
-        return {
-            'origins:ident': self.options.database,
-            'prov:label': self.options.database,
-            'prov:type': 'Database',
-            'name': self.options.database,
-        }
-
-    def parse_tables(self, db):
-        tables = []
-
-        for name in self.insp.get_table_names():
-            tables.append({
-                'origins:ident': os.path.join(db['origins:ident'], name),
-                'prov:label': name,
-                'prov:type': 'Table',
-                'name': name,
-                'database': db,
-            })
-
-        return tables
-
-    def parse_columns(self, table):
-        columns = []
-
-        for attrs in self.insp.get_columns(table['name']):
-            column = {
-                'origins:ident': os.path.join(table['origins:ident'],
-                                              attrs['name']),
-                'prov:label': attrs['name'],
-                'prov:type': 'Column',
-                'name': attrs['name'],
-                'type': str(attrs['type']),
-                'nullable': attrs['nullable'],
-                'default': attrs['default'],
-                'table': table,
-            }
-
-            # Extract optional attributes
-            if 'attrs' in attrs:
-                column.update(attrs['attrs'])
-
-            columns.append(column)
-
-        return columns
-
-    def parse(self):
-        db = self.parse_database()
-        self.document.add('entity', db)
-
-        for table in self.parse_tables(db):
-            self.document.add('entity', table)
-
-            for column in self.parse_columns(table):
-                self.document.add('entity', column)
+    options = relational.server_options(5432)
+
+    dialect = 'postgresql'
+
+    catalog_sql = CATALOG_SQL
+
+    primary_keys_sql = PRIMARY_KEYS_SQL
+
+    foreign_keys_sql = FOREIGN_KEYS_SQL
+
+    indexes_sql = INDEXES_SQL
+
+    row_counts_sql = ROW_COUNTS_SQL
+
+    def column_type(self, row):
+        return parse_type(row['type'])
@@ -59,7 +59,7 @@ class Client(base.Client):
             'prov:label': utils.prettify_name(name),
             'prov:type': 'Form',
             'name': name,
-            'project': project,
+            'project': base.ref('entity', project),
         }
 
     def parse_section(self, form, attrs):
@@ -73,7 +73,7 @@ class Client(base.Client):
             'prov:label': stripped_name,
             'prov:type': 'Section',
             'name': attrs['section_header'],
-            'form': form,
+            'form': base.ref('entity', form),
         }
 
     def parse_field(self, section, attrs):
@@ -99,14 +99,14 @@ class Client(base.Client):
             'alignment': attrs['custom_alignment'],
             'survey_num': attrs['question_number'],
             'matrix': attrs['matrix_group_name'],
-            'section': section,
+            'section': base.ref('entity', section),
         }
 
         return field
 
     def parse(self):
         project = self.parse_project()
-        self.document.add('entity', project)
+        yield 'entity', project
 
         form = None
         section = None
@@ -114,7 +114,7 @@ class Client(base.Client):
         for attrs in self.metadata:
             if not form or attrs['form_name'] != form['name']:
                 form = self.parse_form(project, attrs)
-                self.document.add('entity', form)
+                yield 'entity', form
 
                 # Reset section
                 section = None
@@ -126,7 +126,7 @@ class Client(base.Client):
 
             if not section or (name and name != section['name']):
                 section = self.parse_section(form, attrs)
-                self.document.add('entity', section)
+                yield 'entity', section
 
             field = self.parse_field(section, attrs)
-            self.document.add('entity', field)
+            yield 'entity', field
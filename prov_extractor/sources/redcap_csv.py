@@ -94,7 +94,7 @@ class Client(base.Client):
             'prov:label': utils.prettify_name(name),
             'prov:type': 'Form',
             'name': name,
-            'project': project,
+            'project': base.ref('entity', project),
         }
 
     def parse_section(self, form, attrs):
@@ -108,7 +108,7 @@ class Client(base.Client):
             'prov:label': stripped_name,
             'prov:type': 'Section',
             'name': attrs['section_header'],
-            'form': form,
+            'form': base.ref('entity', form),
         }
 
     def parse_field(self, section, attrs):
@@ -116,24 +116,24 @@ class Client(base.Client):
                                               attrs['field_name'])
         attrs['prov:label'] = utils.strip_html(attrs['field_label'])
         attrs['prov:type'] = 'Field'
-        attrs['section'] = section
+        attrs['section'] = base.ref('entity', section)
 
         return attrs
 
     def parse(self):
         project = self.parse_project()
-        self.document.add('entity', project)
+        yield 'entity', project
 
         form = None
         section = None
 
-        with open(self.options.uri, 'rU') as f:
+        with open(self.options.uri) as f:
             reader = rcreader(f)
 
             for attrs in reader:
                 if not form or attrs['form_name'] != form['name']:
                     form = self.parse_form(project, attrs)
-                    self.document.add('entity', form)
+                    yield 'entity', form
 
                     # Reset section
                     section = None
@@ -145,7 +145,7 @@ class Client(base.Client):
 
                 if not section or (name and name != section['name']):
                     section = self.parse_section(form, attrs)
-                    self.document.add('entity', section)
+                    yield 'entity', section
 
                 field = self.parse_field(section, attrs)
-                self.document.add('entity', field)
+                yield 'entity', field
@@ -1,8 +1,8 @@
 import os
-from sqlalchemy import create_engine
 from sqlalchemy.sql import text
 from sqlalchemy.engine.url import URL
 from . import base
+from .relational import engines
 from .. import utils
 
 
@@ -56,7 +56,12 @@ class Client(base.Client):
                   port=self.options.port,
                   database=REDCAP_DATABASE_NAME)
 
-        self.engine = create_engine(url)
+        self.engine = engines.get(url)
+        self.conn = self.engine.connect()
+
+    def cleanup(self):
+        # Returns the connection to the pool
+        self.conn.close()
 
     def parse_user(self, attrs):
         attrs['origins:ident'] = attrs['username']
@@ -87,7 +92,7 @@ class Client(base.Client):
             GROUP BY first_name, last_name, username, email
         ''')
 
-        query = self.engine.execute(sql, project_id=project['id'])
+        query = self.conn.execute(sql, project_id=project['id'])
         keys = query.keys()
 
         for row in query:
@@ -96,14 +101,14 @@ class Client(base.Client):
             # Everything but the last item (the role)
             user = self.parse_user(user)
 
-            self.document.add('agent', user)
+            yield 'agent', user
 
             # Attribute to the user for the various roles they serve.
-            self.document.add('wasAttributedTo', {
-                'prov:entity': project,
-                'prov:agent': user,
+            yield 'wasAttributedTo', {
+                'prov:entity': base.ref('entity', project),
+                'prov:agent': base.ref('agent', user),
                 'prov:type': row[-1].split(','),
-            })
+            }
 
     def parse_project(self):
         sql = text('''
@@ -137,7 +142,7 @@ class Client(base.Client):
         ''')
 
         # ResultProxy; supports iteration
-        query = self.engine.execute(sql, project=self.options.project)
+        query = self.conn.execute(sql, project=self.options.project)
         keys = query.keys()
 
         row = list(query)[0]
@@ -153,7 +158,7 @@ class Client(base.Client):
         production_time = utils.dt_to_timestamp(row[8])
         deleted_time = utils.dt_to_timestamp(row[9])
 
-        self.document.add('entity', project)
+        yield 'entity', project
 
         # Activity for creating the project
         activity = {
@@ -163,7 +168,7 @@ class Client(base.Client):
             'prov:endTime': created_time,
         }
 
-        self.document.add('activity', activity)
+        yield 'activity', activity
 
         # Project creator
         if row[12]:
@@ -178,39 +183,39 @@ class Client(base.Client):
             creator['prov:label'] = '{} {}'.format(creator['first_name'],
                                                    creator['last_name'])
 
-            self.document.add('agent', creator)
+            yield 'agent', creator
 
             # Attribute
-            self.document.add('wasAttributedTo', {
-                'prov:agent': creator,
-                'prov:entity': project,
+            yield 'wasAttributedTo', {
+                'prov:agent': base.ref('agent', creator),
+                'prov:entity': base.ref('entity', project),
                 'prov:type': 'Creation',
-            })
+            }
 
             # Creator associated with the generation
-            self.document.add('wasAssociatedWith', {
-                'prov:agent': creator,
-                'prov:activity': activity,
+            yield 'wasAssociatedWith', {
+                'prov:agent': base.ref('agent', creator),
+                'prov:activity': base.ref('activity', activity),
                 'prov:role': ['Creator'],
-            })
+            }
 
         # Generation event of this project
-        self.document.add('wasGeneratedBy', {
+        yield 'wasGeneratedBy', {
             'origins:ident': project['origins:ident'],
-            'prov:entity': project,
-            'prov:activity': activity,
+            'prov:entity': base.ref('entity', project),
+            'prov:activity': base.ref('activity', activity),
             'prov:time': created_time,
-        })
+        }
 
         # Add the activity for moving the project to production
         if production_time:
-            self.document.add('activity', {
+            yield 'activity', {
                 'origins:ident': 'production:{}'
                                  .format(project['origins:ident']),
                 'prov:label': 'Move to production',
                 'prov:startTime': production_time,
                 'prov:endTime': production_time,
-            })
+            }
 
         # Project is deleted
         if deleted_time:
@@ -222,12 +227,12 @@ class Client(base.Client):
                 'prov:endTime': deleted_time,
             }
 
-            self.document.add('activity', activity)
+            yield 'activity', activity
 
-            self.document.add('wasInvalidatedBy', {
-                'prov:activity': activity,
-                'prov:entity': project,
-            })
+            yield 'wasInvalidatedBy', {
+                'prov:activity': base.ref('activity', activity),
+                'prov:entity': base.ref('entity', project),
+            }
 
         return project
 
@@ -257,7 +262,7 @@ class Client(base.Client):
             ORDER BY field_order
         ''')
 
-        query = self.engine.execute(sql, project_id=project['id'])
+        query = self.conn.execute(sql, project_id=project['id'])
         keys = query.keys()
 
         return [dict(zip(keys, row)) for row in query]
@@ -270,7 +275,7 @@ class Client(base.Client):
             'prov:label': utils.prettify_name(name),
             'prov:type': 'Form',
             'name': name,
-            'project': project,
+            'project': base.ref('entity', project),
         }
 
     def parse_section(self, form, attrs):
@@ -284,7 +289,7 @@ class Client(base.Client):
             'prov:label': stripped_name,
             'prov:type': 'Section',
             'name': attrs['section_header'],
-            'form': form,
+            'form': base.ref('entity', form),
         }
 
     def parse_field(self, section, attrs):
@@ -292,37 +297,40 @@ class Client(base.Client):
                                               attrs['field_name'])
         attrs['prov:label'] = utils.strip_html(attrs['field_label'])
         attrs['prov:type'] = 'Field'
-        attrs['section'] = section
+        attrs['section'] = base.ref('entity', section)
 
         return attrs
 
     def parse(self):
-        project = self.parse_project()
-
-        self.parse_project_roles(project)
-
-        form = None
-        section = None
-
-        for attrs in self.get_metadata(project):
-            # No form being handled or a new form is being entered. The form
-            # name is only present on the first field in the form.
-            if not form or (attrs['form_name'] and
-                            attrs['form_name'] != form['name']):
-                form = self.parse_form(project, attrs)
-                self.document.add('entity', form)
-
-                # Reset section
-                section = None
-
-            # An explicit section is present, switch to section. Otherwise
-            # if this is the first section for the form, used the default
-            # section name.
-            name = attrs['section_header']
-
-            if not section or (name and name != section['name']):
-                section = self.parse_section(form, attrs)
-                self.document.add('entity', section)
-
-            field = self.parse_field(section, attrs)
-            self.document.add('entity', field)
+        try:
+            project = yield from self.parse_project()
+
+            yield from self.parse_project_roles(project)
+
+            form = None
+            section = None
+
+            for attrs in self.get_metadata(project):
+                # No form being handled or a new form is being entered. The
+                # form name is only present on the first field in the form.
+                if not form or (attrs['form_name'] and
+                                attrs['form_name'] != form['name']):
+                    form = self.parse_form(project, attrs)
+                    yield 'entity', form
+
+                    # Reset section
+                    section = None
+
+                # An explicit section is present, switch to section.
+                # Otherwise if this is the first section for the form, used
+                # the default section name.
+                name = attrs['section_header']
+
+                if not section or (name and name != section['name']):
+                    section = self.parse_section(form, attrs)
+                    yield 'entity', section
+
+                field = self.parse_field(section, attrs)
+                yield 'entity', field
+        finally:
+            self.cleanup()
@@ -0,0 +1,828 @@
+import os
+import json
+import time
+import atexit
+import fnmatch
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from . import base
+from ..cache import DiskCache
+
+
+# SQLAlchemy is imported where it is used, so sources that can read their
+# catalog without it, such as SQLite, do not load it.
+
+# Maximum number of engines kept by the registry and number of seconds an
+# engine may stay unused before it is disposed.
+ENGINE_REGISTRY_SIZE = int(os.environ.get(
+    'PROV_EXTRACTOR_ENGINE_REGISTRY_SIZE', 32))
+
+ENGINE_IDLE_TIMEOUT = int(os.environ.get(
+    'PROV_EXTRACTOR_ENGINE_IDLE_TIMEOUT', 600))
+
+# Directory, maximum total size in bytes and time-to-live in seconds of the
+# cached extractions.
+CACHE_DIR = os.environ.get('PROV_EXTRACTOR_SQL_CACHE_DIR',
+                           os.path.join(tempfile.gettempdir(),
+                                        'prov-extractor-sql'))
+
+CACHE_SIZE = int(os.environ.get('PROV_EXTRACTOR_SQL_CACHE_SIZE',
+                                256 * 1024 ** 2))
+
+CACHE_TTL = int(os.environ.get('PROV_EXTRACTOR_SQL_CACHE_TTL', 24 * 3600))
+
+
+class EngineRegistry():
+    """Process-wide registry of engines keyed by connection URL.
+
+    Creating an engine initializes the dialect and a new connection pool,
+    so requests for the same database share one engine and borrow pooled
+    connections from it. Engines unused for longer than the idle timeout
+    and the least recently used ones beyond the maximum size are disposed,
+    which closes their pooled connections. Connections checked out at that
+    time are closed when they are returned.
+    """
+    def __init__(self, max_size=ENGINE_REGISTRY_SIZE,
+                 idle_timeout=ENGINE_IDLE_TIMEOUT):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.engines = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.engines)
+
+    def __contains__(self, url):
+        from sqlalchemy.engine.url import make_url
+
+        return make_url(url) in self.engines
+
+    def get(self, url, **kwargs):
+        "Returns the engine for the URL, creating it if it does not exist."
+        from sqlalchemy import create_engine
+        from sqlalchemy.engine.url import make_url
+
+        url = make_url(url)
+
+        with self.lock:
+            if url in self.engines:
+                engine = self.engines.pop(url)[0]
+            else:
+                engine = create_engine(url, **kwargs)
+
+            # Most recently used engines are kept at the end
+            self.engines[url] = (engine, time.monotonic())
+            evicted = self.evict()
+
+        for other in evicted:
+            other.dispose()
+
+        return engine
+
+    def evict(self):
+        """Removes the idle and least recently used engines and returns them.
+        The lock must be held by the caller.
+        """
+        evicted = []
+        now = time.monotonic()
+
+        for url, (engine, used) in list(self.engines.items()):
+            if len(self.engines) > self.max_size or \
+                    now - used > self.idle_timeout:
+                evicted.append(engine)
+                del self.engines[url]
+
+        return evicted
+
+    def dispose(self, url=None):
+        "Disposes the engine of the URL or all engines if no URL is given."
+        from sqlalchemy.engine.url import make_url
+
+        with self.lock:
+            if url is None:
+                evicted = [e for e, used in self.engines.values()]
+                self.engines.clear()
+            else:
+                item = self.engines.pop(make_url(url), None)
+                evicted = [item[0]] if item else []
+
+        for engine in evicted:
+            engine.dispose()
+
+
+engines = EngineRegistry()
+
+atexit.register(engines.dispose)
+
+results = DiskCache(CACHE_DIR, CACHE_SIZE, CACHE_TTL)
+
+
+def reflection_options():
+    "Returns the option properties shared by the relational clients."
+    return {
+        'workers': {
+            'description': 'Number of threads reflecting the tables, each with its own connection, when the catalog query is not available.',  # noqa
+            'type': 'integer',
+            'minimum': 1,
+            'maximum': 10,
+            'default': 1,
+        },
+        'schemas': {
+            'description': 'Names of the schemas to extract instead of the default schema. Schemas are extracted as entities between the database and its tables.',  # noqa
+            'type': 'array',
+            'items': {
+                'type': 'string',
+            },
+        },
+        'include': {
+            'description': 'Glob patterns of the names of the tables to extract. All tables are extracted by default.',  # noqa
+            'type': 'array',
+            'items': {
+                'type': 'string',
+            },
+        },
+        'exclude': {
+            'description': 'Glob patterns of the names of the tables not to extract.',  # noqa
+            'type': 'array',
+            'items': {
+                'type': 'string',
+            },
+        },
+        'primary_keys': {
+            'description': 'If true, columns have a `primary_key` attribute.',  # noqa
+            'type': 'boolean',
+            'default': False,
+        },
+        'foreign_keys': {
+            'description': 'If true, foreign keys are extracted as derivations of the columns from the columns they reference.',  # noqa
+            'type': 'boolean',
+            'default': False,
+        },
+        'indexes': {
+            'description': 'If true, indexes are extracted as entities.',
+            'type': 'boolean',
+            'default': False,
+        },
+        'row_counts': {
+            'description': 'If true, tables have a `row_count` attribute with the approximate number of rows from the database statistics, if available.',  # noqa
+            'type': 'boolean',
+            'default': False,
+        },
+        'cache': {
+            'description': 'If true, the extraction is kept in a local cache and returned as long as the fingerprint of the catalog does not change. The fingerprint is returned in the metadata. Requires the catalog query.',  # noqa
+            'type': 'boolean',
+            'default': False,
+        },
+    }
+
+
+def server_options(port):
+    "Returns the options of a client for a database server."
+    options = {
+        'required': ['database'],
+
+        'properties': {
+            'database': {
+                'description': 'Name of the database.',
+                'type': 'string',
+            },
+            'host': {
+                'description': 'Host of the server.',
+                'type': 'string',
+                'default': 'localhost',
+            },
+            'port': {
+                'description': 'Port of the server.',
+                'type': 'number',
+                'default': port,
+            },
+            'user': {
+                'description': 'Username for authentication.',
+                'type': 'string',
+            },
+            'password': {
+                'description': 'Password for authentication',
+                'type': 'string',
+            }
+        }
+    }
+
+    options['properties'].update(reflection_options())
+
+    return options
+
+
+class Client(base.Client):
+    """Base client for relational databases. The database, tables, and
+    columns are extracted as entities.
+
+    Dialects define the `dialect` used in the engine URL and optionally a
+    `catalog_sql` query that returns the tables and columns of the database
+    in a single round trip. The query must return the `table_name`, `name`,
+    `type`, `nullable` and `default` columns ordered by table, with a single
+    row without a column name for tables without columns. It is passed the
+    `schema` parameter, which is null for the default schema. The inspector,
+    which takes several round trips per table, is used if the query is not
+    defined or fails. Dialects whose query returns native type names map
+    them in `column_type`, which is passed the row of the column and may use
+    other columns of the query.
+
+    Tables are filtered by the `include` and `exclude` options before any
+    per-table reflection takes place.
+
+    Primary keys, foreign keys, indexes and row counts are optional and are
+    loaded for all tables of a schema at once by the `primary_keys_sql`,
+    `foreign_keys_sql`, `indexes_sql` and `row_counts_sql` queries. Each
+    query returns one row per column of a key or index, ordered by table,
+    key or index, and column position:
+
+    - primary keys: `table_name` and `name`
+    - foreign keys: `table_name`, `name`, `position` of the column in the
+      key starting at 1, `column_name`, `referred_schema`, which is null for
+      the same schema, `referred_table` and `referred_column`
+    - indexes: `table_name`, `name`, `unique` and `column_name`
+    - row counts: `table_name` and `row_count`, a single row per table
+
+    Except for row counts, the inspector is used per table if a query is
+    not defined or fails.
+
+    With the `cache` option, the records of the extraction are cached on
+    disk by connection and options along with a fingerprint of the catalog
+    query results. Later extractions only run the catalog queries and return
+    the cached records if the fingerprint is unchanged.
+    """
+    dialect = None
+
+    catalog_sql = None
+
+    primary_keys_sql = None
+
+    foreign_keys_sql = None
+
+    indexes_sql = None
+
+    row_counts_sql = None
+
+    def get_url(self):
+        from sqlalchemy.engine.url import URL
+
+        return URL(self.dialect,
+                   username=self.options.user,
+                   password=self.options.password,
+                   host=self.options.host,
+                   port=self.options.port,
+                   database=self.options.database)
+
+    def setup(self):
+        self.catalogs = {}
+        self.constraints = {}
+
+        # Extracted columns by schema, table and name that foreign keys may
+        # refer to.
+        self.columns = {}
+
+        self.connect()
+
+    def connect(self):
+        "Borrows a connection from the engine of the database."
+        from sqlalchemy.engine import reflection
+
+        self.engine = engines.get(self.get_url())
+        self.conn = self.engine.connect()
+        self.insp = reflection.Inspector.from_engine(self.conn)
+
+    def cleanup(self):
+        # Returns the connection to the pool
+        if self.conn is not None:
+            self.conn.close()
+
+    def get_catalog(self, schema=None):
+        "Returns the catalog of the schema, loading it once."
+        if schema not in self.catalogs:
+            self.catalogs[schema] = self.load_catalog(schema)
+
+        return self.catalogs[schema]
+
+    def get_constraints(self, schema=None):
+        """Returns the enabled constraints and indexes of the schema, loading
+        them once.
+        """
+        if schema not in self.constraints:
+            self.constraints[schema] = self.load_constraints(schema)
+
+        return self.constraints[schema]
+
+    def fingerprint(self):
+        """Returns a hash of the catalogs of the schemas, and of their
+        enabled constraints and indexes, or None.
+        """
+        sha1 = hashlib.sha1()
+
+        for schema in self.options.schemas or [None]:
+            catalog = self.get_catalog(schema)
+
+            # Not enough information without the catalog query
+            if catalog is None:
+                return
+
+            # Constraints and indexes are not part of the catalog
+            data = [schema, catalog, self.get_constraints(schema)]
+
+            # Approximate row counts change with the data, not the catalog
+            if self.options.row_counts:
+                data.append(self.load_row_counts(schema))
+
+            data = json.dumps(data, default=str)
+            sha1.update(data.encode('utf-8'))
+
+        return sha1.hexdigest()
+
+    def cache_key(self):
+        options = dict(vars(self.options))
+        options.pop('cache')
+
+        return json.dumps([str(self.get_url()), options], sort_keys=True)
+
+    def normalize_name(self, name):
+        # Case insensitive names are returned in upper case by some
+        # databases and normalized by the inspector.
+        if name is not None and self.engine.dialect.requires_name_normalize:
+            return self.engine.dialect.normalize_name(name)
+
+        return name
+
+    def column_type(self, row):
+        """Returns the type of a column from its row of the catalog query.
+        The `type` column is used as is by default.
+        """
+        return row['type']
+
+    def load_rows(self, sql, schema=None):
+        """Returns the rows of a catalog query for the schema, or None. The
+        query may be given as a string.
+        """
+        from sqlalchemy import exc
+        from sqlalchemy.sql import text
+
+        if sql is None:
+            return
+
+        if isinstance(sql, str):
+            sql = text(sql)
+
+        if schema is not None and \
+                self.engine.dialect.requires_name_normalize:
+            schema = self.engine.dialect.denormalize_name(schema)
+
+        # A failed query aborts the transaction on some databases, so it is
+        # rolled back before the inspector uses the connection.
+        try:
+            with self.conn.begin():
+                return self.conn.execute(sql, schema=schema).fetchall()
+        except exc.DBAPIError:
+            return
+
+    def load_catalog(self, schema=None):
+        "Returns a dict of table names to column attributes, or None."
+        rows = self.load_rows(self.catalog_sql, schema)
+
+        if rows is None:
+            return
+
+        catalog = OrderedDict()
+
+        for row in rows:
+            table_name = self.normalize_name(row['table_name'])
+            name = self.normalize_name(row['name'])
+
+            columns = catalog.setdefault(table_name, [])
+
+            if name is not None:
+                columns.append({
+                    'name': name,
+                    'type': self.column_type(row),
+                    'nullable': bool(row['nullable']),
+                    'default': row['default'],
+                })
+
+        return catalog
+
+    def load_primary_keys(self, schema=None):
+        "Returns a dict of table names to primary key columns, or None."
+        rows = self.load_rows(self.primary_keys_sql, schema)
+
+        if rows is None:
+            return
+
+        keys = {}
+
+        for row in rows:
+            table_name = self.normalize_name(row['table_name'])
+            keys.setdefault(table_name, []) \
+                .append(self.normalize_name(row['name']))
+
+        return keys
+
+    def load_foreign_keys(self, schema=None):
+        """Returns a dict of table names to foreign keys, in the format of
+        the inspector, or None.
+        """
+        rows = self.load_rows(self.foreign_keys_sql, schema)
+
+        if rows is None:
+            return
+
+        keys = {}
+
+        for row in rows:
+            table_name = self.normalize_name(row['table_name'])
+            fks = keys.setdefault(table_name, [])
+
+            # Names are not unique or not available in all databases
+            if row['position'] == 1:
+                fks.append({
+                    'name': self.normalize_name(row['name']),
+                    'constrained_columns': [],
+                    'referred_schema': self.normalize_name(
+                        row['referred_schema']),
+                    'referred_table': self.normalize_name(
+                        row['referred_table']),
+                    'referred_columns': [],
+                })
+
+            fks[-1]['constrained_columns'].append(
+                self.normalize_name(row['column_name']))
+            fks[-1]['referred_columns'].append(
+                self.normalize_name(row['referred_column']))
+
+        return keys
+
+    def load_indexes(self, schema=None):
+        """Returns a dict of table names to indexes, in the format of the
+        inspector, or None.
+        """
+        rows = self.load_rows(self.indexes_sql, schema)
+
+        if rows is None:
+            return
+
+        indexes = {}
+
+        for row in rows:
+            table_name = self.normalize_name(row['table_name'])
+            name = self.normalize_name(row['name'])
+            table_indexes = indexes.setdefault(table_name, [])
+
+            if not table_indexes or table_indexes[-1]['name'] != name:
+                table_indexes.append({
+                    'name': name,
+                    'unique': bool(row['unique']),
+                    'column_names': [],
+                })
+
+            # Expressions have no column name
+            if row['column_name'] is not None:
+                table_indexes[-1]['column_names'].append(
+                    self.normalize_name(row['column_name']))
+
+        return indexes
+
+    def load_row_counts(self, schema=None):
+        "Returns a dict of table names to approximate row counts, or None."
+        rows = self.load_rows(self.row_counts_sql, schema)
+
+        if rows is None:
+            return
+
+        counts = {}
+
+        for row in rows:
+            count = row['row_count']
+
+            # Tables without statistics may have a negative estimate
+            if count is not None and count >= 0:
+                count = int(count)
+            else:
+                count = None
+
+            counts[self.normalize_name(row['table_name'])] = count
+
+        return counts
+
+    def parse_database(self):
+        return {
+            'origins:ident': self.options.database,
+            'prov:label': self.options.database,
+            'prov:type': 'Database',
+            'name': self.options.database,
+        }
+
+    def parse_schema(self, db, name):
+        return {
+            'origins:ident': os.path.join(db['origins:ident'], name),
+            'prov:label': name,
+            'prov:type': 'Schema',
+            'name': name,
+            'database': base.ref('entity', db),
+        }
+
+    def filter_tables(self, names):
+        "Returns the table names matching the include and exclude patterns."
+        include = self.options.include
+        exclude = self.options.exclude
+
+        if include:
+            names = [n for n in names
+                     if any(fnmatch.fnmatchcase(n, p) for p in include)]
+
+        if exclude:
+            names = [n for n in names
+                     if not any(fnmatch.fnmatchcase(n, p) for p in exclude)]
+
+        return names
+
+    def parse_tables(self, parent, schema=None):
+        tables = []
+
+        if self.catalog is not None:
+            names = list(self.catalog)
+        else:
+            names = self.insp.get_table_names(schema=schema)
+
+        for name in self.filter_tables(names):
+            table = {
+                'origins:ident': os.path.join(parent['origins:ident'], name),
+                'prov:label': name,
+                'prov:type': 'Table',
+                'name': name,
+            }
+
+            if schema is None:
+                table['database'] = base.ref('entity', parent)
+            else:
+                table['schema'] = base.ref('entity', parent)
+
+            tables.append(table)
+
+        return tables
+
+    def load_constraints(self, schema=None):
+        """Returns a dict of the enabled constraints and indexes of the
+        schema loaded in bulk, each None if its query is not available.
+        """
+        bulk = {}
+
+        if self.options.primary_keys:
+            bulk['primary_keys'] = self.load_primary_keys(schema)
+
+        if self.options.foreign_keys:
+            bulk['foreign_keys'] = self.load_foreign_keys(schema)
+
+        if self.options.indexes:
+            bulk['indexes'] = self.load_indexes(schema)
+
+        return bulk
+
+    def reflect_table(self, insp, name, schema=None):
+        """Returns the columns and enabled constraints and indexes of the
+        table, from the bulk queries if available or from the inspector.
+        """
+        reflected = {}
+
+        if self.catalog is not None:
+            reflected['columns'] = self.catalog[name]
+        else:
+            reflected['columns'] = insp.get_columns(name, schema=schema)
+
+        if 'primary_keys' in self.bulk:
+            if self.bulk['primary_keys'] is not None:
+                keys = self.bulk['primary_keys'].get(name, [])
+            else:
+                keys = insp.get_pk_constraint(name, schema=schema)
+                keys = keys['constrained_columns']
+
+            reflected['primary_key'] = keys
+
+        if 'foreign_keys' in self.bulk:
+            if self.bulk['foreign_keys'] is not None:
+                fks = self.bulk['foreign_keys'].get(name, [])
+            else:
+                fks = insp.get_foreign_keys(name, schema=schema)
+
+            reflected['foreign_keys'] = fks
+
+        if 'indexes' in self.bulk:
+            if self.bulk['indexes'] is not None:
+                indexes = self.bulk['indexes'].get(name, [])
+            else:
+                indexes = insp.get_indexes(name, schema=schema)
+
+            reflected['indexes'] = indexes
+
+        return reflected
+
+    def reflect_tables(self, tables, schema=None):
+        "Yields the reflected attributes of each table in order."
+        inspected = self.catalog is None or None in self.bulk.values()
+
+        if inspected and self.options.workers > 1:
+            yield from self.reflect_tables_concurrently(tables, schema)
+        else:
+            for table in tables:
+                yield self.reflect_table(self.insp, table['name'], schema)
+
+    def reflect_tables_concurrently(self, tables, schema=None):
+        from sqlalchemy.engine import reflection
+
+        def reflect(name):
+            # Each worker borrows a pooled connection for the table and
+            # returns it from the same thread.
+            with self.engine.connect() as conn:
+                insp = reflection.Inspector.from_engine(conn)
+                return self.reflect_table(insp, name, schema)
+
+        names = [table['name'] for table in tables]
+
+        with ThreadPoolExecutor(self.options.workers) as pool:
+            # Results are returned in the order of the tables
+            yield from pool.map(reflect, names)
+
+    def parse_columns(self, table, reflected):
+        columns = []
+
+        for attrs in reflected:
+            column = {
+                'origins:ident': os.path.join(table['origins:ident'],
+                                              attrs['name']),
+                'prov:label': attrs['name'],
+                'prov:type': 'Column',
+                'name': attrs['name'],
+                'type': str(attrs['type']),
+                'nullable': attrs['nullable'],
+                'default': attrs['default'],
+                'table': base.ref('entity', table),
+            }
+
+            # Extract optional attributes
+            if 'attrs' in attrs:
+                column.update(attrs['attrs'])
+
+            columns.append(column)
+
+        return columns
+
+    def parse_indexes(self, table, reflected):
+        indexes = []
+
+        for attrs in reflected:
+            indexes.append({
+                'origins:ident': os.path.join(table['origins:ident'],
+                                              'indexes', attrs['name']),
+                'prov:label': attrs['name'],
+                'prov:type': 'Index',
+                'name': attrs['name'],
+                'unique': bool(attrs['unique']),
+                'columns': attrs['column_names'],
+                'table': base.ref('entity', table),
+            })
+
+        return indexes
+
+    def parse_foreign_keys(self, schema, table, reflected):
+        derivations = []
+
+        for fk in reflected:
+            referred_schema = fk['referred_schema'] or schema
+            pairs = zip(fk['constrained_columns'], fk['referred_columns'])
+
+            for name, referred_name in pairs:
+                column = self.columns.get((schema, table['name'], name))
+                referred = self.columns.get((referred_schema,
+                                             fk['referred_table'],
+                                             referred_name))
+
+                # The referred column was not extracted
+                if column is None or referred is None:
+                    continue
+
+                derivation = {
+                    'origins:ident': '{}:{}'.format(
+                        column['origins:ident'], referred['origins:ident']),
+                    'prov:generatedEntity': base.ref('entity', column),
+                    'prov:usedEntity': base.ref('entity', referred),
+                    'prov:type': 'ForeignKey',
+                }
+
+                if fk['name']:
+                    derivation['name'] = fk['name']
+
+                derivations.append(derivation)
+
+        return derivations
+
+    def parse_schema_tables(self, parent, schema=None):
+        """Yields the records of the tables of the schema and returns the
+        foreign keys of the tables to be parsed once all tables are.
+        """
+        self.catalog = self.get_catalog(schema)
+        self.bulk = self.get_constraints(schema)
+
+        if self.options.row_counts:
+            row_counts = self.load_row_counts(schema) or {}
+
+        foreign_keys = []
+
+        tables = self.parse_tables(parent, schema)
+        reflected = self.reflect_tables(tables, schema)
+
+        for table, attrs in zip(tables, reflected):
+            if self.options.row_counts:
+                table['row_count'] = row_counts.get(table['name'])
+
+            yield 'entity', table
+
+            primary_key = attrs.get('primary_key')
+
+            for column in self.parse_columns(table, attrs['columns']):
+                if primary_key is not None:
+                    column['primary_key'] = column['name'] in primary_key
+
+                yield 'entity', column
+
+                if self.options.foreign_keys:
+                    key = (schema, table['name'], column['name'])
+                    self.columns[key] = column
+
+            for index in self.parse_indexes(table, attrs.get('indexes', [])):
+                yield 'entity', index
+
+            if attrs.get('foreign_keys'):
+                foreign_keys.append((schema, table, attrs['foreign_keys']))
+
+        return foreign_keys
+
+    def parse(self):
+        try:
+            db = self.parse_database()
+            yield 'entity', db
+
+            foreign_keys = []
+
+            if not self.options.schemas:
+                foreign_keys = yield from self.parse_schema_tables(db)
+
+            for name in self.options.schemas or []:
+                schema = self.parse_schema(db, name)
+                yield 'entity', schema
+
+                foreign_keys += yield from self.parse_schema_tables(schema,
+                                                                    name)
+
+            # Foreign keys are parsed last since they may refer to columns
+            # of tables parsed after their own.
+            for schema, table, reflected in foreign_keys:
+                for derivation in self.parse_foreign_keys(schema, table,
+                                                          reflected):
+                    yield 'wasDerivedFrom', derivation
+        finally:
+            self.cleanup()
+
+    def iter_records(self):
+        if not self.options.cache:
+            yield from super().iter_records()
+            return
+
+        fingerprint = self.fingerprint()
+
+        if fingerprint is None:
+            yield from super().iter_records()
+            return
+
+        self.meta['fingerprint'] = fingerprint
+
+        key = self.cache_key()
+        cached = results.get(key)
+
+        if cached and cached['fingerprint'] == fingerprint:
+            self.meta['cached'] = True
+            self.cleanup()
+
+            for concept, cid, attrs in cached['records']:
+                yield concept, cid, attrs
+
+            return
+
+        self.meta['cached'] = False
+        records = []
+
+        for record in super().iter_records():
+            records.append(record)
+            yield record
+
+        results.set(key, {
+            'fingerprint': fingerprint,
+            'records': records,
+        })
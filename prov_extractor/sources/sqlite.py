@@ -1,11 +1,84 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.engine import reflection
-from . import base
+import sqlite3
+from urllib.parse import quote
+from . import relational
 from .. import utils
 
 
-class Client(base.Client):
+# Queries are run by the sqlite3 module, or by SQLAlchemy if the database
+# cannot be opened with it, so they are plain strings.
+
+# Tables and columns of the database in a single round trip. Requires
+# SQLite 3.16+ for the table-valued pragma function.
+CATALOG_SQL = '''
+    SELECT m.name AS table_name,
+        p.name AS name,
+        p.type AS type,
+        NOT p."notnull" AS nullable,
+        p.dflt_value AS "default"
+    FROM sqlite_master m
+        LEFT OUTER JOIN pragma_table_info(m.name) p
+    WHERE m.type = 'table'
+        AND m.name NOT LIKE 'sqlite~_%' ESCAPE '~'
+    ORDER BY m.name, p.cid
+'''
+
+PRIMARY_KEYS_SQL = '''
+    SELECT m.name AS table_name,
+        p.name AS name
+    FROM sqlite_master m
+        JOIN pragma_table_info(m.name) p
+    WHERE m.type = 'table'
+        AND p.pk > 0
+    ORDER BY m.name, p.pk
+'''
+
+# Constraint names are not kept by SQLite. References without explicit
+# columns refer to the primary key of the referred table.
+FOREIGN_KEYS_SQL = '''
+    SELECT m.name AS table_name,
+        NULL AS name,
+        f.seq + 1 AS position,
+        f."from" AS column_name,
+        NULL AS referred_schema,
+        f."table" AS referred_table,
+        coalesce(f."to", (
+            SELECT p.name
+            FROM pragma_table_info(f."table") p
+            WHERE p.pk = f.seq + 1
+        )) AS referred_column
+    FROM sqlite_master m
+        JOIN pragma_foreign_key_list(m.name) f
+    WHERE m.type = 'table'
+    ORDER BY m.name, f.id, f.seq
+'''
+
+# Indexes backing primary keys and unique constraints are left out, as by
+# the inspector.
+INDEXES_SQL = '''
+    SELECT m.name AS table_name,
+        i.name AS name,
+        i."unique" AS "unique",
+        c.name AS column_name
+    FROM sqlite_master m
+        JOIN pragma_index_list(m.name) i
+        JOIN pragma_index_info(i.name) c
+    WHERE m.type = 'table'
+        AND i.origin = 'c'
+    ORDER BY m.name, i.name, c.seqno
+'''
+
+# Statistics are only available once the database has been analyzed. The
+# first number of each statistic is the number of rows.
+ROW_COUNTS_SQL = '''
+    SELECT s.tbl AS table_name,
+        max(CAST(s.stat AS INTEGER)) AS row_count
+    FROM sqlite_stat1 s
+    GROUP BY s.tbl
+'''
+
+
+class Client(relational.Client):
     name = 'SQLite'
 
     description = '''
@@ -32,12 +105,90 @@ class Client(base.Client):
         }
     }
 
-    def setup(self):
+    options['properties'].update(relational.reflection_options())
+
+    catalog_sql = CATALOG_SQL
+
+    primary_keys_sql = PRIMARY_KEYS_SQL
+
+    foreign_keys_sql = FOREIGN_KEYS_SQL
+
+    indexes_sql = INDEXES_SQL
+
+    row_counts_sql = ROW_COUNTS_SQL
+
+    # The catalog queries are run with the sqlite3 module when possible and
+    # SQLAlchemy is only set up if the inspector is needed.
+    use_sqlite3 = True
+
+    def connect_sqlite3(self):
+        """Opens the database read-only. Unless it has a write-ahead log, it
+        is assumed not to be changed, which skips locking. Changes may not
+        be checkpointed into the database file yet, so the log is read when
+        there is one.
+        """
+        path = os.path.abspath(self.options.uri)
+        uri = 'file:{}?mode=ro'.format(quote(path))
+
+        if not os.path.exists(path + '-wal'):
+            uri += '&immutable=1'
+
+        db = sqlite3.connect(uri, uri=True)
+        db.row_factory = sqlite3.Row
+
+        try:
+            # Fails if the file is not a database
+            db.execute('SELECT 1 FROM sqlite_master LIMIT 1')
+        except sqlite3.Error:
+            db.close()
+            raise
+
+        return db
+
+    def connect(self):
+        self.engine = None
+        self.conn = None
+        self.insp = None
+        self.db = None
+
+        if self.use_sqlite3:
+            try:
+                self.db = self.connect_sqlite3()
+                return
+            except sqlite3.Error:
+                pass
+
+        super().connect()
+
+    def cleanup(self):
+        if self.db is not None:
+            self.db.close()
+
+        super().cleanup()
+
+    def normalize_name(self, name):
+        return name
+
+    def get_url(self):
         uri = os.path.abspath(self.options.uri)
         # Triple slashes is not a mistake, absolute paths need four slashes
         # in total
-        self.engine = create_engine('sqlite+pysqlite:///{}'.format(uri))
-        self.insp = reflection.Inspector.from_engine(self.engine)
+        return 'sqlite+pysqlite:///{}'.format(uri)
+
+    def load_rows(self, sql, schema=None):
+        # Attached databases are reflected with the inspector
+        if sql is not None and schema is None:
+            if self.db is None:
+                return super().load_rows(sql, schema)
+
+            try:
+                return self.db.execute(sql).fetchall()
+            except sqlite3.Error:
+                pass
+
+        # The inspector is used instead
+        if self.insp is None:
+            super().connect()
 
     def parse_database(self):
         uri = self.options.uri
@@ -59,51 +210,3 @@ class Client(base.Client):
             'prov:type': 'Database',
             'name': name,
         }
-
-    def parse_tables(self, db):
-        tables = []
-
-        for name in self.insp.get_table_names():
-            tables.append({
-                'origins:ident': os.path.join(db['origins:ident'], name),
-                'prov:label': name,
-                'prov:type': 'Table',
-                'name': name,
-                'database': db,
-            })
-
-        return tables
-
-    def parse_columns(self, table):
-        columns = []
-
-        for attrs in self.insp.get_columns(table['name']):
-            column = {
-                'origins:ident': os.path.join(table['origins:ident'],
-                                              attrs['name']),
-                'prov:label': attrs['name'],
-                'prov:type': 'Column',
-                'name': attrs['name'],
-                'type': str(attrs['type']),
-                'nullable': attrs['nullable'],
-                'default': attrs['default'],
-                'table': table,
-            }
-
-            # Extract optional attributes
-            if 'attrs' in attrs:
-                column.update(attrs['attrs'])
-
-            columns.append(column)
-
-        return columns
-
-    def parse(self):
-        db = self.parse_database()
-        self.document.add('entity', db)
-
-        for table in self.parse_tables(db):
-            self.document.add('entity', table)
-
-            for column in self.parse_columns(table):
-                self.document.add('entity', column)
@@ -70,7 +70,7 @@ class Client(base.Client):
                 'name': name,
                 'description': desc,
                 'index': index,
-                'file': parent,
+                'file': base.ref('entity', parent),
             })
 
             index += 1
@@ -105,7 +105,7 @@ class Client(base.Client):
 
     def parse(self):
         _file = self.parse_file()
-        self.document.add('entity', _file)
+        yield 'entity', _file
 
         for field in self.parse_fields(_file):
-            self.document.add('entity', field)
+            yield 'entity', field
@@ -1,3 +1,4 @@
+import os
 import re
 import time
 import codecs
@@ -7,9 +8,26 @@ import dateutil.parser
 from io import StringIO
 
 
-def validate(instance, schema, *args, **kwargs):
-    "Wraps JSON schema validator to augment default values."
-    jsonschema.validate(instance, schema, *args, **kwargs)
+def validator(schema):
+    "Returns a validator for the schema. The schema itself is checked once."
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema)
+
+
+def validate(instance, schema, validator=None):
+    """Wraps JSON schema validator to augment default values.
+
+    A validator of the schema can be passed to skip checking the schema.
+    """
+    if validator is None:
+        jsonschema.validate(instance, schema)
+    else:
+        error = jsonschema.exceptions.best_match(
+            validator.iter_errors(instance))
+
+        if error is not None:
+            raise error
 
     for prop, attrs in schema['properties'].items():
         if prop not in instance:
@@ -61,6 +79,12 @@ def is_remote(s):
     return re.match(r'^https?://', s)
 
 
+def file_fingerprint(path):
+    "Returns a string of the size and modification time of a file."
+    stat = os.stat(path)
+    return '{}-{}'.format(stat.st_size, stat.st_mtime_ns)
+
+
 def get_file(uri, encoding='utf-8'):
     # URL
     if is_remote(uri):
@@ -71,7 +95,7 @@ def get_file(uri, encoding='utf-8'):
 
     # Filename
     if isinstance(uri, str):
-        return codecs.open(uri, 'rU', encoding=encoding)
+        return codecs.open(uri, 'r', encoding=encoding)
 
     # File-like object
     return uri
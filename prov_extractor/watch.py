@@ -0,0 +1,605 @@
+import os
+import time
+import uuid
+import errno
+import select
+import struct
+import atexit
+import ctypes
+import ctypes.util
+import threading
+from collections import deque
+from datetime import datetime
+from . import utils
+from .sources import base
+from .sources.filesystem import DATETIME_FORMAT, revision_ident
+
+
+# Number of seconds events are collected into a delta once a change is seen
+# and maximum number of deltas kept per watch for clients to catch up.
+BATCH_INTERVAL = float(os.environ.get('PROV_EXTRACTOR_WATCH_INTERVAL', 1))
+
+RETENTION = int(os.environ.get('PROV_EXTRACTOR_WATCH_RETENTION', 1000))
+
+# Maximum number of watches, each using an inotify instance.
+MAX_WATCHES = int(os.environ.get('PROV_EXTRACTOR_MAX_WATCHES', 16))
+
+# Options of the filesystem source that apply to watches.
+WATCH_OPTIONS = ('path', 'recurse', 'pattern', 'hidden', 'depth', 'workers')
+
+# inotify flags and events, see inotify(7)
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_DONT_FOLLOW = 0x2000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+    IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | \
+    IN_DONT_FOLLOW
+
+EVENT_HEADER = struct.Struct('iIII')
+
+_libc = None
+
+
+def get_libc():
+    "Returns the C library with the inotify functions."
+    global _libc
+
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify is not available on this platform')
+
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                           ctypes.c_uint32]
+        _libc = libc
+
+    return _libc
+
+
+def check(result):
+    if result < 0:
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code))
+
+    return result
+
+
+class Inotify():
+    "Thin wrapper of an inotify instance."
+    def __init__(self):
+        self.libc = get_libc()
+        self.fd = check(self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        return check(self.libc.inotify_add_watch(self.fd, os.fsencode(path),
+                                                 mask))
+
+    def rm_watch(self, wd):
+        # The watch is already gone if its directory was removed
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout):
+        """Returns the (wd, mask, name) events available within the timeout
+        in seconds.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            events.append((wd, mask, os.fsdecode(name)))
+
+        return events
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class Watcher():
+    """Watches the directory of a filesystem client and batches the changes
+    into PROV deltas.
+
+    Each delta holds a Watch activity with the files and directories it
+    generated, the new revisions of modified files derived from their
+    previous revision and the invalidation of the removed ones. Idents match
+    the ones of the filesystem source, so deltas apply to an extract of the
+    directory.
+    """
+    def __init__(self, client, interval=None, retention=RETENTION):
+        if interval is None:
+            interval = BATCH_INTERVAL
+
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.root = client.options.path
+        self.interval = interval
+
+        self.inotify = Inotify()
+
+        # Watched directories by descriptor and relative path and the
+        # directories as of the last delta
+        self.wds = {}
+        self.dirs = {}
+        self.known_dirs = set()
+
+        # Revision and (size, mtime_ns, inode) of the known files
+        self.files = {}
+
+        # Paths changed since the last delta
+        self.dirty = set()
+        self.first_change = None
+
+        self.seq = 0
+        self.deltas = deque(maxlen=retention)
+        self.condition = threading.Condition()
+        self.stopped = False
+
+        self.started = utils.timestamp()
+
+        for root, found in self.client.walk(self.scan):
+            for path, stats in found:
+                self.files[self.client.relpath(path)] = (0, stat_key(stats))
+
+        self.known_dirs.update(self.dirs)
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def scan(self, path):
+        "Watches a directory before it is listed, so no change is missed."
+        rel = self.client.relpath(path)
+
+        try:
+            wd = self.inotify.add_watch(path)
+        except OSError as e:
+            if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                return [], []
+
+            raise
+
+        self.wds[wd] = rel
+        self.dirs[rel] = wd
+
+        return self.client.scan(path)
+
+    def depth(self, rel):
+        if rel == '.':
+            return 0
+
+        return len(rel.split(os.path.sep))
+
+    def watch_tree(self, rel):
+        "Watches a new directory and marks its content as changed."
+        depth = self.client.options.depth
+
+        if not self.client.options.recurse:
+            depth = 0
+
+        if rel != '.':
+            parent = os.path.dirname(rel) or '.'
+
+            if depth is not None and self.depth(parent) >= depth:
+                return
+
+            if not self.client.options.hidden and \
+                    os.path.basename(rel).startswith('.'):
+                return
+
+        # Walk the subtree with the options of the client
+        stack = [rel]
+
+        while stack:
+            current = stack.pop()
+            path = os.path.join(self.root, current)
+
+            if current in self.dirs:
+                continue
+
+            dirs, found = self.scan(path)
+            self.dirty.add(current)
+
+            for path, stats in found:
+                self.dirty.add(self.client.relpath(path))
+
+            if depth is None or self.depth(current) < depth:
+                stack.extend(self.client.relpath(d) for d in dirs)
+
+    def unwatch_tree(self, rel):
+        "Stops watching a removed directory and marks its content changed."
+        for path in list(self.dirs):
+            if within(path, rel):
+                wd = self.dirs.pop(path)
+                self.wds.pop(wd, None)
+                self.inotify.rm_watch(wd)
+                self.dirty.add(path)
+
+        for path in self.files:
+            if within(path, rel):
+                self.dirty.add(path)
+
+    def rescan(self):
+        "Marks everything as changed after events were lost."
+        self.unwatch_tree('.')
+        self.watch_tree('.')
+
+    def handle(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            self.rescan()
+            return
+
+        parent = self.wds.get(wd)
+
+        if parent is None:
+            return
+
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+            if parent == '.':
+                self.unwatch_tree('.')
+                self.stopped = True
+            return
+
+        rel = os.path.normpath(os.path.join(parent, name))
+
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self.watch_tree(rel)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self.unwatch_tree(rel)
+            return
+
+        self.dirty.add(rel)
+
+    def run(self):
+        while not self.stopped:
+            # Wakes up at least every second to notice being stopped
+            timeout = 1
+
+            if self.first_change is not None:
+                timeout = min(max(self.first_change + self.interval -
+                                  time.monotonic(), 0), timeout)
+
+            try:
+                events = self.inotify.read(timeout)
+            except (OSError, ValueError):
+                break
+
+            for wd, mask, name in events:
+                self.handle(wd, mask, name)
+
+            if self.dirty and self.first_change is None:
+                self.first_change = time.monotonic()
+
+            if self.first_change is not None and (
+                    self.stopped or time.monotonic() - self.first_change >=
+                    self.interval):
+                self.flush()
+
+        # Closed here rather than by stop, since the watch also stops by
+        # itself when its directory is removed
+        self.inotify.close()
+
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def changes(self):
+        """Returns the sorted (rel, kind, stats) changes of the dirty paths,
+        where kind is added, modified or removed.
+        """
+        changes = []
+
+        for rel in sorted(self.dirty):
+            path = os.path.join(self.root, rel)
+
+            try:
+                stats = os.stat(path)
+            except OSError:
+                stats = None
+
+            if rel in self.dirs:
+                if stats is not None and rel not in self.known_dirs:
+                    changes.append((rel, 'added', stats))
+            elif rel in self.known_dirs:
+                changes.append((rel, 'removed', None))
+            elif stats is None:
+                if rel in self.files:
+                    changes.append((rel, 'removed', None))
+            elif not self.client.matches(os.path.basename(rel)):
+                continue
+            elif rel not in self.files:
+                changes.append((rel, 'added', stats))
+            elif self.files[rel][1] != stat_key(stats):
+                changes.append((rel, 'modified', stats))
+
+        return changes
+
+    def records(self, changes, activity, now):
+        "Yields the records of the changes of a delta."
+        yield 'activity', activity
+
+        for rel, kind, stats in changes:
+            path = os.path.join(self.root, rel)
+
+            if kind == 'removed':
+                if rel in self.files:
+                    ident = revision_ident(rel, self.files.pop(rel)[0])
+                else:
+                    ident = rel
+                    self.known_dirs.discard(rel)
+
+                yield 'wasInvalidatedBy', {
+                    'origins:ident': '{}:{}'.format(
+                        ident, activity['origins:ident']),
+                    'prov:entity': base.Ref('entity', ident),
+                    'prov:activity': base.ref('activity', activity),
+                    'prov:time': now,
+                }
+
+                continue
+
+            if rel in self.dirs:
+                entity = self.client.parse_directory(path)
+                self.known_dirs.add(rel)
+            else:
+                entity = self.client.parse_file(path, stats)
+                entity['directory'] = base.Ref('entity',
+                                               os.path.dirname(rel) or '.')
+
+                prev = self.files.get(rel)
+                revision = 0 if prev is None else prev[0] + 1
+
+                if revision:
+                    entity['origins:ident'] = revision_ident(rel, revision)
+                    entity['revision'] = revision
+
+                self.files[rel] = (revision, stat_key(stats))
+
+            yield 'entity', entity
+
+            generation = {
+                'origins:ident': '{}:{}'.format(entity['origins:ident'],
+                                                activity['origins:ident']),
+                'prov:entity': base.ref('entity', entity),
+                'prov:activity': base.ref('activity', activity),
+                'prov:time': now,
+            }
+
+            yield 'wasGeneratedBy', generation
+
+            if kind == 'modified':
+                prev_id = revision_ident(rel, prev[0])
+
+                yield 'wasDerivedFrom', {
+                    'origins:ident': '{}:{}'.format(
+                        prev_id, entity['origins:ident']),
+                    'prov:activity': base.ref('activity', activity),
+                    'prov:generatedEntity': base.ref('entity', entity),
+                    'prov:usedEntity': base.Ref('entity', prev_id),
+                    'prov:generation': base.ref('wasGeneratedBy',
+                                                generation),
+                    'prov:type': 'prov:Revision',
+                }
+
+    def flush(self):
+        "Turns the changed paths into a delta and wakes up the readers."
+        changes = self.changes()
+        now = datetime.now().strftime(DATETIME_FORMAT)
+
+        self.dirty = set()
+        self.first_change = None
+
+        # Paths that changed back and forth within the batch
+        if not changes:
+            return
+
+        seq = self.seq + 1
+
+        activity = {
+            'origins:ident': 'watch:{}:{}'.format(self.id, seq),
+            'prov:type': 'Watch',
+            'prov:label': 'Changes {} of {}'.format(seq, self.root),
+            'prov:endTime': now,
+        }
+
+        document = self.client.document_class()
+
+        for concept, attrs in self.records(changes, activity, now):
+            document.add(concept, attrs)
+
+        counts = {'added': 0, 'modified': 0, 'removed': 0}
+
+        for rel, kind, stats in changes:
+            counts[kind] += 1
+
+        delta = {
+            'seq': seq,
+            'time': utils.timestamp(),
+            'changes': counts,
+            'document': document.resolve(),
+        }
+
+        with self.condition:
+            self.seq = seq
+            self.deltas.append(delta)
+            self.condition.notify_all()
+
+    def wait(self, since, timeout):
+        """Returns the deltas after the sequence number `since`, waiting up
+        to the timeout in seconds for one if there are none yet.
+        """
+        deadline = time.monotonic() + timeout
+
+        with self.condition:
+            while self.seq <= since and not self.stopped:
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    break
+
+                self.condition.wait(remaining)
+
+            return [delta for delta in self.deltas if delta['seq'] > since]
+
+    def stop(self):
+        self.stopped = True
+        self.thread.join()
+
+    def attrs(self):
+        first = self.deltas[0]['seq'] if self.deltas else None
+
+        return {
+            'id': self.id,
+            'path': os.path.abspath(self.root),
+            'options': vars(self.client.options),
+            'created': self.started,
+            'seq': self.seq,
+            'first_seq': first,
+            'stopped': self.stopped,
+            'files': len(self.files),
+            'directories': len(self.dirs),
+        }
+
+
+def stat_key(stats):
+    return (stats.st_size, stats.st_mtime_ns, stats.st_ino)
+
+
+def within(path, rel):
+    "Returns true if the relative path is the directory or is under it."
+    return rel == '.' or path == rel or path.startswith(rel + os.path.sep)
+
+
+class WatchRegistry():
+    """Watchers keyed by id. Registering the same directory with the same
+    options returns the existing watcher.
+
+    Watchers that stopped by themselves, when their directory was removed,
+    are kept so their last deltas can be read, but do not count toward the
+    maximum and are dropped when room is needed.
+    """
+    def __init__(self, max_watches=MAX_WATCHES):
+        self.max_watches = max_watches
+        self.watchers = {}
+        self.lock = threading.Lock()
+
+    def register(self, client):
+        """Returns the watcher of the directory of a filesystem client and
+        whether it was created.
+        """
+        for key, value in vars(client.options).items():
+            if key not in WATCH_OPTIONS and value:
+                raise ValueError('{} is not supported when watching'
+                                 .format(key))
+
+        key = client.snapshot_key()
+
+        # Building the watcher walks the directory, so it is done outside
+        # the lock and the checks are repeated before inserting it
+        with self.lock:
+            existing = self.find(key)
+
+            if existing is None and not self.make_room():
+                raise ValueError('too many watches')
+
+        if existing is not None:
+            return existing, False
+
+        watcher = Watcher(client)
+
+        with self.lock:
+            existing = self.find(key)
+            full = existing is None and not self.make_room()
+
+            if existing is None and not full:
+                self.watchers[watcher.id] = watcher
+                return watcher, True
+
+        # Another request registered the directory, or took the last
+        # place, while this watcher was being built
+        watcher.stop()
+
+        if full:
+            raise ValueError('too many watches')
+
+        return existing, False
+
+    def find(self, key):
+        "Returns the active watcher of the snapshot key. Requires the lock."
+        for watcher in self.watchers.values():
+            if not watcher.stopped and watcher.client.snapshot_key() == key:
+                return watcher
+
+    def make_room(self):
+        """Drops stopped watchers if the registry is full. Returns false if
+        there are too many active watchers. Requires the lock.
+        """
+        active = [watcher for watcher in self.watchers.values()
+                  if not watcher.stopped]
+
+        if len(active) >= self.max_watches:
+            return False
+
+        if len(self.watchers) >= self.max_watches:
+            for wid, watcher in list(self.watchers.items()):
+                if watcher.stopped:
+                    del self.watchers[wid]
+
+        return True
+
+    def get(self, wid):
+        with self.lock:
+            return self.watchers.get(wid)
+
+    def remove(self, wid):
+        with self.lock:
+            watcher = self.watchers.pop(wid, None)
+
+        if watcher is not None:
+            watcher.stop()
+
+        return watcher
+
+    def stop(self):
+        with self.lock:
+            watchers = list(self.watchers.values())
+            self.watchers.clear()
+
+        for watcher in watchers:
+            watcher.stop()
+
+
+watchers = WatchRegistry()
+
+atexit.register(watchers.stop)
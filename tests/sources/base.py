@@ -1,7 +1,11 @@
 import os
 import json
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 from prov_extractor import sources
+from prov_extractor.sources import base
 
 
 class SourceTestCase(unittest.TestCase):
@@ -34,6 +38,30 @@ class SourceTestCase(unittest.TestCase):
         with open(self.output_path(name)) as f:
             return json.load(f)
 
+    def temp_dir(self):
+        "Returns a temporary directory that is removed after the test."
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        return path
+
+    def copy_input(self, name):
+        "Copies an input file or directory to a temporary directory."
+        source = self.input_path(name)
+        path = os.path.join(self.temp_dir(), name)
+
+        if os.path.isdir(source):
+            shutil.copytree(source, path)
+        else:
+            shutil.copy(source, path)
+
+        return path
+
+    def patch(self, target, name, value):
+        "Sets the attribute of the target until the end of the test."
+        patcher = mock.patch.object(target, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def assertProvCounts(self, output, expected):
         "Asserts two provenance documents has the same number of elements."
         # Ensure they have the same keys
@@ -50,3 +78,47 @@ class SourceTestCase(unittest.TestCase):
         output = self.generate()
         expected_output = self.load_output(self.output_name)
         self.assertProvCounts(output, expected_output)
+
+
+class ReferenceTestCase(unittest.TestCase):
+    class Client(base.Client):
+        options = {'properties': {}}
+
+        def parse(self):
+            agent = {'origins:ident': 'jane', 'prov:label': 'Jane'}
+            activity = {'origins:ident': 'edit'}
+
+            yield 'agent', agent
+            yield 'activity', activity
+
+            # The concept is given by the reference, not the attribute
+            yield 'wasAssociatedWith', {
+                'origins:ident': 'jane:edit',
+                'prov:agent': base.ref('agent', agent),
+                'prov:activity': base.ref('activity', activity),
+                'delegate': base.Ref('agent', 'john'),
+            }
+
+    def test_ref(self):
+        output = self.Client().generate()
+        association = output['wasAssociatedWith'][
+            'wasAssociatedWith:jane:edit']
+
+        self.assertEqual(association['prov:agent'], 'agent:jane')
+        self.assertEqual(association['prov:activity'], 'activity:edit')
+        self.assertEqual(association['delegate'], 'agent:john')
+
+    def test_ref_ident(self):
+        with self.assertRaises(ValueError):
+            base.ref('entity', {'prov:label': 'No ident'})
+
+    def test_reference_by_value(self):
+        document = base.Document()
+
+        with self.assertRaises(ValueError):
+            document.add('entity', {'origins:ident': 'column',
+                                    'table': {'origins:ident': 'table'}})
+
+        # XSD typed values are not references
+        document.add('entity', {'origins:ident': 'typed',
+                                'size': {'$': 1, 'type': 'xsd:int'}})
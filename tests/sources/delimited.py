@@ -9,3 +9,67 @@ class TestCase(SourceTestCase):
         path = self.input_path('chinook_tracks.csv')
         client = self.module.Client(uri=path)
         return client.generate()
+
+    def test_profile(self):
+        path = self.input_path('chinook_tracks.csv')
+        client = self.module.Client(uri=path, profile=True, chunk_size=100)
+        doc = client.generate()
+
+        self.assertEqual(doc['entity']['entity:chinook_tracks']['row_count'],
+                         3503)
+
+        column = doc['entity']['entity:TrackId']
+
+        self.assertEqual(column['type'], 'integer')
+        self.assertEqual(column['null_count'], 0)
+        self.assertEqual((column['min'], column['max']), (1, 3503))
+
+        # Estimates are within a few percent
+        self.assertAlmostEqual(column['distinct_count'], 3503, delta=150)
+
+        self.assertEqual(doc['entity']['entity:UnitPrice']['type'], 'number')
+        self.assertEqual(doc['entity']['entity:Name']['type'], 'string')
+        self.assertGreater(doc['entity']['entity:Composer']['null_count'], 0)
+
+    def test_profile_numpy(self):
+        from unittest import mock
+        from prov_extractor import profiling
+
+        columns = [
+            (['1', '+2', '-3', '007'], 'integer'),
+            (['1', '2.5', '.5', '1.', '1e3', '-2E-2'], 'number'),
+            (['9223372036854775807', '-9223372036854775808'], 'integer'),
+            (['9223372036854775808', '1'], 'number'),
+            (['1e400'], 'string'),
+            (['nan', '1'], 'string'),
+            (['inf'], 'string'),
+            ([' 1', '2'], 'string'),
+            (['1_000'], 'string'),
+            (['0x1A'], 'string'),
+            (['1-2'], 'string'),
+            (['1e'], 'string'),
+            (['1\n'], 'string'),
+            (['1\x002'], 'string'),
+            (['١٢'], 'string'),
+            (['true', 'False'], 'boolean'),
+        ]
+
+        # The NumPy and pure Python paths infer the same profile
+        backends = [None]
+
+        if profiling.numpy is not None:
+            backends.append(profiling.numpy)
+
+        for values, type in columns:
+            results = []
+
+            for backend in backends:
+                with mock.patch.object(profiling, 'numpy', backend):
+                    profile = profiling.ColumnProfile()
+                    profile.update(values)
+                    results.append(profile.result())
+
+            for result in results:
+                self.assertEqual(result['type'], type, values)
+
+            self.assertEqual(results[0], results[-1])
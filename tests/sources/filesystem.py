@@ -1,11 +1,179 @@
+import os
+import json
+import shutil
+import hashlib
+from prov_extractor import checksums, snapshots, watch
+from prov_extractor.sources.base import CompactDocument
 from .base import SourceTestCase
 
 
+def paths(client):
+    "Returns the sorted paths of the files extracted by the client."
+    return sorted(attrs['path'] for concept, cid, attrs
+                  in client.iter_records())
+
+
 class TestCase(SourceTestCase):
     generator = 'filesystem'
     output_name = 'filesystem.json'
 
+    def client(self, path=None, **options):
+        "Returns a client of the path, the input directory by default."
+        if path is None:
+            path = self.input_path('filesystem')
+
+        return self.module.Client(path=path, **options)
+
     def generate(self):
+        return self.client().generate()
+
+    def test_compact(self):
+        path = self.input_path('filesystem')
+        document = self.module.Client(path=path).extract(CompactDocument)
+
+        self.assertEqual(document.resolve(), self.generate())
+
+        # Serialized from the rows as the resolved document would be
+        self.assertEqual(document.dumps(), json.dumps(document.resolve()))
+
+    def test_fingerprint(self):
+        path = self.copy_input('filesystem')
+        client = self.client(path)
+        fingerprint = client.fingerprint()
+
+        self.assertEqual(client.fingerprint(), fingerprint)
+
+        with open(os.path.join(path, 'new.txt'), 'w') as f:
+            f.write('new')
+
+        self.assertNotEqual(client.fingerprint(), fingerprint)
+
+    def test_workers(self):
+        serial = self.client(workers=1)
+        concurrent = self.client(workers=8)
+
+        self.assertEqual(list(serial.iter_records()),
+                         list(concurrent.iter_records()))
+
+    def test_depth(self):
+        client = self.client(depth=1)
+
+        self.assertIn('foo/hello.json', paths(client))
+        self.assertNotIn('foo/qux', paths(client))
+
+        self.assertEqual(paths(self.client(recurse=False)),
+                         paths(self.client(depth=0)))
+
+    def test_snapshot(self):
+        path = self.copy_input('filesystem')
+        self.patch(snapshots, 'SNAPSHOT_DIR',
+                   os.path.join(os.path.dirname(path), 'snapshots'))
+
+        def extract():
+            client = self.client(path, snapshot=True)
+            return client.generate(), client.meta['snapshot']
+
+        # The first snapshot has all files
+        doc, meta = extract()
+        full = self.client(path).generate()
+
+        self.assertEqual(doc['entity'], full['entity'])
+        self.assertEqual(meta['added'], 5)
+
+        # Nothing changed and no directory is listed
+        doc, meta = extract()
+
+        self.assertNotIn('entity', doc)
+        self.assertEqual(meta['run'], 2)
+        self.assertEqual(meta['skipped_directories'], 5)
+
+        with open(os.path.join(path, 'foo', 'hello.json'), 'w') as f:
+            f.write('{"hello": "world"}')
+
+        os.remove(os.path.join(path, 'bar', 'hello.json'))
+
+        with open(os.path.join(path, 'bar', 'new.json'), 'w') as f:
+            f.write('{}')
+
+        doc, meta = extract()
+
+        self.assertEqual(
+            (meta['added'], meta['modified'], meta['removed']),
+            (1, 1, 1))
+
+        self.assertIn('entity:foo/hello.json@1', doc['entity'])
+        self.assertIn('entity:bar/new.json', doc['entity'])
+
+        derivation = list(doc['wasDerivedFrom'].values())[0]
+        self.assertEqual(derivation['prov:usedEntity'],
+                         'entity:foo/hello.json')
+
+        invalidation = list(doc['wasInvalidatedBy'].values())[0]
+        self.assertEqual(invalidation['prov:entity'],
+                         'entity:bar/hello.json')
+        self.assertEqual(invalidation['prov:activity'],
+                         'activity:snapshot:3')
+
+    def test_checksum(self):
+        self.patch(checksums, 'CACHE_PATH',
+                   os.path.join(self.temp_dir(), 'checksums.sqlite'))
+
         path = self.input_path('filesystem')
-        client = self.module.Client(path=path)
-        return client.generate()
+        client = self.client(path, checksum='sha256')
+        doc = client.generate()
+
+        with open(os.path.join(path, 'foo.json'), 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+
+        self.assertEqual(doc['entity']['entity:foo.json']['sha256'], digest)
+        self.assertEqual(client.meta['checksum']['hashed'], 5)
+
+        # Checksums of unchanged files are cached
+        client = self.client(path, checksum='sha256')
+
+        self.assertEqual(client.generate(), doc)
+        self.assertEqual(client.meta['checksum']['hashed'], 0)
+        self.assertEqual(client.meta['checksum']['cached'], 5)
+
+    def test_watch_removed(self):
+        path = self.copy_input('filesystem')
+
+        registry = watch.WatchRegistry(max_watches=1)
+        self.addCleanup(registry.stop)
+
+        watcher, created = registry.register(self.client(path))
+
+        # The watch stops by itself once its directory is removed
+        shutil.rmtree(path)
+        watcher.thread.join(5)
+
+        self.assertTrue(watcher.stopped)
+        self.assertIsNone(watcher.inotify.fd)
+
+        # and no longer counts toward the maximum
+        other, created = registry.register(self.client())
+        self.assertTrue(created)
+        self.assertIsNone(registry.get(watcher.id))
+
+    def test_watch_lock(self):
+        registry = watch.WatchRegistry()
+        self.addCleanup(registry.stop)
+
+        locked = []
+
+        class Client(self.module.Client):
+            def walk(self, scan=None):
+                locked.append(registry.lock.locked())
+                return super().walk(scan)
+
+        path = self.input_path('filesystem')
+
+        # The directory is walked without holding the registry lock
+        watcher, created = registry.register(Client(path=path))
+        self.assertEqual(locked, [False])
+
+        # and the existing watcher is returned without walking it again
+        other, created = registry.register(Client(path=path))
+        self.assertIs(other, watcher)
+        self.assertFalse(created)
+        self.assertEqual(locked, [False])
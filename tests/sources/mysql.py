@@ -1,4 +1,7 @@
 import os
+import json
+import unittest
+from prov_extractor.sources import mysql
 from .base import SourceTestCase
 
 
@@ -18,3 +21,34 @@ class TestCase(SourceTestCase):
                                     password=PASSWORD)
 
         return client.generate()
+
+
+class TypeTestCase(unittest.TestCase):
+    # Column types of the catalog query for the chinook database
+    types = {
+        'int(11)': 'INTEGER(11)',
+        'varchar(120)': 'VARCHAR(120)',
+        'decimal(10,2)': 'DECIMAL(10, 2)',
+        'datetime': 'DATETIME',
+    }
+
+    def test_parse_type(self):
+        path = os.path.join(SourceTestCase.OUTPUT_DIR, 'chinook_mysql.json')
+
+        with open(path) as f:
+            output = json.load(f)
+
+        expected = {attrs['type'] for attrs in output['entity'].values()
+                    if attrs['prov:type'] == 'Column'}
+
+        for name, type_ in self.types.items():
+            self.assertIn(type_, expected)
+            self.assertEqual(str(mysql.parse_type(name)), type_)
+
+        self.assertEqual(str(mysql.parse_type('int(10) unsigned')),
+                         'INTEGER(10) UNSIGNED')
+        self.assertEqual(str(mysql.parse_type("enum('a','b')")),
+                         "ENUM('a','b')")
+
+        # Unknown types are kept
+        self.assertEqual(mysql.parse_type('geometry'), 'geometry')
@@ -1,5 +1,6 @@
 import os
 import unittest
+from prov_extractor.sources import oracle
 from .base import SourceTestCase
 
 
@@ -20,3 +21,34 @@ class TestCase(SourceTestCase):
                                     password=PASSWORD)
 
         return client.generate()
+
+
+class TypeTestCase(unittest.TestCase):
+    def column(self, type, length=None, precision=None, scale=None,
+               char_length=None, char_used=None):
+        return {
+            'type': type,
+            'data_length': length,
+            'data_precision': precision,
+            'data_scale': scale,
+            'char_length': char_length,
+            'char_used': char_used,
+        }
+
+    def test_format_type(self):
+        types = [
+            (self.column('VARCHAR2', 80, char_length=20, char_used='C'),
+             'VARCHAR2(20 CHAR)'),
+            (self.column('VARCHAR2', 20, char_length=20, char_used='B'),
+             'VARCHAR2(20 BYTE)'),
+            (self.column('NVARCHAR2', 40, char_length=20), 'NVARCHAR2(20)'),
+            (self.column('NUMBER', 22, 10, 2), 'NUMBER(10,2)'),
+            (self.column('NUMBER', 22, scale=0), 'NUMBER(*,0)'),
+            (self.column('NUMBER', 22), 'NUMBER'),
+            (self.column('FLOAT', 22, 126), 'FLOAT(126)'),
+            (self.column('TIMESTAMP(6)', 11, scale=6), 'TIMESTAMP(6)'),
+            (self.column('DATE', 7), 'DATE'),
+        ]
+
+        for row, expected in types:
+            self.assertEqual(oracle.format_type(row), expected)
@@ -1,4 +1,7 @@
 import os
+import json
+import unittest
+from prov_extractor.sources import postgresql
 from .base import SourceTestCase
 
 
@@ -18,3 +21,33 @@ class TestCase(SourceTestCase):
                                     password=PASSWORD)
 
         return client.generate()
+
+
+class TypeTestCase(unittest.TestCase):
+    # Column types of the catalog query for the chinook database
+    types = {
+        'integer': 'INTEGER',
+        'character varying(120)': 'VARCHAR(120)',
+        'numeric(10,2)': 'NUMERIC(10, 2)',
+        'timestamp(6) without time zone': 'TIMESTAMP(6) WITHOUT TIME ZONE',
+    }
+
+    def test_parse_type(self):
+        path = os.path.join(SourceTestCase.OUTPUT_DIR,
+                            'chinook_postgresql.json')
+
+        with open(path) as f:
+            output = json.load(f)
+
+        expected = {attrs['type'] for attrs in output['entity'].values()
+                    if attrs['prov:type'] == 'Column'}
+
+        for name, type_ in self.types.items():
+            self.assertIn(type_, expected)
+            self.assertEqual(str(postgresql.parse_type(name)), type_)
+
+        self.assertEqual(str(postgresql.parse_type('integer[]')),
+                         'INTEGER[]')
+
+        # Unknown types, such as enums, are kept
+        self.assertEqual(postgresql.parse_type('mood'), 'mood')
@@ -1,3 +1,9 @@
+import os
+import sqlite3
+import subprocess
+import sys
+from prov_extractor.cache import DiskCache
+from prov_extractor.sources import relational
 from .base import SourceTestCase
 
 
@@ -9,3 +15,195 @@ class TestCase(SourceTestCase):
         path = self.input_path('chinook.sqlite')
         client = self.module.Client(uri=path)
         return client.generate()
+
+    def test_iter_records(self):
+        path = self.input_path('chinook.sqlite')
+        client = self.module.Client(uri=path)
+
+        output = {}
+
+        for concept, cid, attrs in client.iter_records():
+            output.setdefault(concept, {})[cid] = attrs
+
+        self.assertEqual(output, self.generate())
+
+    def test_engine_registry(self):
+        class Client(self.module.Client):
+            use_sqlite3 = False
+
+        path = self.input_path('chinook.sqlite')
+        client = Client(uri=path)
+        other = Client(uri=path)
+
+        self.assertIs(client.engine, other.engine)
+
+        relational.engines.dispose(client.engine.url)
+        self.assertNotIn(client.engine.url, relational.engines)
+
+    def test_sqlite3(self):
+        class Client(self.module.Client):
+            use_sqlite3 = False
+
+        path = self.input_path('chinook.sqlite')
+        client = self.module.Client(uri=path)
+
+        # SQLAlchemy is not set up
+        output = client.generate()
+        self.assertIsNone(client.engine)
+
+        self.assertEqual(output, Client(uri=path).generate())
+
+    def test_sqlalchemy_not_imported(self):
+        # Run in a fresh interpreter since other tests import SQLAlchemy
+        code = ('import sys\n'
+                'from prov_extractor.sources import sqlite\n'
+                'sqlite.Client(uri=sys.argv[1]).generate()\n'
+                'print("sqlalchemy" in sys.modules)\n')
+
+        path = self.input_path('chinook.sqlite')
+        output = subprocess.check_output([sys.executable, '-c', code, path])
+        self.assertEqual(output.strip(), b'False')
+
+    def test_wal(self):
+        path = self.copy_input('chinook.sqlite')
+        fingerprint = self.module.Client(uri=path).fingerprint()
+
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+
+        # Changes are kept in the log while the writer is open
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA wal_autocheckpoint=0')
+        conn.execute('CREATE TABLE Extra (id INTEGER)')
+        conn.commit()
+
+        client = self.module.Client(uri=path)
+        self.assertNotEqual(client.fingerprint(), fingerprint)
+        self.assertIn('entity:chinook.sqlite/Extra',
+                      client.generate()['entity'])
+        self.assertIsNone(client.engine)
+
+    def test_workers(self):
+        path = self.input_path('chinook.sqlite')
+        serial = self.module.Client(uri=path)
+        concurrent = self.module.Client(uri=path, workers=4)
+
+        # Force the inspector to be used
+        serial.catalog_sql = None
+        concurrent.catalog_sql = None
+
+        self.assertEqual(concurrent.generate(), serial.generate())
+
+    def test_schemas(self):
+        path = self.input_path('chinook.sqlite')
+        client = self.module.Client(uri=path, schemas=['main'])
+        output = client.generate()['entity']
+
+        schema = output['entity:chinook.sqlite/main']
+        self.assertEqual(schema['prov:type'], 'Schema')
+        self.assertEqual(schema['database'], 'entity:chinook.sqlite')
+
+        table = output['entity:chinook.sqlite/main/Album']
+        self.assertEqual(table['schema'], 'entity:chinook.sqlite/main')
+        self.assertIn('entity:chinook.sqlite/main/Album/Title', output)
+
+    def test_filter(self):
+        path = self.input_path('chinook.sqlite')
+        client = self.module.Client(uri=path, include=['Play*', 'Album'],
+                                    exclude=['*Track'])
+        output = client.generate()['entity']
+
+        tables = sorted(attrs['name'] for attrs in output.values()
+                        if attrs['prov:type'] == 'Table')
+
+        self.assertEqual(tables, ['Album', 'Playlist'])
+
+    def test_cache(self):
+        path = self.copy_input('chinook.sqlite')
+        cache_dir = os.path.join(os.path.dirname(path), 'cache')
+
+        self.patch(relational, 'results', DiskCache(cache_dir, 1024 ** 2, 60))
+
+        client = self.module.Client(uri=path, cache=True)
+        output = client.generate()
+        self.assertFalse(client.meta['cached'])
+
+        client = self.module.Client(uri=path, cache=True)
+        self.assertEqual(client.generate(), output)
+        self.assertTrue(client.meta['cached'])
+
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE Extra (id INTEGER)')
+        conn.close()
+
+        client = self.module.Client(uri=path, cache=True)
+        self.assertIn('entity:chinook.sqlite/Extra',
+                      client.generate()['entity'])
+        self.assertFalse(client.meta['cached'])
+
+    def test_constraints(self):
+        path = self.input_path('chinook.sqlite')
+        options = {
+            'primary_keys': True,
+            'foreign_keys': True,
+            'indexes': True,
+        }
+
+        bulk = self.module.Client(uri=path, **options)
+        inspected = self.module.Client(uri=path, **options)
+        inspected.primary_keys_sql = None
+        inspected.foreign_keys_sql = None
+        inspected.indexes_sql = None
+
+        output = bulk.generate()
+        self.assertEqual(output, inspected.generate())
+
+        entities = output['entity']
+        self.assertTrue(entities['entity:chinook.sqlite/Album/AlbumId']
+                        ['primary_key'])
+        self.assertFalse(entities['entity:chinook.sqlite/Album/Title']
+                         ['primary_key'])
+
+        index = entities['entity:chinook.sqlite/Album/indexes/'
+                         'IFK_AlbumArtistId']
+        self.assertEqual(index['columns'], ['ArtistId'])
+
+        derivation = output['wasDerivedFrom'][
+            'wasDerivedFrom:chinook.sqlite/Album/ArtistId:'
+            'chinook.sqlite/Artist/ArtistId']
+        self.assertEqual(derivation['prov:usedEntity'],
+                         'entity:chinook.sqlite/Artist/ArtistId')
+
+    def test_constraints_fingerprint(self):
+        path = self.copy_input('chinook.sqlite')
+
+        def fingerprints():
+            return (self.module.Client(uri=path).fingerprint(),
+                    self.module.Client(uri=path, indexes=True).fingerprint())
+
+        before = fingerprints()
+
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE INDEX IFK_AlbumTitle ON Album (Title)')
+        conn.close()
+
+        after = fingerprints()
+
+        # Indexes are only part of the fingerprint when extracted
+        self.assertEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+
+    def test_row_counts(self):
+        path = self.copy_input('chinook.sqlite')
+
+        client = self.module.Client(uri=path, row_counts=True)
+        table = client.generate()['entity']['entity:chinook.sqlite/Album']
+        self.assertIsNone(table['row_count'])
+
+        conn = sqlite3.connect(path)
+        conn.execute('ANALYZE')
+        conn.close()
+
+        client = self.module.Client(uri=path, row_counts=True)
+        table = client.generate()['entity']['entity:chinook.sqlite/Album']
+        self.assertEqual(table['row_count'], 347)